@@ -11,24 +11,92 @@
 - RESTful API接口
 """
 
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, send_file, session
+from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session, stream_with_context, abort, make_response, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import tuple_, text, func, inspect, event, case, or_, select, type_coerce, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
 from flask_cors import CORS
-from datetime import datetime, date
+from werkzeug.security import safe_join
+from datetime import datetime, date, timedelta
+from collections import defaultdict, OrderedDict
+from functools import wraps, lru_cache
 import os
+import io
+import re
+import csv
 import json
+import math
+import codecs
+import base64
 import uuid
 import tempfile
+import sys
+import threading
+import time
+import hmac
+import hashlib
+import gzip
+import sqlite3
+import mimetypes
+from stat import S_ISREG
 import urllib.request as urlrequest
 from urllib.parse import quote
+from urllib.error import HTTPError
+from email.utils import formatdate
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from db_backup import online_backup, backup_filename, store_backup, apply_retention, DEFAULT_RETENTION
 
 # 创建Flask应用实例
 app = Flask(__name__)
 
+# SQLite 连接参数的可选值（环境变量只能取这些值，避免拼接任意SQL）
+SQLITE_JOURNAL_MODES = ('DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF')
+SQLITE_SYNCHRONOUS_MODES = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def sqlite_pragmas_from_env():
+    """
+    从环境变量读取每个数据库连接要设置的 PRAGMA
+    
+    - COSWIG_SQLITE_BUSY_TIMEOUT: 等待写锁的毫秒数，默认5000
+    - COSWIG_SQLITE_JOURNAL_MODE: 日志模式，默认WAL（读写互不阻塞）
+    - COSWIG_SQLITE_SYNCHRONOUS: 同步级别，默认NORMAL（WAL下只在检查点时fsync）
+    - COSWIG_SQLITE_MMAP_SIZE: 内存映射读取的字节数，默认256MB
+    - COSWIG_SQLITE_CACHE_SIZE: 页缓存大小，负数表示KiB，默认 -20000（约20MB）
+    
+    Raises:
+        ValueError: 取值不合法
+    """
+    journal_mode = os.environ.get('COSWIG_SQLITE_JOURNAL_MODE', 'WAL').upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f'COSWIG_SQLITE_JOURNAL_MODE 只能为 {", ".join(SQLITE_JOURNAL_MODES)}')
+    synchronous = os.environ.get('COSWIG_SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f'COSWIG_SQLITE_SYNCHRONOUS 只能为 {", ".join(SQLITE_SYNCHRONOUS_MODES)}')
+    # busy_timeout 放在最前，切换日志模式时也能等待其他连接释放锁
+    return {
+        'busy_timeout': int(os.environ.get('COSWIG_SQLITE_BUSY_TIMEOUT', 5000)),
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'mmap_size': int(os.environ.get('COSWIG_SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        'cache_size': int(os.environ.get('COSWIG_SQLITE_CACHE_SIZE', -20000)),
+    }
+
+
 # 应用配置
-app.config['SECRET_KEY'] = 'your-secret-key-here'  # 用于会话加密
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///coswig_orders.db'  # 数据库连接
+app.config['SECRET_KEY'] = os.environ.get('COSWIG_SECRET_KEY', 'your-secret-key-here')  # 用于会话加密，生产环境务必设置
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('COSWIG_DATABASE_URI', 'sqlite:///coswig_orders.db')  # 数据库连接
+app.config['SQLITE_PRAGMAS'] = sqlite_pragmas_from_env()  # 每个SQLite连接建立时设置的PRAGMA
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False  # 禁用SQLAlchemy事件系统
+app.config['ADMIN_TOKEN'] = os.environ.get('COSWIG_ADMIN_TOKEN', '')  # 管理接口令牌，未设置时拒绝访问管理接口
+# 未设置令牌时是否允许本机直接访问管理接口；经同一主机上的反向代理转发的请求也来自本机，有代理时不要开启
+app.config['ADMIN_ALLOW_LOCAL'] = os.environ.get('COSWIG_ADMIN_ALLOW_LOCAL', '').lower() in ('1', 'true', 'yes')
+app.config['BACKUP_DIR'] = os.environ.get('COSWIG_BACKUP_DIR', 'backups')  # 数据库备份目录
+app.config['BACKUP_STORE_DIR'] = os.path.join(app.config['BACKUP_DIR'], 'store')  # 去重备份仓库目录
+app.config['BACKUP_RETENTION'] = dict(DEFAULT_RETENTION)  # 仓库保留策略（每小时/每天/每周保留个数）
 
 # 启用CORS支持，允许跨域请求
 CORS(app)
@@ -36,6 +104,19 @@ CORS(app)
 # 初始化数据库
 db = SQLAlchemy(app)
 
+
+@event.listens_for(Engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """为每个新建的SQLite连接设置 SQLITE_PRAGMAS（WAL、busy_timeout 等）"""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in app.config['SQLITE_PRAGMAS'].items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
 # ==================== 数据库模型 ====================
 
 class Order(db.Model):
@@ -51,90 +132,668 @@ class Order(db.Model):
     # 基本信息
     cn = db.Column(db.String(100), nullable=False)  # Coser姓名
     character = db.Column(db.String(200), nullable=False)  # 角色名称
-    contact = db.Column(db.String(200), nullable=False)  # 联系平台(QQ/微信/闲鱼)
+    # contact/final_amount/status 开启 active_history，保证更新时能取到旧值以维护统计汇总
+    contact = db.column_property(db.Column(db.String(200), nullable=False), active_history=True)  # 联系平台(QQ/微信/闲鱼)
     
     # 时间信息
     needed_date = db.Column(db.Date, nullable=False)  # 客户需要的完成时间
     order_date = db.Column(db.Date, nullable=False)  # 下单时间
     created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 记录创建时间
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # 最后修改时间(UTC)
     
     # 财务信息
     deposit_paid = db.Column(db.Boolean, default=False)  # 定金支付状态
-    final_amount = db.Column(db.Float, nullable=False)  # 尾款金额
+    final_amount = db.column_property(db.Column(db.Float, nullable=False), active_history=True)  # 尾款金额
     shipping_included = db.Column(db.Boolean, default=False)  # 尾款是否包含邮费
     
     # 制作信息
     blank_purchased = db.Column(db.Boolean, default=False)  # 毛坯购买状态
     cake_box = db.Column(db.String(10), default='不需要')  # 蛋糕盒包装需求
-    status = db.Column(db.String(50), default='待制作')  # 订单状态
+    status = db.column_property(db.Column(db.String(50), default='待制作'), active_history=True)  # 订单状态
+    
+    # 组合索引：看板/日历按 needed_date 排序，收入和筛选按 status/contact 过滤，导入按 (cn, character, needed_date) 去重
+    # 已有数据库通过 run_migrations() 补建，见 MIGRATIONS
+    __table_args__ = (
+        db.Index('ix_order_status_needed_date', 'status', 'needed_date'),
+        db.Index('ix_order_contact_needed_date', 'contact', 'needed_date'),
+        db.Index('ix_order_needed_date_id', 'needed_date', 'id'),
+        db.Index('ix_order_order_date', 'order_date'),
+        db.Index('ix_order_import_key', 'cn', 'character', 'needed_date'),
+        db.Index('ix_order_revenue', 'contact', 'needed_date', 'status', 'final_amount'),
+    )
     
     def __repr__(self):
         """对象的字符串表示"""
         return f'<Order {self.cn} - {self.character}>'
 
-# ==================== 路由定义 ====================
 
-@app.route('/')
-def index():
+class SchemaMigration(db.Model):
     """
-    主页路由 - 显示订单列表
+    数据库结构版本记录
     
-    功能：
-    - 支持按多种字段排序
-    - 支持按平台筛选
-    - 支持显示/隐藏已完成订单
-    - 计算订单统计信息
+    每条记录对应一个已执行的迁移，最大的 version 即当前结构版本
+    """
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True)  # 迁移版本号
+    name = db.Column(db.String(200), nullable=False)  # 迁移说明
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)  # 执行时间
+
+
+class OrderStat(db.Model):
+    """
+    订单统计汇总
+    
+    按 (status, contact) 汇总订单数量和尾款金额，由 Order 的增删改事件增量维护，
+    统计页面只读取这张小表，不再扫描订单表
+    """
+    __tablename__ = 'order_stats'
+    
+    status = db.Column(db.String(50), primary_key=True)  # 订单状态
+    contact = db.Column(db.String(200), primary_key=True)  # 联系平台
+    order_count = db.Column(db.Integer, nullable=False, default=0)  # 订单数量
+    revenue_total = db.Column(db.Float, nullable=False, default=0)  # 尾款金额合计
+
+
+class DataVersion(db.Model):
+    """
+    数据版本号
+    
+    订单表的任何写入（包括批量操作和其他进程的写入）都由触发器递增 name='order' 的版本号，
+    订单快照缓存和 ETag 据此判断是否过期
+    """
+    __tablename__ = 'data_versions'
+    
+    name = db.Column(db.String(50), primary_key=True)  # 数据名称
+    version = db.Column(db.Integer, nullable=False, default=0)  # 版本号，每次写入 +1
+
+
+class OrderChange(db.Model):
+    """
+    订单变更日志
+    
+    由订单表上的触发器写入：新增/修改记为 upsert，删除记为 delete（墓碑）。
+    seq 单调递增，作为增量同步的游标
+    """
+    __tablename__ = 'order_changes'
+    __table_args__ = {'sqlite_autoincrement': True}  # 清理后序号也不会复用
+    
+    seq = db.Column(db.Integer, primary_key=True)  # 变更序号
+    order_id = db.Column(db.Integer, nullable=False, index=True)  # 订单ID
+    op = db.Column(db.String(10), nullable=False)  # upsert / delete
+    changed_at = db.Column(db.DateTime, nullable=False, server_default=func.current_timestamp())  # 变更时间(UTC)
+
+
+class Job(db.Model):
+    """
+    后台任务（导入/导出）
+    
+    由 JobRunner 在线程池中执行，执行过程中更新 progress，前端轮询任务状态
+    """
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.String(32), primary_key=True)  # 任务ID（uuid4 十六进制）
+    kind = db.Column(db.String(20), nullable=False)  # 任务类型：export / import
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued/running/succeeded/partial/failed
+    progress = db.Column(db.Float, nullable=False, default=0)  # 进度百分比 0~100
+    message = db.Column(db.String(500))  # 进度说明或错误信息
+    params = db.Column(db.Text)  # 任务参数（JSON）
+    result = db.Column(db.Text)  # 任务结果（JSON）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # 提交时间(UTC)
+    started_at = db.Column(db.DateTime)  # 开始执行时间(UTC)
+    finished_at = db.Column(db.DateTime)  # 结束时间(UTC)
+
+# ==================== 统计汇总维护 ====================
+
+# 计入收入的订单状态
+COMPLETED_STATUSES = ('已完成', '已发货')
+
+
+def _stats_key(status, contact):
+    """统计汇总的主键，status 为空时记为空字符串"""
+    return (status or '', contact or '')
+
+
+def _adjust_order_stats(conn, deltas):
+    """
+    将增量累加到统计汇总表
+    
+    Args:
+        conn: 当前事务的数据库连接
+        deltas (dict): {(status, contact): (订单数增量, 金额增量)}
+    """
+    table = OrderStat.__table__
+    for (status, contact), (count, amount) in deltas.items():
+        if not count and not amount:
+            continue
+        stmt = sqlite_insert(table).values(
+            status=status, contact=contact, order_count=count, revenue_total=amount
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['status', 'contact'],
+            set_={
+                'order_count': table.c.order_count + stmt.excluded.order_count,
+                'revenue_total': table.c.revenue_total + stmt.excluded.revenue_total,
+            }
+        )
+        conn.execute(stmt)
+
+
+def _old_value(state, name):
+    """返回属性修改前的值，未修改时返回当前值"""
+    history = state.attrs[name].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(state.object, name)
+
+
+@event.listens_for(Order, 'after_insert')
+def _order_stats_after_insert(mapper, connection, target):
+    """新增订单：对应汇总行 +1"""
+    key = _stats_key(target.status, target.contact)
+    _adjust_order_stats(connection, {key: (1, target.final_amount or 0)})
+
+
+@event.listens_for(Order, 'after_update')
+def _order_stats_after_update(mapper, connection, target):
+    """修改订单：从旧汇总行移出，计入新汇总行"""
+    state = inspect(target)
+    old_key = _stats_key(_old_value(state, 'status'), _old_value(state, 'contact'))
+    old_amount = _old_value(state, 'final_amount') or 0
+    new_key = _stats_key(target.status, target.contact)
+    new_amount = target.final_amount or 0
+    if old_key == new_key:
+        deltas = {new_key: (0, new_amount - old_amount)}
+    else:
+        deltas = {old_key: (-1, -old_amount), new_key: (1, new_amount)}
+    _adjust_order_stats(connection, deltas)
+
+
+@event.listens_for(Order, 'before_delete')
+def _order_stats_before_delete(mapper, connection, target):
+    """删除订单：对应汇总行 -1（在删除前读取字段，避免访问已删除的行）"""
+    key = _stats_key(target.status, target.contact)
+    _adjust_order_stats(connection, {key: (-1, -(target.final_amount or 0))})
+
+
+def _apply_orders_to_stats(criteria, sign):
+    """按条件汇总订单，乘以 sign (1/-1) 后累加到统计汇总"""
+    rows = (db.session.query(Order.status, Order.contact,
+                             func.count(Order.id), func.coalesce(func.sum(Order.final_amount), 0))
+            .filter(*criteria)
+            .group_by(Order.status, Order.contact)
+            .all())
+    deltas = defaultdict(lambda: (0, 0))
+    for status, contact, count, amount in rows:
+        key = _stats_key(status, contact)
+        deltas[key] = (deltas[key][0] + sign * count, deltas[key][1] + sign * amount)
+    _adjust_order_stats(db.session.connection(), deltas)
+
+
+def subtract_orders_from_stats(*criteria):
+    """
+    批量删除/修改前调用：按条件从统计汇总中扣除对应订单
+    
+    Query.delete() 和 Core 批量 UPDATE 不会触发 ORM 事件，需要在同一事务中手动扣除
+    """
+    _apply_orders_to_stats(criteria, -1)
+
+
+def add_orders_to_stats(*criteria):
+    """
+    批量修改后调用：按条件把对应订单重新计入统计汇总
+    
+    与修改前的 subtract_orders_from_stats 成对使用，条件须选中同一批订单
+    """
+    _apply_orders_to_stats(criteria, 1)
+
+
+def rebuild_order_stats(conn=None):
+    """
+    根据订单表全量重建统计汇总
+    
+    Args:
+        conn: 可选的数据库连接，缺省时使用独立事务
+    """
+    sql = [
+        text('DELETE FROM order_stats'),
+        text(
+            "INSERT INTO order_stats (status, contact, order_count, revenue_total) "
+            "SELECT COALESCE(status, ''), contact, COUNT(*), COALESCE(SUM(final_amount), 0) "
+            "FROM \"order\" GROUP BY COALESCE(status, ''), contact"
+        ),
+    ]
+    if conn is not None:
+        for stmt in sql:
+            conn.execute(stmt)
+        return
+    with db.engine.begin() as conn:
+        for stmt in sql:
+            conn.execute(stmt)
+
+# ==================== 数据库迁移 ====================
+
+def _migration_001_order_indexes(conn):
+    """为订单表补建组合索引"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_status_needed_date ON "order" (status, needed_date)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_contact_needed_date ON "order" (contact, needed_date)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_needed_date_id ON "order" (needed_date, id)'))
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_order_date ON "order" (order_date)'))
+
+
+def _migration_002_order_stats(conn):
+    """创建统计汇总表并从现有订单回填"""
+    OrderStat.__table__.create(conn, checkfirst=True)
+    rebuild_order_stats(conn)
+
+
+def _migration_003_order_version(conn):
+    """创建数据版本号表，并用触发器在订单表每次增删改后递增版本号"""
+    DataVersion.__table__.create(conn, checkfirst=True)
+    conn.execute(text("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('order', 0)"))
+    for action in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS trg_order_version_{action.lower()} AFTER {action} ON "order" '
+            "BEGIN UPDATE data_versions SET version = version + 1 WHERE name = 'order'; END"
+        ))
+
+
+def _migration_004_order_changes(conn):
+    """订单表增加 updated_at（用 created_at 回填），创建变更日志表和写日志的触发器"""
+    columns = {row[1] for row in conn.execute(text('PRAGMA table_info("order")'))}
+    if 'updated_at' not in columns:
+        conn.execute(text('ALTER TABLE "order" ADD COLUMN updated_at DATETIME'))
+    conn.execute(text('UPDATE "order" SET updated_at = COALESCE(created_at, CURRENT_TIMESTAMP) WHERE updated_at IS NULL'))
+    OrderChange.__table__.create(conn, checkfirst=True)
+    triggers = {
+        'insert': "INSERT INTO order_changes (order_id, op) VALUES (NEW.id, 'upsert')",
+        'update': "INSERT INTO order_changes (order_id, op) VALUES (NEW.id, 'upsert')",
+        'delete': "INSERT INTO order_changes (order_id, op) VALUES (OLD.id, 'delete')",
+    }
+    for action, statement in triggers.items():
+        conn.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS trg_order_changes_{action} AFTER {action.upper()} ON "order" '
+            f'BEGIN {statement}; END'
+        ))
+
+
+def _migration_005_order_search(conn):
+    """
+    创建订单全文索引 order_search（FTS5 外部内容表，索引 cn 和 character）
+    
+    使用 trigram 分词，中文按任意连续3个字符建索引，支持子串/前缀匹配；
+    触发器在订单增删改时同步索引，最后从现有订单重建
+    """
+    conn.execute(text(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS order_search USING fts5('
+        "cn, \"character\", content='order', content_rowid='id', tokenize='trigram')"
+    ))
+    insert_new = 'INSERT INTO order_search (rowid, cn, "character") VALUES (NEW.id, NEW.cn, NEW."character")'
+    delete_old = ("INSERT INTO order_search (order_search, rowid, cn, \"character\") "
+                  "VALUES ('delete', OLD.id, OLD.cn, OLD.\"character\")")
+    triggers = {
+        'insert': ('AFTER INSERT', [insert_new]),
+        'delete': ('AFTER DELETE', [delete_old]),
+        'update': ('AFTER UPDATE OF cn, "character"', [delete_old, insert_new]),
+    }
+    for action, (when, statements) in triggers.items():
+        body = ' '.join(statement + ';' for statement in statements)
+        conn.execute(text(f'CREATE TRIGGER IF NOT EXISTS trg_order_search_{action} {when} ON "order" BEGIN {body} END'))
+    conn.execute(text("INSERT INTO order_search (order_search) VALUES ('rebuild')"))
+
+
+def _migration_006_jobs(conn):
+    """创建后台任务表"""
+    Job.__table__.create(conn, checkfirst=True)
+
+
+def _migration_007_order_import_key(conn):
+    """导入去重键索引，流式导入每批按 (cn, character, needed_date) 查询已有订单"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_import_key ON "order" (cn, "character", needed_date)'))
+
+
+def _migration_008_order_revenue_index(conn):
+    """收入统计覆盖索引，全表聚合只扫描索引，不读订单表"""
+    conn.execute(text('CREATE INDEX IF NOT EXISTS ix_order_revenue ON "order" (contact, needed_date, status, final_amount)'))
+
+
+# 迁移列表：(版本号, 说明, 执行函数)，只能追加，不能修改已发布的迁移
+MIGRATIONS = [
+    (1, '订单表组合索引', _migration_001_order_indexes),
+    (2, '订单统计汇总表', _migration_002_order_stats),
+    (3, '订单数据版本号', _migration_003_order_version),
+    (4, '订单修改时间和变更日志', _migration_004_order_changes),
+    (5, '订单全文索引', _migration_005_order_search),
+    (6, '后台任务表', _migration_006_jobs),
+    (7, '订单导入去重索引', _migration_007_order_import_key),
+    (8, '收入统计覆盖索引', _migration_008_order_revenue_index),
+]
+
+
+def get_schema_version():
+    """返回当前数据库结构版本，未执行过迁移时为0"""
+    if not inspect(db.engine).has_table(SchemaMigration.__tablename__):
+        return 0
+    return db.session.query(func.max(SchemaMigration.version)).scalar() or 0
+
+
+def run_migrations():
+    """
+    按版本顺序执行尚未应用的迁移
+    
+    每个迁移在独立事务中执行并写入 schema_migrations，失败时回滚该迁移并抛出异常
+    
+    Returns:
+        list: 本次执行的迁移版本号
+    """
+    SchemaMigration.__table__.create(db.engine, checkfirst=True)
+    applied = {row[0] for row in db.session.query(SchemaMigration.version).all()}
+    db.session.commit()
+    
+    executed = []
+    for version, name, migrate in MIGRATIONS:
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            migrate(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(
+                version=version, name=name, applied_at=datetime.utcnow()
+            ))
+        executed.append(version)
+    return executed
+
+
+def init_database():
+    """创建缺失的数据表并执行迁移"""
+    db.create_all()
+    return run_migrations()
+
+# ==================== 订单行序列化 ====================
+
+try:
+    import orjson  # 可选依赖，安装后JSON编码更快
+except ImportError:
+    orjson = None
+
+
+def _stored_text(expr):
+    """按SQLite中存储的文本读取，跳过SQLAlchemy的日期时间解析"""
+    return type_coerce(expr, db.String)
+
+
+def _yes_no(column):
+    return case((column, '是'), else_='否')
+
+
+# 字段的查询表达式（未列出的字段直接取列值）
+# Date 列在SQLite中存为 YYYY-MM-DD，DateTime 列存为 YYYY-MM-DD HH:MM:SS.ffffff，
+# 直接读取文本并在SQL中截取成输出格式，Python端不再逐行解析日期和调用 strftime
+ORDER_FIELD_EXPRESSIONS = {
+    'needed_date': _stored_text(Order.needed_date),
+    'order_date': _stored_text(Order.order_date),
+    'created_at': _stored_text(func.substr(Order.created_at, 1, 19)),
+    'updated_at': _stored_text(func.replace(func.substr(Order.updated_at, 1, 19), ' ', 'T')),
+    'deposit_paid': type_coerce(func.coalesce(Order.deposit_paid, False), db.Boolean),
+    'shipping_included': type_coerce(func.coalesce(Order.shipping_included, False), db.Boolean),
+    'blank_purchased': type_coerce(func.coalesce(Order.blank_purchased, False), db.Boolean),
+}
+
+# CSV导出：布尔值输出为 是/否，空时间输出为空字符串，行元组可直接交给 csv.writer
+ORDER_CSV_EXPRESSIONS = dict(
+    ORDER_FIELD_EXPRESSIONS,
+    deposit_paid=_yes_no(Order.deposit_paid),
+    shipping_included=_yes_no(Order.shipping_included),
+    blank_purchased=_yes_no(Order.blank_purchased),
+    created_at=func.coalesce(func.substr(Order.created_at, 1, 19), ''),
+)
+
+
+class OrderRowSerializer:
+    """
+    订单行序列化（订单列表、API、日历和导出共用）
+    
+    用 Core select 只查询需要的列，每个字段在SQL中直接算出输出值，
+    结果行是元组，按字段名 zip 成字典即可编码为JSON，不创建ORM对象
+    """
+
+    def __init__(self, fields, extra=(), expressions=ORDER_FIELD_EXPRESSIONS):
+        """
+        Args:
+            fields (tuple): 输出的字段
+            extra (tuple): 额外查询但不输出的字段（如分页游标需要的列），排在 fields 之后
+            expressions (dict): 字段的查询表达式
+        """
+        self.fields = tuple(fields)
+        names = list(dict.fromkeys(self.fields + tuple(extra)))
+        self.columns = [expressions[name].label(name) if name in expressions else getattr(Order, name)
+                        for name in names]
+
+    def select(self):
+        """查询这些字段的 select 语句，调用方追加筛选和排序"""
+        return select(*self.columns)
+
+    def to_dicts(self, rows):
+        """结果行转换为字典列表（只包含 fields）"""
+        keys = self.fields
+        return [dict(zip(keys, row)) for row in rows]
+
+
+@lru_cache(maxsize=64)
+def get_order_serializer(fields, extra=()):
+    """按字段组合复用序列化器（fields/extra 须为元组）"""
+    return OrderRowSerializer(fields, extra)
+
+
+def json_bytes(obj):
+    """编码为紧凑的UTF-8 JSON（有 orjson 时使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def json_text(obj):
+    """同 json_bytes，返回字符串（嵌入模板使用）"""
+    if orjson is not None:
+        return orjson.dumps(obj).decode('utf-8')
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+# ==================== 订单快照缓存 ====================
+
+BOOT_ID = uuid.uuid4().hex  # 进程启动标识，重启（模板/静态资源更新）后旧的页面ETag全部失效
+ORDER_SNAPSHOT_CACHE_SIZE = 64  # 订单列表页面最多缓存的 (筛选, 排序, 页码) 组合数
+API_ORDER_PAGE_CACHE_SIZE = 256  # /api/orders 最多缓存的分页结果数（与页面快照分开，翻页不会淘汰页面快照）
+ORDER_LIST_PAGE_SIZE = 200  # 订单列表页面每页显示的订单数
+
+# 订单列表页面使用的字段（只查询列，不创建ORM对象，快照可以跨请求共享）
+ORDER_LIST_COLUMNS = (
+    'id', 'cn', 'character', 'contact', 'needed_date', 'order_date', 'deposit_paid',
+    'final_amount', 'shipping_included', 'blank_purchased', 'cake_box', 'status'
+)
+ORDER_LIST_SORTS = ('needed_date', 'order_date')
+
+
+def get_orders_version():
+    """
+    返回订单数据版本号
+    
+    Returns:
+        int or None: 版本号；尚未执行迁移（没有版本号表）时返回None，此时不使用缓存
+    """
+    try:
+        return db.session.execute(text("SELECT version FROM data_versions WHERE name = 'order'")).scalar()
+    except OperationalError:
+        db.session.rollback()
+        return None
+
+
+class OrderSnapshotCache:
+    """
+    订单快照缓存
+    
+    按 key（筛选、排序等参数）缓存序列化结果并记录生成时的数据版本号，
+    版本号变化后下一次读取时重新生成；超过容量时淘汰最久未使用的快照
     """
     
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (版本号, 快照)
+    
+    def get(self, key, version, build):
+        """
+        返回 key 对应版本的快照，不存在或已过期时调用 build() 生成
+        
+        调用方须在查询数据之前读取 version：期间有写入时快照记在旧版本号下，下次读取会重新生成
+        """
+        if version is None:
+            return build()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                return entry[1]
+        snapshot = build()
+        with self._lock:
+            self._entries[key] = (version, snapshot)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return snapshot
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+order_snapshots = OrderSnapshotCache(ORDER_SNAPSHOT_CACHE_SIZE)
+api_order_pages = OrderSnapshotCache(API_ORDER_PAGE_CACHE_SIZE)
+
+
+def make_etag(*parts):
+    """由数据版本号和请求参数等生成ETag"""
+    raw = '|'.join(str(part) for part in (BOOT_ID,) + parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def not_modified_response(etag):
+    """客户端缓存仍然有效：返回不带内容的304"""
+    response = app.response_class(status=304)
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response
+
+
+def build_order_list_snapshot(platform_filter, sort_by, order, show_completed, page):
+    """
+    查询订单列表的一页并序列化，同时汇总筛选范围内全部订单的统计卡片数据
+    
+    Returns:
+        dict: orders（本页订单行，日期为 YYYY-MM-DD 文本）、orders_json（前端使用的本页订单JSON字符串）、
+              totals（count/deposit_paid/final_amount/blank_purchased/pending/completed）、
+              page（页码，超出范围时取最后一页）、page_count
+    """
+    conditions = []
+    if platform_filter:
+        conditions.append(Order.contact == platform_filter)
+    if not show_completed:
+        conditions.append(or_(Order.status.is_(None), Order.status.notin_(COMPLETED_STATUSES)))
+    
+    totals = db.session.execute(select(
+        func.count(Order.id),
+        func.sum(case((Order.deposit_paid, 1), else_=0)),
+        func.sum(Order.final_amount),
+        func.sum(case((Order.blank_purchased, 1), else_=0)),
+        func.sum(case((Order.status == '待制作', 1), else_=0)),
+        func.sum(case((Order.status.in_(COMPLETED_STATUSES), 1), else_=0)),
+    ).where(*conditions)).one()
+    totals = dict(zip(('count', 'deposit_paid', 'final_amount', 'blank_purchased', 'pending', 'completed'),
+                      (value or 0 for value in totals)))
+    page_count = max(1, math.ceil(totals['count'] / ORDER_LIST_PAGE_SIZE))
+    page = min(page, page_count)
+    
+    serializer = get_order_serializer(ORDER_LIST_COLUMNS)
+    column = getattr(Order, sort_by)
+    direction = (column.desc(), Order.id.desc()) if order == 'desc' else (column.asc(), Order.id.asc())
+    statement = (serializer.select().where(*conditions).order_by(*direction)
+                 .limit(ORDER_LIST_PAGE_SIZE).offset((page - 1) * ORDER_LIST_PAGE_SIZE))
+    rows = db.session.execute(statement).all()
+    return {
+        'orders': rows,
+        'orders_json': json_text(serializer.to_dicts(rows)),
+        'totals': totals,
+        'page': page,
+        'page_count': page_count,
+    }
+
+
+def order_list_page_url(page):
+    """当前订单列表页面换到指定页码的地址（保留其他参数）"""
+    args = request.args.to_dict()
+    args['page'] = page
+    return url_for(request.endpoint, **args)
+
+
+def render_order_list():
+    """
+    渲染订单列表页面（主页和Dashboard主页共用）
+    
+    - 每页显示 ORDER_LIST_PAGE_SIZE 条，未勾选"显示已完成订单"时在查询中排除已完成/已发货的订单
+    - 订单数据取自按 (平台, 排序, 是否显示已完成, 页码) 缓存的快照，订单未变化时不查询订单表
+    - ETag 由数据版本号、请求参数、当天日期、Spine模型和设备信息组成，命中 If-None-Match 时返回304；
+      有待显示的闪现消息时不使用ETag
+    """
     # 获取URL参数
     sort_by = request.args.get('sort', 'needed_date')  # 排序字段
     order = request.args.get('order', 'asc')  # 排序方向
     show_completed = request.args.get('show_completed', 'false') == 'true'  # 是否显示已完成
     platform_filter = request.args.get('platform', '')  # 平台筛选
+    page = request.args.get('page', 1, type=int)  # 页码
     
-    # 构建数据库查询
-    query = Order.query
-    
-    # 注释掉后端筛选，改为前端控制
-    # if not show_completed:
-    #     query = query.filter(Order.status.notin_(['已完成', '已发货']))
-    
-    # 平台筛选
-    if platform_filter:
-        query = query.filter(Order.contact == platform_filter)
+    key = (
+        'order_list',
+        platform_filter,
+        sort_by if sort_by in ORDER_LIST_SORTS else 'needed_date',
+        'desc' if order == 'desc' else 'asc',
+        show_completed,
+        max(1, page),
+    )
+    version = get_orders_version()
+    etag = None
+    if version is not None and '_flashes' not in session:
+        etag = make_etag(
+            version, sorted(request.args.items(multi=True)), date.today(),
+            session.get('spine_model_id', ''), request.headers.get('User-Agent', '')
+        )
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
     
-    # 排序
-    if sort_by == 'needed_date':
-        if order == 'desc':
-            orders = query.order_by(Order.needed_date.desc()).all()
-        else:
-            orders = query.order_by(Order.needed_date.asc()).all()
-    elif sort_by == 'order_date':
-        if order == 'desc':
-            orders = query.order_by(Order.order_date.desc()).all()
-        else:
-            orders = query.order_by(Order.order_date.asc()).all()
-    else:
-        orders = query.order_by(Order.needed_date.asc()).all()
-    
-    # 将订单对象转换为字典以便JSON序列化
-    orders_dict = []
-    for order in orders:
-        orders_dict.append({
-            'id': order.id,
-            'cn': order.cn,
-            'character': order.character,
-            'contact': order.contact,
-            'needed_date': order.needed_date.strftime('%Y-%m-%d'),
-            'order_date': order.order_date.strftime('%Y-%m-%d'),
-            'deposit_paid': bool(order.deposit_paid),
-            'final_amount': order.final_amount,
-            'shipping_included': bool(order.shipping_included),
-            'blank_purchased': bool(order.blank_purchased),
-            'status': order.status
-        })
+    snapshot = order_snapshots.get(key, version, lambda: build_order_list_snapshot(*key[1:]))
+    response = make_response(render_template(
+        'dashboard_index.html', orders=snapshot['orders'], orders_json=snapshot['orders_json'],
+        order_totals=snapshot['totals'], page=snapshot['page'], page_count=snapshot['page_count'],
+        page_url=order_list_page_url, sort_by=sort_by, order=order,
+        show_completed=show_completed, platform_filter=platform_filter
+    ))
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+# ==================== 路由定义 ====================
+
+@app.route('/')
+def index():
+    """
+    主页路由 - 显示订单列表
     
-    return render_template('dashboard_index.html', orders=orders, orders_json=json.dumps(orders_dict), sort_by=sort_by, order=order, show_completed=show_completed, platform_filter=platform_filter)
+    功能：
+    - 支持按多种字段排序
+    - 支持按平台筛选
+    - 支持显示/隐藏已完成订单
+    - 计算订单统计信息
+    - 订单未变化时直接返回304（见 render_order_list）
+    """
+    return render_order_list()
 
 @app.route('/add', methods=['GET', 'POST'])
 def add_order():
@@ -254,75 +913,457 @@ def delete_order(id):
 
 # ==================== API路由 ====================
 
-@app.route('/api/orders')
-def api_orders():
-    """
-    获取所有订单的API接口
-    
-    返回JSON格式的订单列表
-    """
-    orders = Order.query.all()
-    return jsonify([{
-        'id': order.id,
-        'cn': order.cn,
-        'character': order.character,
-        'contact': order.contact,
-        'needed_date': order.needed_date.strftime('%Y-%m-%d'),
-        'order_date': order.order_date.strftime('%Y-%m-%d'),
-        'deposit_paid': order.deposit_paid,
-        'final_amount': order.final_amount,
-        'shipping_included': order.shipping_included,
-        'blank_purchased': order.blank_purchased,
-        'status': order.status
-    } for order in orders])
+# /api/orders 可投影的字段（fields= 参数），按输出顺序排列
+API_ORDER_FIELDS = (
+    'id', 'cn', 'character', 'contact', 'needed_date', 'order_date',
+    'deposit_paid', 'final_amount', 'shipping_included', 'blank_purchased',
+    'cake_box', 'status', 'updated_at'
+)
+API_ORDERS_DEFAULT_LIMIT = 50  # 默认每页条数
+API_ORDERS_MAX_LIMIT = 500  # 单页最大条数
 
-@app.route('/api/update_order/<int:id>', methods=['POST'])
-def api_update_order(id):
+
+def _encode_order_cursor(needed_date, order_id):
+    """将 (needed_date, id) 编码为不透明的分页游标（needed_date 为 date 或 YYYY-MM-DD 文本）"""
+    raw = f"{needed_date}|{order_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode_order_cursor(cursor):
     """
-    更新订单API接口
-    
-    支持部分字段更新，用于前端快速操作
+    解析分页游标
+
+    Returns:
+        tuple: (needed_date, id)
+
+    Raises:
+        ValueError: 游标格式错误
     """
-    order = Order.query.get_or_404(id)
-    data = request.get_json()
-    
     try:
-        # 根据传入的数据更新相应字段
-        if 'deposit_paid' in data:
-            order.deposit_paid = data['deposit_paid']
-        if 'blank_purchased' in data:
-            order.blank_purchased = data['blank_purchased']
-        if 'status' in data:
-            order.status = data['status']
-        if 'contact' in data:
-            order.contact = data['contact']
-        if 'shipping_included' in data:
-            order.shipping_included = data['shipping_included']
-        if 'cake_box' in data:
-            order.cake_box = data['cake_box']
-        if 'needed_date' in data:
-            order.needed_date = datetime.strptime(data['needed_date'], '%Y-%m-%d').date()
-        
-        db.session.commit()
-        return jsonify({'success': True, 'message': '更新成功'})
-    except Exception as e:
-        return jsonify({'success': False, 'message': str(e)}), 400
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        date_part, id_part = raw.split('|', 1)
+        return datetime.strptime(date_part, '%Y-%m-%d').date(), int(id_part)
+    except Exception:
+        raise ValueError('无效的分页游标')
 
-@app.route('/api/batch_delete', methods=['POST'])
-def api_batch_delete():
+
+def _parse_date_arg(name):
+    """读取 YYYY-MM-DD 格式的查询参数，缺省时返回None"""
+    value = request.args.get(name, '').strip()
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'参数 {name} 日期格式错误，应为YYYY-MM-DD')
+
+
+def parse_api_fields():
     """
-    批量删除订单API接口
-    
-    接收订单ID列表，批量删除订单
+    读取 fields= 参数（逗号分隔），缺省为全部字段
+
+    Raises:
+        ValueError: 包含未知字段
     """
-    data = request.get_json()
+    fields_arg = request.args.get('fields', '').strip()
+    if not fields_arg:
+        return list(API_ORDER_FIELDS)
+    fields = [f.strip() for f in fields_arg.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in API_ORDER_FIELDS]
+    if unknown:
+        raise ValueError(f"未知字段：{', '.join(unknown)}")
+    return fields
+
+
+def order_page_statement(query, statuses, limit):
+    """
+    按 (needed_date, id) 顺序取前 limit 条订单，可按多个状态筛选
+    
+    status IN (...) 包含多个状态时SQLite只能读出全部匹配行再临时排序；
+    改为每个状态一个子查询 UNION ALL，各自按 ix_order_status_needed_date 顺序读取并归并，读满一页即停止
+    
+    Args:
+        query: 已加上其他筛选条件的 select（须包含 needed_date 和 id 列）
+        statuses (list): 状态列表（不含重复），为空时不按状态筛选
+    """
+    if len(statuses) > 1:
+        merged = union_all(*[query.where(Order.status == status) for status in statuses])
+        columns = merged.selected_columns
+        return merged.order_by(columns.needed_date, columns.id).limit(limit)
+    if statuses:
+        query = query.where(Order.status == statuses[0])
+    return query.order_by(Order.needed_date.asc(), Order.id.asc()).limit(limit)
+
+
+def build_api_orders_body():
+    """
+    按当前请求参数查询一页订单并序列化为JSON
+
+    Returns:
+        bytes: 响应内容
+
+    Raises:
+        ValueError: 参数错误
+    """
+    # 分页大小
+    try:
+        limit = int(request.args.get('limit', API_ORDERS_DEFAULT_LIMIT))
+    except ValueError:
+        raise ValueError('参数 limit 必须为整数')
+    limit = max(1, min(limit, API_ORDERS_MAX_LIMIT))
+
+    # 字段投影（游标需要 needed_date 和 id，始终查询这两列）
+    fields = parse_api_fields()
+    serializer = get_order_serializer(tuple(fields), ('id', 'needed_date'))
+    query = serializer.select()
+
+    # 服务端筛选（状态在分页时加入，见 order_page_statement）
+    status_arg = request.args.get('status', '').strip()
+    statuses = list(dict.fromkeys(s.strip() for s in status_arg.split(',') if s.strip()))
+    platform_filter = request.args.get('platform', '').strip()
+    if platform_filter:
+        query = query.where(Order.contact == platform_filter)
+    date_from = _parse_date_arg('date_from')
+    date_to = _parse_date_arg('date_to')
+    if date_from:
+        query = query.where(Order.needed_date >= date_from)
+    if date_to:
+        query = query.where(Order.needed_date <= date_to)
+
+    # 键集分页：从游标位置之后继续读取
+    cursor = request.args.get('cursor', '').strip()
+    if cursor:
+        cursor_date, cursor_id = _decode_order_cursor(cursor)
+        query = query.where(tuple_(Order.needed_date, Order.id) > tuple_(cursor_date, cursor_id))
+
+    # 多取一条用于判断是否还有下一页
+    rows = db.session.execute(order_page_statement(query, statuses, limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    orders = serializer.to_dicts(rows)
+
+    next_cursor = _encode_order_cursor(rows[-1].needed_date, rows[-1].id) if has_more else None
+
+    return json_bytes({
+        'success': True,
+        'orders': orders,
+        'count': len(orders),
+        'has_more': has_more,
+        'next_cursor': next_cursor
+    })
+
+
+@app.route('/api/orders')
+def api_orders():
+    """
+    订单列表API接口（游标分页）
+
+    查询参数：
+    - limit: 每页条数，默认50，最大500
+    - cursor: 上一页返回的 next_cursor，按 (needed_date, id) 继续读取
+    - fields: 逗号分隔的返回字段，如 fields=id,cn,status
+    - status: 订单状态，可逗号分隔多个
+    - platform: 联系平台(QQ/微信/闲鱼)
+    - date_from / date_to: needed_date 范围（含边界）
+
+    相同参数的结果按数据版本号缓存，订单未变化时命中 If-None-Match 返回304
+
+    Returns:
+        JSON响应包含订单列表和下一页游标
+    """
+    args = tuple(sorted(request.args.items(multi=True)))
+    version = get_orders_version()
+    etag = make_etag(version, 'api_orders', args) if version is not None else None
+    if etag and request.if_none_match.contains(etag):
+        return not_modified_response(etag)
+
+    try:
+        body = api_order_pages.get(args, version, build_api_orders_body)
+        response = app.response_class(body, mimetype=app.json.mimetype)
+        if etag:
+            response.set_etag(etag)
+            response.cache_control.no_cache = True
+        return response
+
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+ORDER_SEARCH_DEFAULT_LIMIT = 20  # 搜索默认每页条数
+ORDER_SEARCH_MAX_LIMIT = 100
+ORDER_SEARCH_MAX_TERMS = 8  # 最多使用的关键词个数
+ORDER_SEARCH_MIN_TRIGRAM = 3  # trigram 索引只能匹配不少于3个字符的关键词
+
+
+def _like_pattern(term):
+    """转义 LIKE 通配符，生成包含匹配的模式"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def search_orders(q, serializer, limit, offset=0):
+    """
+    按 cn/character 搜索订单
+    
+    关键词以空格分隔，全部命中才返回（AND）。不少于3个字符的关键词走 order_search 全文索引
+    并按 bm25 相关度排序（cn 命中权重更高）；更短的关键词（如单个姓氏）用 LIKE 包含匹配。
+    相关度相同时按 needed_date、id 倒序。
+    
+    Args:
+        q (str): 搜索关键词
+        serializer (OrderRowSerializer): 查询的字段
+        limit (int): 每页条数
+        offset (int): 跳过的条数
+    
+    Returns:
+        tuple: (订单行列表, 是否还有下一页)
+    """
+    terms = list(dict.fromkeys(q.split()))[:ORDER_SEARCH_MAX_TERMS]
+    indexed_terms = [t for t in terms if len(t) >= ORDER_SEARCH_MIN_TRIGRAM]
+    short_terms = [t for t in terms if len(t) < ORDER_SEARCH_MIN_TRIGRAM]
+
+    query = serializer.select().select_from(Order)
+    order_by = []
+    if indexed_terms:
+        # 每个关键词作为短语（双引号转义），避免 FTS5 查询语法注入
+        match = ' AND '.join('"' + t.replace('"', '""') + '"' for t in indexed_terms)
+        ranked = text(
+            'SELECT rowid AS id, bm25(order_search, 2.0, 1.0) AS rank '
+            'FROM order_search WHERE order_search MATCH :match'
+        ).bindparams(match=match).columns(id=db.Integer, rank=db.Float).subquery('ranked')
+        query = query.join(ranked, ranked.c.id == Order.id)
+        order_by.append(ranked.c.rank.asc())
+    for term in short_terms:
+        pattern = _like_pattern(term)
+        query = query.where(or_(Order.cn.like(pattern, escape='\\'),
+                                Order.character.like(pattern, escape='\\')))
+
+    rows = db.session.execute(query.order_by(*order_by, Order.needed_date.desc(), Order.id.desc())
+                              .offset(offset).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+
+@app.route('/api/orders/search')
+def api_order_search():
+    """
+    订单搜索API（按 CN 和角色名）
+
+    查询参数：
+    - q: 关键词，空格分隔多个（需全部命中）；不少于3个字的关键词走全文索引，支持中文子串和前缀
+    - limit: 每页条数，默认20，最大100
+    - offset: 跳过的条数（上一页返回的 next_offset）
+    - fields: 逗号分隔的返回字段，同 /api/orders
+
+    Returns:
+        JSON响应包含按相关度排序的订单
+    """
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'success': False, 'message': '请输入搜索关键词'}), 400
+    try:
+        limit = max(1, min(int(request.args.get('limit', ORDER_SEARCH_DEFAULT_LIMIT)), ORDER_SEARCH_MAX_LIMIT))
+        offset = max(0, int(request.args.get('offset', 0)))
+    except ValueError:
+        return jsonify({'success': False, 'message': '参数 limit 和 offset 必须为整数'}), 400
+    try:
+        fields = parse_api_fields()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+    args = tuple(sorted(request.args.items(multi=True)))
+    version = get_orders_version()
+    etag = make_etag(version, 'api_order_search', args) if version is not None else None
+    if etag and request.if_none_match.contains(etag):
+        return not_modified_response(etag)
+
+    serializer = get_order_serializer(tuple(fields))
+    rows, has_more = search_orders(q, serializer, limit, offset)
+    orders = serializer.to_dicts(rows)
+    response = app.response_class(json_bytes({
+        'success': True,
+        'query': q,
+        'orders': orders,
+        'count': len(orders),
+        'has_more': has_more,
+        'next_offset': offset + len(orders) if has_more else None
+    }), mimetype=app.json.mimetype)
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+ORDER_CHANGES_DEFAULT_LIMIT = 500  # 每次最多返回的变更订单数
+ORDER_CHANGES_MAX_LIMIT = 2000
+ORDER_CHANGES_RETENTION_DAYS = 30  # 变更日志保留天数，见 prune_order_changes
+ORDER_CHANGES_PRUNED_KEY = 'order_changes_pruned'  # data_versions 中记录已清理到的变更序号
+
+
+def get_order_changes(since, limit):
+    """
+    读取 since 之后的订单变更，同一订单多次变更只返回最后一次
+    
+    Returns:
+        tuple: (upserted 订单行列表, deleted 订单ID列表, 新游标, 是否还有更多)
+    """
+    latest = (db.session.query(OrderChange.order_id, func.max(OrderChange.seq).label('seq'))
+              .filter(OrderChange.seq > since)
+              .group_by(OrderChange.order_id)
+              .subquery())
+    changes = (db.session.query(OrderChange.seq, OrderChange.order_id, OrderChange.op)
+               .join(latest, OrderChange.seq == latest.c.seq)
+               .order_by(OrderChange.seq.asc())
+               .limit(limit + 1)
+               .all())
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if not changes:
+        return [], [], since, False
+    
+    upsert_ids = [change.order_id for change in changes if change.op == 'upsert']
+    rows = []
+    if upsert_ids:
+        statement = get_order_serializer(API_ORDER_FIELDS).select().where(Order.id.in_(upsert_ids))
+        rows = db.session.execute(statement.order_by(Order.id)).all()
+    # 读取期间被删除的订单按删除处理（其删除记录会在下一次同步中再次返回）
+    found = {row.id for row in rows}
+    deleted = [change.order_id for change in changes
+               if change.op == 'delete' or change.order_id not in found]
+    return rows, deleted, changes[-1].seq, has_more
+
+
+def prune_order_changes(max_age_days=ORDER_CHANGES_RETENTION_DAYS):
+    """
+    清理订单变更日志
+    
+    - 同一订单只保留最新一条记录（旧记录已被覆盖，删除不影响任何游标）
+    - 删除早于 max_age_days 天的记录，并记下清理到的序号；
+      游标早于该序号的客户端会收到 reset，需要重新加载全量订单
+    
+    Returns:
+        int: 删除的记录数
+    """
+    cutoff = (datetime.utcnow() - timedelta(days=max_age_days)).strftime('%Y-%m-%d %H:%M:%S')
+    with db.engine.begin() as conn:
+        removed = conn.execute(text(
+            'DELETE FROM order_changes WHERE seq NOT IN '
+            '(SELECT MAX(seq) FROM order_changes GROUP BY order_id)'
+        )).rowcount
+        pruned_through = conn.execute(
+            text('SELECT MAX(seq) FROM order_changes WHERE changed_at < :cutoff'), {'cutoff': cutoff}
+        ).scalar()
+        if pruned_through is not None:
+            removed += conn.execute(
+                text('DELETE FROM order_changes WHERE seq <= :seq'), {'seq': pruned_through}
+            ).rowcount
+            table = DataVersion.__table__
+            stmt = sqlite_insert(table).values(name=ORDER_CHANGES_PRUNED_KEY, version=pruned_through)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=['name'], set_={'version': stmt.excluded.version}
+            ))
+    return removed
+
+
+@app.route('/api/orders/changes')
+def api_order_changes():
+    """
+    订单增量同步API接口
+    
+    查询参数：
+    - since: 上次返回的 cursor
+    - limit: 每次最多返回的订单数，默认500，最大2000
+    
+    Returns:
+        JSON响应：upserted 为新增或修改后的订单，deleted 为已删除的订单ID，
+        cursor 作为下一次的 since；has_more 为 true 时应立即继续请求。
+        reset 为 true 时（首次同步未传 since、变更日志已被清理或游标无效），
+        客户端需通过 /api/orders 重新加载全部订单，之后从返回的 cursor 继续同步
+    """
+    try:
+        since_arg = request.args.get('since', '').strip()
+        try:
+            since = int(since_arg) if since_arg else None
+            limit = int(request.args.get('limit', ORDER_CHANGES_DEFAULT_LIMIT))
+        except ValueError:
+            return jsonify({'success': False, 'message': '参数 since 和 limit 必须为整数'}), 400
+        if since is not None and since < 0:
+            return jsonify({'success': False, 'message': '参数 since 不能为负数'}), 400
+        limit = max(1, min(limit, ORDER_CHANGES_MAX_LIMIT))
+        
+        pruned = db.session.get(DataVersion, ORDER_CHANGES_PRUNED_KEY)
+        pruned_through = pruned.version if pruned is not None else 0
+        latest_seq = db.session.query(func.max(OrderChange.seq)).scalar() or pruned_through
+        if since is None or since < pruned_through or since > latest_seq:
+            return jsonify({
+                'success': True,
+                'reset': True,
+                'message': '请重新加载全部订单，之后从返回的 cursor 继续同步',
+                'upserted': [],
+                'deleted': [],
+                'cursor': str(latest_seq),
+                'has_more': False
+            })
+        
+        rows, deleted, cursor, has_more = get_order_changes(since, limit)
+        return jsonify({
+            'success': True,
+            'reset': False,
+            'upserted': get_order_serializer(API_ORDER_FIELDS).to_dicts(rows),
+            'deleted': deleted,
+            'cursor': str(cursor),
+            'has_more': has_more
+        })
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'获取变更失败：{str(e)}'}), 500
+
+@app.route('/api/update_order/<int:id>', methods=['POST'])
+def api_update_order(id):
+    """
+    更新订单API接口
+    
+    支持部分字段更新，用于前端快速操作
+    """
+    order = Order.query.get_or_404(id)
+    data = request.get_json()
+    
+    try:
+        # 根据传入的数据更新相应字段
+        if 'deposit_paid' in data:
+            order.deposit_paid = data['deposit_paid']
+        if 'blank_purchased' in data:
+            order.blank_purchased = data['blank_purchased']
+        if 'status' in data:
+            order.status = data['status']
+        if 'contact' in data:
+            order.contact = data['contact']
+        if 'shipping_included' in data:
+            order.shipping_included = data['shipping_included']
+        if 'cake_box' in data:
+            order.cake_box = data['cake_box']
+        if 'needed_date' in data:
+            order.needed_date = datetime.strptime(data['needed_date'], '%Y-%m-%d').date()
+        
+        db.session.commit()
+        return jsonify({'success': True, 'message': '更新成功'})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@app.route('/api/batch_delete', methods=['POST'])
+def api_batch_delete():
+    """
+    批量删除订单API接口
+    
+    接收订单ID列表，批量删除订单
+    """
+    data = request.get_json()
     order_ids = data.get('order_ids', [])
     
     try:
         if not order_ids:
             return jsonify({'success': False, 'message': '请选择要删除的订单'}), 400
         
-        # 批量删除订单
+        # 批量删除订单（批量删除不触发ORM事件，先扣除统计汇总）
+        subtract_orders_from_stats(Order.id.in_(order_ids))
         deleted_count = Order.query.filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
         db.session.commit()
         
@@ -330,6 +1371,145 @@ def api_batch_delete():
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
+# 批量修改允许的字段及类型（与 api_update_order 支持的字段一致）
+ORDER_PATCH_FIELDS = {
+    'deposit_paid': bool,
+    'blank_purchased': bool,
+    'shipping_included': bool,
+    'status': str,
+    'contact': str,
+    'cake_box': str,
+    'needed_date': date,
+}
+BATCH_UPDATE_MAX_PATCHES = 1000  # 单次请求最多修改的订单数
+
+
+def parse_order_patch(fields):
+    """
+    校验并转换单个订单的修改字段
+    
+    Returns:
+        dict: 字段名 -> 数据库值
+    
+    Raises:
+        ValueError: 字段不支持或值格式错误
+    """
+    if not isinstance(fields, dict) or not fields:
+        raise ValueError('fields 必须是非空对象')
+    values = {}
+    for name, value in fields.items():
+        kind = ORDER_PATCH_FIELDS.get(name)
+        if kind is None:
+            raise ValueError(f'不支持修改字段：{name}')
+        if kind is bool:
+            if not isinstance(value, bool):
+                raise ValueError(f'字段 {name} 必须为布尔值')
+        elif kind is str:
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f'字段 {name} 不能为空')
+            value = value.strip()
+        else:
+            try:
+                value = datetime.strptime(value, '%Y-%m-%d').date()
+            except (TypeError, ValueError):
+                raise ValueError(f'字段 {name} 日期格式错误，应为YYYY-MM-DD')
+        values[name] = value
+    return values
+
+
+def batch_update_orders(patches):
+    """
+    在一个事务中批量修改订单
+    
+    修改内容相同的订单合并为一条 UPDATE ... WHERE id IN (...)，
+    同一订单出现多次时按顺序合并字段。格式错误或不存在的订单记为失败，不影响其他订单；
+    数据库出错时整批回滚并抛出异常。
+    Core UPDATE 不触发 ORM 事件，涉及 status/contact 的订单在修改前后手动维护统计汇总。
+    
+    Args:
+        patches (list): [{'id': 订单ID, 'fields': {字段: 值}}]
+    
+    Returns:
+        list: 每个订单的结果 [{'id', 'success', 'message'}]，顺序与首次出现的顺序一致
+    """
+    results = OrderedDict()  # 订单ID -> 结果
+    merged = OrderedDict()  # 订单ID -> 合并后的修改值
+    for index, patch in enumerate(patches, 1):
+        order_id = patch.get('id') if isinstance(patch, dict) else None
+        if not isinstance(order_id, int) or isinstance(order_id, bool):
+            results[f'#{index}'] = {'id': order_id, 'success': False, 'message': f'第 {index} 项缺少有效的订单id'}
+            continue
+        if order_id in results and not results[order_id]['success']:
+            continue
+        try:
+            values = parse_order_patch(patch.get('fields'))
+        except ValueError as e:
+            merged.pop(order_id, None)
+            results[order_id] = {'id': order_id, 'success': False, 'message': str(e)}
+            continue
+        merged.setdefault(order_id, {}).update(values)
+        results[order_id] = {'id': order_id, 'success': True, 'message': '更新成功'}
+    
+    if merged:
+        existing = {row[0] for row in db.session.query(Order.id).filter(Order.id.in_(list(merged))).all()}
+        for order_id in [order_id for order_id in merged if order_id not in existing]:
+            del merged[order_id]
+            results[order_id] = {'id': order_id, 'success': False, 'message': '订单不存在'}
+    
+    if merged:
+        # 修改内容相同的订单合并为一条UPDATE
+        groups = defaultdict(list)
+        for order_id, values in merged.items():
+            groups[tuple(sorted(values.items()))].append(order_id)
+        stats_ids = [order_id for order_id, values in merged.items() if 'status' in values or 'contact' in values]
+        table = Order.__table__
+        now = datetime.utcnow()
+        try:
+            if stats_ids:
+                subtract_orders_from_stats(Order.id.in_(stats_ids))
+            conn = db.session.connection()
+            for values, ids in groups.items():
+                conn.execute(table.update().where(table.c.id.in_(ids)).values(dict(values, updated_at=now)))
+            if stats_ids:
+                add_orders_to_stats(Order.id.in_(stats_ids))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    
+    return list(results.values())
+
+
+@app.route('/api/orders/batch_update', methods=['POST'])
+def api_batch_update_orders():
+    """
+    批量修改订单API接口
+    
+    请求体：{"patches": [{"id": 1, "fields": {"status": "已发货"}}, ...]}
+    可修改字段与 /api/update_order 相同。所有有效的修改在同一个事务中提交，
+    返回每个订单的处理结果
+    """
+    data = request.get_json(silent=True) or {}
+    patches = data.get('patches')
+    if not isinstance(patches, list) or not patches:
+        return jsonify({'success': False, 'message': '请提供要修改的订单列表 patches'}), 400
+    if len(patches) > BATCH_UPDATE_MAX_PATCHES:
+        return jsonify({'success': False, 'message': f'单次最多修改 {BATCH_UPDATE_MAX_PATCHES} 个订单'}), 400
+    
+    try:
+        results = batch_update_orders(patches)
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'批量修改失败：{str(e)}'}), 500
+    
+    updated_count = sum(1 for result in results if result['success'])
+    return jsonify({
+        'success': True,
+        'message': f'成功修改 {updated_count} 个订单',
+        'updated_count': updated_count,
+        'failed_count': len(results) - updated_count,
+        'results': results
+    })
+
 # ==================== Dashboard页面路由 ====================
 
 @app.route('/dashboard')
@@ -342,53 +1522,9 @@ def dashboard_index():
     - 支持按平台筛选
     - 支持显示/隐藏已完成订单
     - 计算订单统计信息
+    - 订单未变化时直接返回304（见 render_order_list）
     """
-    
-    # 获取URL参数
-    sort_by = request.args.get('sort', 'needed_date')  # 排序字段
-    order = request.args.get('order', 'asc')  # 排序方向
-    show_completed = request.args.get('show_completed', 'false') == 'true'  # 是否显示已完成
-    platform_filter = request.args.get('platform', '')  # 平台筛选
-    
-    # 构建数据库查询
-    query = Order.query
-    
-    # 平台筛选
-    if platform_filter:
-        query = query.filter(Order.contact == platform_filter)
-    
-    # 排序
-    if sort_by == 'needed_date':
-        if order == 'desc':
-            orders = query.order_by(Order.needed_date.desc()).all()
-        else:
-            orders = query.order_by(Order.needed_date.asc()).all()
-    elif sort_by == 'order_date':
-        if order == 'desc':
-            orders = query.order_by(Order.order_date.desc()).all()
-        else:
-            orders = query.order_by(Order.order_date.asc()).all()
-    else:
-        orders = query.order_by(Order.needed_date.asc()).all()
-    
-    # 将订单对象转换为字典以便JSON序列化
-    orders_dict = []
-    for order in orders:
-        orders_dict.append({
-            'id': order.id,
-            'cn': order.cn,
-            'character': order.character,
-            'contact': order.contact,
-            'needed_date': order.needed_date.strftime('%Y-%m-%d'),
-            'order_date': order.order_date.strftime('%Y-%m-%d'),
-            'deposit_paid': bool(order.deposit_paid),
-            'final_amount': order.final_amount,
-            'shipping_included': bool(order.shipping_included),
-            'blank_purchased': bool(order.blank_purchased),
-            'status': order.status
-        })
-    
-    return render_template('dashboard_index.html', orders=orders, orders_json=json.dumps(orders_dict), sort_by=sort_by, order=order, show_completed=show_completed, platform_filter=platform_filter)
+    return render_order_list()
 
 @app.route('/analytics')
 def analytics():
@@ -400,37 +1536,35 @@ def analytics():
     - 图表分析
     - TOP5列表
     """
-    orders = Order.query.all()
-    
-    # 计算基本统计
-    total_orders = len(orders)
-    completed_orders = len([o for o in orders if o.status in ['已完成', '已发货']])
-    total_revenue = sum([o.final_amount for o in orders if o.status in ['已完成', '已发货']])
+    # 读取统计汇总（行数只与状态×平台组合有关，与订单总数无关）
+    status_counts = defaultdict(int)
+    platform_orders = defaultdict(int)
+    platform_revenue = defaultdict(float)
+    total_orders = 0
+    completed_orders = 0
+    total_revenue = 0
+    for stat in OrderStat.query.all():
+        total_orders += stat.order_count
+        status_counts[stat.status] += stat.order_count
+        platform_orders[stat.contact] += stat.order_count
+        if stat.status in COMPLETED_STATUSES:
+            completed_orders += stat.order_count
+            total_revenue += stat.revenue_total
+            platform_revenue[stat.contact] += stat.revenue_total
     avg_order_value = total_revenue / completed_orders if completed_orders > 0 else 0
-    
+
     # 准备图表数据
+    status_labels = ['待制作', '已完成', '已发货', '已取消']
     status_chart_data = {
-        'labels': ['待制作', '已完成', '已发货', '已取消'],
-        'data': [
-            len([o for o in orders if o.status == '待制作']),
-            len([o for o in orders if o.status == '已完成']),
-            len([o for o in orders if o.status == '已发货']),
-            len([o for o in orders if o.status == '已取消'])
-        ]
+        'labels': status_labels,
+        'data': [status_counts[label] for label in status_labels]
     }
-    
+
+    platform_labels = ['QQ', '微信', '闲鱼']
     platform_chart_data = {
-        'labels': ['QQ', '微信', '闲鱼'],
-        'orders': [
-            len([o for o in orders if o.contact == 'QQ']),
-            len([o for o in orders if o.contact == '微信']),
-            len([o for o in orders if o.contact == '闲鱼'])
-        ],
-        'revenue': [
-            sum([o.final_amount for o in orders if o.contact == 'QQ' and o.status in ['已完成', '已发货']]),
-            sum([o.final_amount for o in orders if o.contact == '微信' and o.status in ['已完成', '已发货']]),
-            sum([o.final_amount for o in orders if o.contact == '闲鱼' and o.status in ['已完成', '已发货']])
-        ]
+        'labels': platform_labels,
+        'orders': [platform_orders[label] for label in platform_labels],
+        'revenue': [platform_revenue[label] for label in platform_labels]
     }
     
     return render_template('analytics.html',
@@ -470,6 +1604,67 @@ def inventory():
     
     return render_template('inventory.html', inventory_items=inventory_items)
 
+CALENDAR_MAX_DAYS = 366  # /api/calendar 单次查询的最大天数
+CALENDAR_ORDER_FIELDS = ('id', 'cn', 'character', 'contact', 'needed_date', 'order_date', 'status', 'final_amount')
+
+
+def calendar_grid_range(year, month):
+    """
+    日历视图显示的日期范围：从当月1日所在周的周日开始，共42天（6周）
+    
+    Returns:
+        tuple: (起始日期, 结束日期)，均包含
+    """
+    first_day = date(year, month, 1)
+    start = first_day - timedelta(days=(first_day.weekday() + 1) % 7)
+    return start, start + timedelta(days=41)
+
+
+def query_calendar_orders(date_from, date_to):
+    """按 needed_date 范围查询日历显示的订单（走 needed_date 索引，只取需要的列）"""
+    serializer = get_order_serializer(CALENDAR_ORDER_FIELDS)
+    statement = (serializer.select()
+                 .where(Order.needed_date >= date_from, Order.needed_date <= date_to)
+                 .order_by(Order.needed_date.asc(), Order.id.asc()))
+    return serializer.to_dicts(db.session.execute(statement))
+
+
+def compute_calendar_stats(date_from, date_to, today=None):
+    """
+    用一条 GROUP BY 统计范围内各紧急程度的订单数
+    
+    分类与日历颜色一致：已完成/已发货 -> completed，已过期 -> overdue，
+    3天内 -> very_urgent，7天内 -> urgent，其余 -> pending
+    
+    Returns:
+        dict: total 以及各分类的订单数
+    """
+    today = today or date.today()
+    bucket = case(
+        (Order.status.in_(COMPLETED_STATUSES), 'completed'),
+        (Order.needed_date < today, 'overdue'),
+        (Order.needed_date <= today + timedelta(days=3), 'very_urgent'),
+        (Order.needed_date <= today + timedelta(days=7), 'urgent'),
+        else_='pending'
+    )
+    rows = (db.session.query(bucket, func.count(Order.id))
+            .filter(Order.needed_date >= date_from, Order.needed_date <= date_to)
+            .group_by(bucket)
+            .all())
+    stats = {'total': 0, 'completed': 0, 'overdue': 0, 'very_urgent': 0, 'urgent': 0, 'pending': 0}
+    for name, count in rows:
+        stats[name] = count
+        stats['total'] += count
+    return stats
+
+
+def month_range(year, month):
+    """返回某月的第一天和最后一天"""
+    first_day = date(year, month, 1)
+    next_month = date(year + month // 12, month % 12 + 1, 1)
+    return first_day, next_month - timedelta(days=1)
+
+
 @app.route('/calendar')
 def calendar():
     """
@@ -479,48 +1674,135 @@ def calendar():
     - 以日历形式显示订单
     - 按紧急程度标记颜色
     - 显示月度统计信息
+    
+    页面只内嵌当月视图范围内的订单和统计，切换月份时通过 /api/calendar 按范围加载
     """
-    # 获取所有订单
-    orders = Order.query.order_by(Order.needed_date.asc()).all()
-    
-    # 转换为JSON格式
-    orders_json = []
-    for order in orders:
-        orders_json.append({
-            'id': order.id,
-            'cn': order.cn,
-            'character': order.character,
-            'contact': order.contact,
-            'needed_date': order.needed_date.strftime('%Y-%m-%d'),
-            'order_date': order.order_date.strftime('%Y-%m-%d'),
-            'status': order.status,
-            'final_amount': order.final_amount
-        })
+    today = date.today()
+    grid_from, grid_to = calendar_grid_range(today.year, today.month)
+    month_from, month_to = month_range(today.year, today.month)
+    
+    return render_template('calendar.html',
+                         orders_json=json_text(query_calendar_orders(grid_from, grid_to)),
+                         stats_json=json.dumps(compute_calendar_stats(month_from, month_to, today)),
+                         current_date=today)
+
+
+@app.route('/api/calendar')
+def api_calendar():
+    """
+    日历范围查询API接口
+    
+    查询参数：
+    - from / to: needed_date 范围（YYYY-MM-DD，含边界），最多366天
+    - month: 可选，YYYY-MM，统计该月的订单；缺省时统计 from~to 范围
+    
+    Returns:
+        JSON响应包含范围内的订单和按紧急程度的统计；订单未变化时命中 If-None-Match 返回304
+    """
+    try:
+        date_from = _parse_date_arg('from')
+        date_to = _parse_date_arg('to')
+        if date_from is None or date_to is None:
+            raise ValueError('请提供 from 和 to 参数')
+        if date_to < date_from:
+            raise ValueError('to 不能早于 from')
+        if (date_to - date_from).days >= CALENDAR_MAX_DAYS:
+            raise ValueError(f'查询范围不能超过 {CALENDAR_MAX_DAYS} 天')
+        month_arg = request.args.get('month', '').strip()
+        if month_arg:
+            try:
+                month_start = datetime.strptime(month_arg, '%Y-%m').date()
+            except ValueError:
+                raise ValueError('参数 month 格式错误，应为YYYY-MM')
+            stats_from, stats_to = month_range(month_start.year, month_start.month)
+        else:
+            stats_from, stats_to = date_from, date_to
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     
-    # 计算统计信息
     today = date.today()
-    current_month_orders = [o for o in orders if o.needed_date.month == today.month and o.needed_date.year == today.year]
-    
-    urgent_orders = []
-    overdue_orders = []
-    completed_orders = []
-    
-    for order in orders:
-        days_left = (order.needed_date - today).days
-        if order.status in ['已完成', '已发货']:
-            completed_orders.append(order)
-        elif days_left < 0:
-            overdue_orders.append(order)
-        elif days_left <= 7:
-            urgent_orders.append(order)
-    
-    return render_template('calendar.html', 
-                         orders_json=orders_json,
-                         current_date=today,
-                         current_month_orders=current_month_orders,
-                         urgent_orders=urgent_orders,
-                         overdue_orders=overdue_orders,
-                         completed_orders=completed_orders)
+    version = get_orders_version()
+    etag = None
+    if version is not None:
+        etag = make_etag(version, 'calendar', date_from, date_to, stats_from, stats_to, today)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
+    
+    orders = query_calendar_orders(date_from, date_to)
+    response = app.response_class(json_bytes({
+        'success': True,
+        'from': date_from.strftime('%Y-%m-%d'),
+        'to': date_to.strftime('%Y-%m-%d'),
+        'orders': orders,
+        'count': len(orders),
+        'stats': compute_calendar_stats(stats_from, stats_to, today)
+    }), mimetype=app.json.mimetype)
+    if etag:
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+    return response
+
+def revenue_summary_query():
+    """
+    收入统计的聚合查询：按 (contact, 月份) 分组的已完成/待收款订单数和金额
+    
+    只用到 contact、needed_date、status、final_amount，由覆盖索引 ix_order_revenue 提供，
+    索引按 contact 排序，分组时只需对同一平台内的月份做临时排序
+    """
+    completed = Order.status.in_(COMPLETED_STATUSES)
+    pending = Order.status.notin_(COMPLETED_STATUSES + ('已取消',))
+    month = func.strftime('%Y-%m', Order.needed_date)
+    
+    return (db.session.query(
+                Order.contact,
+                month,
+                func.sum(case((completed, 1), else_=0)),
+                func.sum(case((completed, Order.final_amount), else_=0)),
+                func.sum(case((pending, 1), else_=0)),
+                func.sum(case((pending, Order.final_amount), else_=0)))
+            .group_by(Order.contact, month))
+
+
+def compute_revenue_summary():
+    """
+    收入统计聚合
+    
+    一次 GROUP BY (contact, 月份) 的SQL查询同时得到已完成收入和待收款金额，
+    月份按 needed_date 用 strftime('%Y-%m') 分桶，Python 端只合并分组结果
+    
+    Returns:
+        dict: total_revenue/completed_orders/avg_order_value/pending_orders/pending_revenue,
+              platforms {平台: {'revenue', 'orders'}}, monthly [{'month', 'revenue', 'orders'}]（按月份升序）
+    """
+    rows = revenue_summary_query().all()
+    
+    platforms = defaultdict(lambda: {'revenue': 0, 'orders': 0})
+    monthly = defaultdict(lambda: {'revenue': 0, 'orders': 0})
+    total_revenue = 0
+    completed_orders = 0
+    pending_orders = 0
+    pending_revenue = 0
+    for contact, month_key, done_count, done_amount, pending_count, pending_amount in rows:
+        pending_orders += pending_count or 0
+        pending_revenue += pending_amount or 0
+        if not done_count:
+            continue
+        total_revenue += done_amount
+        completed_orders += done_count
+        platforms[contact]['revenue'] += done_amount
+        platforms[contact]['orders'] += done_count
+        monthly[month_key]['revenue'] += done_amount
+        monthly[month_key]['orders'] += done_count
+    
+    return {
+        'total_revenue': total_revenue,
+        'completed_orders': completed_orders,
+        'avg_order_value': total_revenue / completed_orders if completed_orders else 0,
+        'pending_orders': pending_orders,
+        'pending_revenue': pending_revenue,
+        'platforms': dict(platforms),
+        'monthly': [dict(month=key, **monthly[key]) for key in sorted(monthly)],
+    }
 
 @app.route('/revenue')
 def revenue():
@@ -532,54 +1814,23 @@ def revenue():
     - 按平台分析收入分布
     - 月度收入趋势图表
     """
-    from collections import defaultdict
-    import calendar
-    
-    # 获取所有已完成的订单
-    completed_orders = Order.query.filter(Order.status.in_(['已完成', '已发货'])).all()
-    
-    # 计算总收入
-    total_revenue = sum(order.final_amount for order in completed_orders)
-    
-    # 计算平均订单价值
-    avg_order_value = total_revenue / len(completed_orders) if completed_orders else 0
-    
-    # 计算待收款订单
-    pending_orders_list = Order.query.filter(Order.status.notin_(['已完成', '已发货', '已取消'])).all()
-    pending_orders = len(pending_orders_list)
-    pending_revenue = sum(order.final_amount for order in pending_orders_list)
-    
-    # 按平台统计收入
-    platform_revenue = defaultdict(lambda: {'revenue': 0, 'orders': 0})
-    for order in completed_orders:
-        platform_revenue[order.contact]['revenue'] += order.final_amount
-        platform_revenue[order.contact]['orders'] += 1
+    summary = compute_revenue_summary()
     
     # 格式化平台收入数据
     platform_revenue_formatted = {}
-    for platform, data in platform_revenue.items():
+    for platform, data in summary['platforms'].items():
         platform_revenue_formatted[platform] = {
             'revenue': f"{data['revenue']:.0f}",
             'orders': data['orders']
         }
     
-    # 按月统计收入
-    monthly_revenue = defaultdict(lambda: {'revenue': 0, 'orders': 0})
-    for order in completed_orders:
-        month_key = order.needed_date.strftime('%Y-%m')
-        monthly_revenue[month_key]['revenue'] += order.final_amount
-        monthly_revenue[month_key]['orders'] += 1
-    
     # 生成月度数据
     monthly_data = []
     monthly_chart_data = {'labels': [], 'data': []}
-    
-    sorted_months = sorted(monthly_revenue.keys())
     prev_revenue = 0
     
-    for month_key in sorted_months:
-        data = monthly_revenue[month_key]
-        year, month = month_key.split('-')
+    for data in summary['monthly']:
+        year, month = data['month'].split('-')
         month_name = f"{year}年{int(month)}月"
         
         # 计算环比增长
@@ -601,15 +1852,24 @@ def revenue():
         prev_revenue = data['revenue']
     
     return render_template('revenue.html',
-                         total_revenue=f"{total_revenue:.0f}",
-                         completed_orders=len(completed_orders),
-                         avg_order_value=f"{avg_order_value:.0f}",
-                         pending_orders=pending_orders,
-                         pending_revenue=f"{pending_revenue:.0f}",
+                         total_revenue=f"{summary['total_revenue']:.0f}",
+                         completed_orders=summary['completed_orders'],
+                         avg_order_value=f"{summary['avg_order_value']:.0f}",
+                         pending_orders=summary['pending_orders'],
+                         pending_revenue=f"{summary['pending_revenue']:.0f}",
                          platform_revenue=platform_revenue_formatted,
                          monthly_data=monthly_data,
                          monthly_chart_data=monthly_chart_data)
 
+@app.route('/api/revenue')
+def api_revenue():
+    """
+    收入统计API接口
+    
+    返回与收入页面相同的聚合数据（金额不做取整）
+    """
+    return jsonify(dict(success=True, **compute_revenue_summary()))
+
 # 添加模板上下文处理器
 # ==================== 模板上下文处理器 ====================
 
@@ -685,186 +1945,1825 @@ def settings():
     """
     return render_template('settings.html')
 
+# ==================== 管理接口 ====================
+
+def is_admin_request():
+    """
+    当前请求是否有管理权限
+    
+    配置了 ADMIN_TOKEN 时要求请求头 X-Admin-Token（或 Authorization: Bearer）与之一致；
+    未配置时拒绝访问，除非开启了 ADMIN_ALLOW_LOCAL，此时允许本机（127.0.0.1/::1）访问
+    """
+    token = app.config.get('ADMIN_TOKEN')
+    if token:
+        supplied = request.headers.get('X-Admin-Token', '')
+        if not supplied and request.authorization and request.authorization.type == 'bearer':
+            supplied = request.authorization.token or ''  # Prometheus 等只支持 Bearer 认证的客户端
+        return hmac.compare_digest(supplied.encode('utf-8'), token.encode('utf-8'))
+    return app.config['ADMIN_ALLOW_LOCAL'] and request.remote_addr in ('127.0.0.1', '::1')
+
+
+def admin_required(view):
+    """管理接口访问控制（规则见 is_admin_request）"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not is_admin_request():
+            return jsonify({'success': False, 'message': '无权访问管理接口'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def get_database_path():
+    """当前SQLite数据库文件的绝对路径"""
+    return db.engine.url.database
+
+
+@app.route('/api/admin/backup', methods=['POST'])
+@admin_required
+def api_admin_backup():
+    """
+    在线备份数据库API
+    
+    使用SQLite在线备份接口分步复制，备份期间看板等页面可正常读写
+    
+    JSON参数：
+    - mode: store（默认，写入去重仓库并执行保留策略）或 file（完整 .db 文件）
+    
+    Returns:
+        JSON响应包含备份信息和耗时
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        mode = data.get('mode', 'store')
+        if mode == 'store':
+            result = store_backup(get_database_path(), app.config['BACKUP_STORE_DIR'])
+            retention = apply_retention(app.config['BACKUP_STORE_DIR'], **app.config['BACKUP_RETENTION'])
+            result['pruned'] = retention['removed']
+        elif mode == 'file':
+            backup_path = os.path.join(app.config['BACKUP_DIR'], backup_filename())
+            result = online_backup(get_database_path(), backup_path)
+        else:
+            return jsonify({'success': False, 'message': '不支持的备份模式'}), 400
+        return jsonify(dict(success=True, message='数据库备份完成', **result))
+    except Exception as e:
+        return jsonify({'success': False, 'message': f'备份失败：{str(e)}'}), 500
+
+# ==================== 请求指标 ====================
+
+# 请求耗时直方图的桶上限（秒）
+REQUEST_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 单个请求SQL语句数直方图的桶上限（用于发现 N+1 查询）
+REQUEST_QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+
+class Histogram:
+    """Prometheus 风格的累积直方图（调用方负责加锁）"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+def _metric_labels(**labels):
+    """生成 {name="value",...}，按文本格式要求转义"""
+    parts = []
+    for name, value in labels.items():
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _format_bucket(upper):
+    return f'{upper:g}'
+
+
+class RequestMetrics:
+    """
+    按路由端点统计请求耗时、SQL语句数和数据库耗时
+    
+    请求开始时记录时间，SQL钩子把语句数和耗时累加到当前请求（flask.g），
+    请求上下文结束时（流式响应在输出完后）汇总到端点维度
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.latency = {}         # (endpoint, method) -> Histogram
+        self.query_counts = {}    # (endpoint, method) -> Histogram
+        self.responses = defaultdict(int)        # (endpoint, method, status) -> 次数
+        self.sql_queries = defaultdict(int)      # endpoint -> SQL语句数
+        self.sql_seconds = defaultdict(float)    # endpoint -> 数据库耗时
+        self.background_queries = 0              # 请求之外（后台线程、启动迁移）的SQL语句数
+        self.background_seconds = 0.0
+
+    def observe_query(self, seconds):
+        """SQL钩子调用：计入当前请求，没有请求上下文时计入后台"""
+        if has_request_context() and 'metrics_start' in g:
+            g.metrics_queries += 1
+            g.metrics_db_seconds += seconds
+            return
+        with self._lock:
+            self.background_queries += 1
+            self.background_seconds += seconds
+
+    def observe_request(self, endpoint, method, status, seconds, queries, db_seconds):
+        key = (endpoint, method)
+        with self._lock:
+            if key not in self.latency:
+                self.latency[key] = Histogram(REQUEST_LATENCY_BUCKETS)
+                self.query_counts[key] = Histogram(REQUEST_QUERY_BUCKETS)
+            self.latency[key].observe(seconds)
+            self.query_counts[key].observe(queries)
+            self.responses[(endpoint, method, status)] += 1
+            self.sql_queries[endpoint] += queries
+            self.sql_seconds[endpoint] += db_seconds
+
+    def render(self):
+        """导出为 Prometheus 文本格式"""
+        lines = []
+
+        def header(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        def histogram(name, histograms):
+            for (endpoint, method), hist in sorted(histograms.items()):
+                for upper, count in zip(hist.buckets, hist.counts):
+                    labels = _metric_labels(endpoint=endpoint, method=method, le=_format_bucket(upper))
+                    lines.append(f'{name}_bucket{labels} {count}')
+                labels = _metric_labels(endpoint=endpoint, method=method, le='+Inf')
+                lines.append(f'{name}_bucket{labels} {hist.total}')
+                labels = _metric_labels(endpoint=endpoint, method=method)
+                lines.append(f'{name}_sum{labels} {hist.sum:.6f}')
+                lines.append(f'{name}_count{labels} {hist.total}')
+
+        with self._lock:
+            header('coswig_http_request_duration_seconds', 'histogram', '请求耗时（含流式响应输出）')
+            histogram('coswig_http_request_duration_seconds', self.latency)
+            header('coswig_http_requests_total', 'counter', '按状态码统计的请求数')
+            for (endpoint, method, status), count in sorted(self.responses.items()):
+                lines.append(f'coswig_http_requests_total{_metric_labels(endpoint=endpoint, method=method, status=status)} {count}')
+            header('coswig_sql_queries_per_request', 'histogram', '单个请求执行的SQL语句数')
+            histogram('coswig_sql_queries_per_request', self.query_counts)
+            header('coswig_sql_queries_total', 'counter', 'SQL语句数（background 为请求之外执行的语句）')
+            for endpoint, count in sorted(self.sql_queries.items()):
+                lines.append(f'coswig_sql_queries_total{_metric_labels(endpoint=endpoint)} {count}')
+            lines.append(f'coswig_sql_queries_total{_metric_labels(endpoint="background")} {self.background_queries}')
+            header('coswig_sql_seconds_total', 'counter', 'SQL语句执行耗时合计（秒）')
+            for endpoint, seconds in sorted(self.sql_seconds.items()):
+                lines.append(f'coswig_sql_seconds_total{_metric_labels(endpoint=endpoint)} {seconds:.6f}')
+            lines.append(f'coswig_sql_seconds_total{_metric_labels(endpoint="background")} {self.background_seconds:.6f}')
+            header('coswig_process_start_time_seconds', 'gauge', '进程启动时间（Unix时间戳）')
+            lines.append(f'coswig_process_start_time_seconds {self.started_at:.3f}')
+        return '\n'.join(lines) + '\n'
+
+
+request_metrics = RequestMetrics()
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _metrics_before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _metrics_after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('metrics_query_start')
+    if starts:
+        request_metrics.observe_query(time.perf_counter() - starts.pop())
+
+
+@app.before_request
+def _metrics_start_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_db_seconds = 0.0
+
+
+@app.after_request
+def _metrics_record_status(response):
+    g.metrics_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def _metrics_finish_request(exc):
+    """请求上下文结束时汇总（stream_with_context 的响应在输出完之后才会到这里）"""
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return
+    status = g.get('metrics_status', 500) if exc is None else 500
+    # 未匹配路由的请求统一归为 unmatched，避免任意URL产生大量标签
+    endpoint = request.endpoint or 'unmatched'
+    request_metrics.observe_request(endpoint, request.method, status, time.perf_counter() - start,
+                                    g.metrics_queries, g.metrics_db_seconds)
+
+
+@app.route('/metrics')
+@admin_required
+def metrics():
+    """
+    Prometheus 指标
+    
+    按端点输出请求耗时直方图、状态码计数、每请求SQL语句数直方图以及SQL语句数/耗时合计
+    """
+    return app.response_class(request_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+# ==================== 请求性能分析 ====================
+
+app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))  # 分析结果目录
+app.config.setdefault('PROFILE_SAMPLE_INTERVAL', 0.001)  # 采样间隔（秒）
+app.config.setdefault('PROFILE_KEEP', 50)  # 最多保留的分析文件数
+
+PROFILE_FILE_SUFFIX = '.speedscope.json'
+
+
+class StackSampler:
+    """
+    采样式分析器：后台线程按固定间隔读取目标线程的调用栈
+    
+    结果为 speedscope 的 sampled 格式，拖入 https://www.speedscope.app 即可查看火焰图
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.frames = []        # speedscope 共享帧表
+        self._frame_index = {}  # (函数名, 文件, 行号) -> 帧表下标
+        self.samples = []       # 每次采样的调用栈（由外到内的帧下标）
+        self.weights = []       # 每次采样代表的时间（毫秒）
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._started = self._last = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _frame_id(self, code):
+        name = getattr(code, 'co_qualname', code.co_name)
+        key = (name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({'name': name, 'file': code.co_filename, 'line': code.co_firstlineno})
+        return index
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_id(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(round((now - self._last) * 1000, 3))
+            self._last = now
+
+    def to_speedscope(self, name):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'coswig-orders',
+            'activeProfileIndex': 0,
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(self.weights), 3),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+def profile_requested():
+    """请求是否要求性能分析（?_profile=1 或请求头 X-Profile: 1）"""
+    return request.args.get('_profile') == '1' or request.headers.get('X-Profile') == '1'
+
+
+def save_profile(name, data):
+    """写入分析文件并只保留最近 PROFILE_KEEP 个"""
+    profile_dir = app.config['PROFILE_DIR']
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(profile_dir, name + PROFILE_FILE_SUFFIX)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, path)
+    # 文件名以时间开头，按名称排序即按时间排序
+    for old in sorted(list_profiles(), key=lambda p: p['name'])[:-app.config['PROFILE_KEEP']]:
+        try:
+            os.remove(os.path.join(profile_dir, old['name'] + PROFILE_FILE_SUFFIX))
+        except OSError:
+            pass
+    return path
+
+
+def list_profiles():
+    """
+    已保存的分析文件（新的在前）
+    
+    文件名格式为 <时间>_<端点>_<耗时>ms，无需读取文件内容
+    """
+    profile_dir = app.config['PROFILE_DIR']
+    if not os.path.isdir(profile_dir):
+        return []
+    profiles = []
+    for entry in os.scandir(profile_dir):
+        if not entry.name.endswith(PROFILE_FILE_SUFFIX):
+            continue
+        name = entry.name[:-len(PROFILE_FILE_SUFFIX)]
+        parts = name.split('_')
+        if len(parts) < 5:
+            continue
+        try:
+            created_at = datetime.strptime('_'.join(parts[:3]), '%Y%m%d_%H%M%S_%f')
+            duration_ms = int(parts[-1].rstrip('ms'))
+        except ValueError:
+            continue
+        profiles.append({
+            'name': name,
+            'created_at': created_at,
+            'endpoint': '_'.join(parts[3:-1]),
+            'duration_ms': duration_ms,
+            'size': entry.stat().st_size,
+        })
+    profiles.sort(key=lambda p: p['name'], reverse=True)
+    return profiles
+
+
+@app.before_request
+def _start_request_profile():
+    """管理员带 ?_profile=1 或 X-Profile: 1 时对本次请求采样（非管理员忽略该参数）"""
+    if not profile_requested() or not is_admin_request():
+        return
+    g.profile_started_at = datetime.now()
+    g.profiler = StackSampler(threading.get_ident(), app.config['PROFILE_SAMPLE_INTERVAL'])
+    g.profiler.start()
+
+
+@app.after_request
+def _mark_profiled_response(response):
+    if 'profiler' in g:
+        response.headers['X-Profile'] = 'sampling'
+        response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+@app.teardown_request
+def _finish_request_profile(exc):
+    """请求上下文结束时（流式响应输出完后）停止采样并保存"""
+    sampler = g.pop('profiler', None)
+    if sampler is None:
+        return
+    sampler.stop()
+    endpoint = (request.endpoint or 'unmatched').replace('.', '-')
+    name = f"{g.profile_started_at.strftime('%Y%m%d_%H%M%S_%f')}_{endpoint}_{int(sampler.elapsed * 1000)}ms"
+    try:
+        save_profile(name, sampler.to_speedscope(f'{request.method} {request.full_path.rstrip("?")}'))
+    except OSError as e:
+        app.logger.warning('保存性能分析文件失败: %s', e)
+
+
+@app.route('/admin/profiles')
+@admin_required
+def admin_profiles():
+    """最近的请求性能分析文件列表"""
+    return render_template('profiles.html', profiles=list_profiles(), keep=app.config['PROFILE_KEEP'])
+
+
+@app.route('/admin/profiles/<name>')
+@admin_required
+def admin_profile_download(name):
+    """下载分析文件（speedscope JSON）"""
+    path = safe_join(app.config['PROFILE_DIR'], name + PROFILE_FILE_SUFFIX)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return send_file(path, mimetype='application/json', as_attachment=True,
+                     download_name=name + PROFILE_FILE_SUFFIX, max_age=0)
+
+# ==================== 数据导出 ====================
+
+EXPORT_BATCH_SIZE = 500  # 流式导出每批读取/输出的行数
+
+# CSV列标题（中文，Excel兼容）
+EXPORT_CSV_HEADER = ['ID', 'CN', '动漫角色', '联系方式', '客户排单', 'DDL',
+                     '定金已付', '尾款金额', '尾款含邮', '毛坯已购', '创建时间', '订单状态']
+
+# 导出的订单字段（JSON导出的键名，CSV列顺序与 EXPORT_CSV_HEADER 对应）
+EXPORT_FIELDS = (
+    'id', 'cn', 'character', 'contact', 'needed_date', 'order_date',
+    'deposit_paid', 'final_amount', 'shipping_included', 'blank_purchased',
+    'created_at', 'status'
+)
+EXPORT_JSON_SERIALIZER = OrderRowSerializer(EXPORT_FIELDS)
+EXPORT_CSV_SERIALIZER = OrderRowSerializer(EXPORT_FIELDS, expressions=ORDER_CSV_EXPRESSIONS)
+
+
+def iter_export_rows(serializer, batch_size=EXPORT_BATCH_SIZE):
+    """按ID顺序分批读取导出所需的列（yield_per 游标，行为元组）"""
+    statement = serializer.select().order_by(Order.id)
+    return db.session.execute(statement, execution_options={'yield_per': batch_size})
+
+
+def iter_orders_csv(batch_size=EXPORT_BATCH_SIZE):
+    """
+    逐批生成CSV文本（utf-8-sig，首块包含BOM和表头）
+    
+    需要在应用上下文中迭代
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow(EXPORT_CSV_HEADER)
+    for rows in iter_export_rows(EXPORT_CSV_SERIALIZER, batch_size).partitions():
+        writer.writerows(rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    yield buffer.getvalue()
+
+
+def iter_orders_json(batch_size=EXPORT_BATCH_SIZE):
+    """
+    逐批生成JSON数组文本，每个订单占一行
+    
+    需要在应用上下文中迭代
+    """
+    yield '['
+    separator = '\n'
+    for rows in iter_export_rows(EXPORT_JSON_SERIALIZER, batch_size).partitions():
+        items = [json_text(item) for item in EXPORT_JSON_SERIALIZER.to_dicts(rows)]
+        yield separator + ',\n'.join(items)
+        separator = ',\n'
+    yield '\n]\n'
+
+
+# 导出文件缓存（/api/export_data 和后台导出任务生成的文件）
+app.config.setdefault('EXPORT_ARTIFACT_DIR', os.path.join(app.instance_path, 'exports'))
+app.config.setdefault('EXPORT_ARTIFACT_TTL', 24 * 3600)  # 文件超过该秒数未被使用即删除
+app.config.setdefault('EXPORT_ARTIFACT_MAX_BYTES', 512 * 1024 * 1024)  # 目录总大小上限，超出时删除最久未使用的文件
+
+EXPORT_ARTIFACT_REVISION = 1  # 导出内容格式变化时递增，旧文件不再复用
+EXPORT_ARTIFACT_NAME = re.compile(r'^orders_[0-9a-f]{16}\.(json|csv)$')
+EXPORT_MIMETYPES = {'json': 'application/json', 'csv': 'text/csv'}
+
+
+class ExportArtifactStore:
+    """
+    导出文件缓存
+    
+    文件名由导出格式和订单数据指纹（版本号、订单数、最后修改时间）计算得出，
+    订单表没有变化时再次导出直接复用已有文件；超过 EXPORT_ARTIFACT_TTL 未被使用的文件
+    和超出 EXPORT_ARTIFACT_MAX_BYTES 时最久未使用的文件在每次生成新文件后删除。
+    文件的 mtime 是生成时间（用于下载文件名），atime 是最近使用时间（复用时显式更新，用于过期清理）。
+    
+    导出在一个读事务中完成。WAL模式下读事务不阻塞写入；其他日志模式下读取期间数据库不能写入，
+    此时不汇报进度（进度写入会等待超时失败），导出期间其他写请求也会等待
+    """
+
+    def __init__(self):
+        self._build_lock = threading.Lock()  # 同一时间只生成一个导出文件
+
+    @property
+    def directory(self):
+        os.makedirs(app.config['EXPORT_ARTIFACT_DIR'], exist_ok=True)
+        return app.config['EXPORT_ARTIFACT_DIR']
+
+    def fingerprint(self, export_format):
+        """
+        订单数据指纹
+        
+        须在 get_or_create 开启的读事务中调用，与之后的导出查询读取同一个快照
+        
+        Returns:
+            tuple: (指纹，尚未执行迁移时为None, 订单数)
+        """
+        version = get_orders_version()
+        count, last_update = db.session.execute(
+            select(func.count(Order.id), func.max(Order.updated_at))
+        ).one()
+        if version is None:
+            return None, count
+        raw = f'{EXPORT_ARTIFACT_REVISION}|{export_format}|{version}|{count}|{last_update}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:16], count
+
+    def path_for(self, name):
+        """已存在的导出文件路径；文件名不合法或文件不存在时返回None"""
+        if not EXPORT_ARTIFACT_NAME.match(name):
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def download_name(self, path):
+        """下载时使用的文件名（按文件生成时间，复用文件时不变）"""
+        created = datetime.fromtimestamp(os.path.getmtime(path))
+        return f"orders_export_{created.strftime('%Y%m%d_%H%M%S')}{os.path.splitext(path)[1]}"
+
+    def get_or_create(self, export_format, progress=None):
+        """
+        返回当前订单数据的导出文件，不存在时生成
+        
+        Args:
+            export_format (str): json 或 csv
+            progress: 可选，生成文件时每写入一批调用 progress(百分比, 说明)；非WAL模式下不调用
+        
+        Returns:
+            dict: name（文件名）、path、count（订单数）、reused（是否复用已有文件）
+        """
+        with self._build_lock:
+            # pysqlite 不会为 SELECT 自动开启事务，显式 BEGIN 后指纹和分批导出读取同一个快照，
+            # 期间的写入既不计入指纹也不写入文件
+            db.session.commit()
+            connection = db.session.connection()
+            if connection.exec_driver_sql('PRAGMA journal_mode').scalar().lower() != 'wal':
+                progress = None
+            connection.exec_driver_sql('BEGIN')
+            try:
+                digest, count = self.fingerprint(export_format)
+                name = f'orders_{digest or uuid.uuid4().hex[:16]}.{export_format}'
+                path = os.path.join(self.directory, name)
+                reused = digest is not None and os.path.isfile(path)
+                if reused:
+                    # 只更新使用时间（atime），保留生成时间（mtime），推迟过期
+                    os.utime(path, (time.time(), os.path.getmtime(path)))
+                else:
+                    self._write(path, export_format, count, progress)
+            finally:
+                db.session.rollback()  # 只读事务，直接结束
+        if not reused:
+            self.cleanup(keep=name)
+        return {'name': name, 'path': path, 'count': count, 'reused': reused}
+
+    def _write(self, path, export_format, total, progress):
+        chunks = iter_orders_json() if export_format == 'json' else iter_orders_csv()
+        temp_path = f'{path}.{uuid.uuid4().hex[:8]}.tmp'
+        try:
+            with open(temp_path, 'w', encoding='utf-8', newline='') as f:
+                # 首块只有数组开头或表头，之后每块为 EXPORT_BATCH_SIZE 行
+                for index, chunk in enumerate(chunks):
+                    f.write(chunk)
+                    if progress is not None and total:
+                        done = min(index * EXPORT_BATCH_SIZE, total)
+                        progress(done * 100 / total, f'已导出 {done} 条')
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def cleanup(self, keep=None):
+        """
+        删除过期文件，再按最久未使用的顺序删除文件直到总大小不超过上限
+        
+        Returns:
+            int: 删除的文件数
+        """
+        now = time.time()
+        ttl = app.config['EXPORT_ARTIFACT_TTL']
+        entries = []
+        removed = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith('.tmp'):
+                    # 生成中的临时文件，只删除异常退出遗留的
+                    expired = now - stat.st_mtime > ttl
+                elif EXPORT_ARTIFACT_NAME.match(entry.name):
+                    used_at = max(stat.st_atime, stat.st_mtime)
+                    expired = entry.name != keep and now - used_at > ttl
+                    if not expired:
+                        entries.append((used_at, stat.st_size, entry.path, entry.name))
+                        continue
+                else:
+                    continue
+                if expired and self._remove(entry.path):
+                    removed += 1
+        
+        total_size = sum(size for _, size, _, _ in entries)
+        for _, size, path, name in sorted(entries):
+            if total_size <= app.config['EXPORT_ARTIFACT_MAX_BYTES']:
+                break
+            if name != keep and self._remove(path):
+                total_size -= size
+                removed += 1
+        return removed
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+
+export_artifacts = ExportArtifactStore()
+
+
+@app.route('/api/export_stream')
+def api_export_stream():
+    """
+    流式导出订单数据
+    
+    查询参数：
+    - format: 导出格式 (json 或 csv)
+    
+    边查询边输出（分块传输），内存占用与订单数量无关，不在服务器上生成文件
+    """
+    export_format = request.args.get('format', 'json').lower()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    
+    if export_format == 'json':
+        body = iter_orders_json()
+        mimetype = 'application/json'
+    elif export_format == 'csv':
+        body = iter_orders_csv()
+        mimetype = 'text/csv'
+    else:
+        return jsonify({'success': False, 'message': '不支持的导出格式'}), 400
+    
+    filename = f"orders_export_{timestamp}.{export_format}"
+    return app.response_class(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Cache-Control': 'no-store',
+        }
+    )
+
 @app.route('/api/export_data', methods=['POST'])
 def api_export_data():
     """
-    导出订单数据API
+    导出订单数据API
+    
+    POST参数：
+    - format: 导出格式 (json 或 csv)
+    
+    文件保存在导出缓存目录，订单数据没有变化时复用上次导出的文件
+    
+    Returns:
+        JSON响应包含下载链接
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        export_format = str(data.get('format', 'json')).lower()
+        if export_format not in EXPORT_MIMETYPES:
+            return jsonify({'success': False, 'message': '不支持的导出格式'}), 400
+        
+        artifact = export_artifacts.get_or_create(export_format)
+        return jsonify({
+            'success': True,
+            'message': '数据未变化，复用上次导出的文件' if artifact['reused'] else '数据导出成功',
+            'filename': artifact['name'],
+            'count': artifact['count'],
+            'reused': artifact['reused'],
+            'download_url': url_for('download_file', filename=artifact['name'])
+        })
+            
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'导出失败：{str(e)}'}), 500
+
+# ==================== 数据导入 ====================
+
+IMPORT_BATCH_SIZE = 500  # 每个事务插入的订单数
+IMPORT_MAX_REPORTED_ERRORS = 100  # 响应中最多列出的错误条数
+IMPORT_REQUIRED_FIELDS = ('cn', 'character', 'contact', 'needed_date', 'order_date', 'final_amount')
+IMPORT_TEXT_FIELDS = ('cn', 'character', 'contact', 'cake_box', 'status')  # 必须为字符串的字段（可选字段缺省时不检查）
+IMPORT_READ_CHUNK = 64 * 1024  # 流式解析每次读取的字节数
+IMPORT_MAX_RECORD_CHARS = 1024 * 1024  # 单条记录的最大长度，超过视为格式错误（防止错误文件被整个读入内存）
+IMPORT_FILE_EXTENSIONS = ('.json', '.ndjson', '.jsonl')
+
+_JSON_DECODER = json.JSONDecoder()
+_JSON_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def _iter_text_chunks(stream):
+    """按块读取二进制文件并解码为文本（utf-8，去掉BOM）"""
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        data = stream.read(IMPORT_READ_CHUNK)
+        text_chunk = decoder.decode(data, final=not data)
+        if text_chunk:
+            yield text_chunk
+        if not data:
+            return
+
+
+def iter_import_records(stream):
+    """
+    流式解析导入文件中的订单记录
+    
+    支持两种格式（按第一个非空白字符判断）：
+    - JSON数组：[{...}, {...}]，即导出文件的格式，逐个元素解析
+    - NDJSON：每行一个JSON对象，空行忽略；无法解析的行以 ValueError 对象返回，导入时记为格式错误
+    
+    内存中只保留当前读取块和正在解析的记录，占用与文件大小无关
+    
+    Args:
+        stream: 以二进制方式打开的文件对象（utf-8编码，可带BOM）
+    
+    Raises:
+        ValueError: 文件为空，或JSON数组格式错误（之前的批次已经提交）
+    """
+    chunks = _iter_text_chunks(stream)
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        if buffer.strip():
+            break
+    stripped = buffer.lstrip()
+    if not stripped:
+        raise ValueError('文件为空')
+    if stripped[0] == '[':
+        return _iter_json_array(stripped, chunks)
+    return _iter_ndjson(buffer, chunks)
+
+
+def _iter_json_array(buffer, chunks):
+    pos = 1  # 跳过 '['
+    index = 0
+    
+    def read_more():
+        nonlocal buffer, pos
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer = buffer[pos:] + chunk
+        pos = 0
+        return True
+    
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            pos = _JSON_WHITESPACE.match(buffer, pos).end()
+            if pos < len(buffer) or not read_more():
+                return pos < len(buffer)
+    
+    expect_value = True
+    while True:
+        if not skip_whitespace():
+            raise ValueError('JSON文件格式错误：订单数组不完整')
+        char = buffer[pos]
+        if char == ']' and (index == 0 or not expect_value):
+            pos += 1
+            break
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f'JSON文件格式错误：第{index}条记录之后应为逗号')
+            pos += 1
+            expect_value = True
+            continue
+        
+        while True:
+            try:
+                value, end = _JSON_DECODER.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 记录可能被读取块截断，读入后续内容再解析
+                if len(buffer) - pos <= IMPORT_MAX_RECORD_CHARS and read_more():
+                    continue
+                raise ValueError(f'JSON文件格式错误：第{index + 1}条记录无法解析')
+            if end == len(buffer) and read_more():
+                continue  # 数字等值在块末尾时可能不完整
+            break
+        pos = end
+        index += 1
+        expect_value = False
+        yield value
+    
+    if skip_whitespace():
+        raise ValueError('JSON文件格式错误：订单数组之后还有内容')
+
+
+def _iter_ndjson(buffer, chunks):
+    line_number = 0
+    start = 0
+    while True:
+        newline = buffer.find('\n', start)
+        if newline < 0:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                if len(buffer) - start > IMPORT_MAX_RECORD_CHARS:
+                    raise ValueError(f'NDJSON文件格式错误：第{line_number + 1}行过长')
+                buffer = buffer[start:] + chunk
+                start = 0
+                continue
+            line, start = buffer[start:], len(buffer)
+        else:
+            line, start = buffer[start:newline], newline + 1
+        
+        line_number += 1
+        line = line.strip()
+        if line:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                yield ValueError(f'第{line_number}行不是有效的JSON')
+        if newline < 0:
+            return
+
+
+def parse_import_record(data):
+    """
+    将导入文件中的一条订单转换为订单表的列值
+    
+    Raises:
+        ValueError: 缺少必需字段或字段格式错误
+    """
+    if isinstance(data, ValueError):
+        raise data  # iter_import_records 中无法解析的行
+    if not isinstance(data, dict):
+        raise ValueError('记录格式错误：应为对象')
+    missing = [field for field in IMPORT_REQUIRED_FIELDS if data.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"缺少字段：{', '.join(missing)}")
+    not_text = [field for field in IMPORT_TEXT_FIELDS
+                if data.get(field) is not None and not isinstance(data[field], str)]
+    if not_text:
+        raise ValueError(f"字段应为字符串：{', '.join(not_text)}")
+    
+    try:
+        needed_date = date.fromisoformat(str(data['needed_date']))
+        order_date = date.fromisoformat(str(data['order_date']))
+    except ValueError:
+        raise ValueError('日期格式错误，应为YYYY-MM-DD')
+    try:
+        final_amount = float(data['final_amount'])
+    except (TypeError, ValueError):
+        raise ValueError('尾款金额必须为数字')
+    if not math.isfinite(final_amount):
+        raise ValueError('尾款金额必须为有限数字')
+    
+    # 如果备份文件包含创建时间，保持原始时间
+    created_at = None
+    if data.get('created_at'):
+        try:
+            created_at = datetime.strptime(data['created_at'], '%Y-%m-%d %H:%M:%S')
+        except (TypeError, ValueError):
+            pass
+    
+    return {
+        'cn': data['cn'],
+        'character': data['character'],
+        'contact': data['contact'],
+        'needed_date': needed_date,
+        'order_date': order_date,
+        'deposit_paid': bool(data.get('deposit_paid', False)),
+        'final_amount': final_amount,
+        'shipping_included': bool(data.get('shipping_included', False)),
+        'blank_purchased': bool(data.get('blank_purchased', False)),
+        'cake_box': data.get('cake_box') or '不需要',
+        'created_at': created_at or datetime.utcnow(),
+        'status': data.get('status') or '待制作',
+    }
+
+
+# 本批去重键（JSON数组）中已存在的订单：SQL固定只编译一次，每个键走一次 ix_order_import_key 查找
+IMPORT_EXISTING_KEYS_SQL = text('''
+    SELECT o.cn, o."character", o.needed_date
+    FROM json_each(:keys) AS k
+    JOIN "order" AS o ON o.cn = json_extract(k.value, '$[0]')
+        AND o."character" = json_extract(k.value, '$[1]')
+        AND o.needed_date = json_extract(k.value, '$[2]')
+''')
+
+
+def _records_until_error(records, result):
+    """逐条返回记录；迭代器抛出 ValueError（文件格式错误）时停止，并记入 result['fatal_error']"""
+    iterator = iter(records)
+    while True:
+        try:
+            data = next(iterator)
+        except StopIteration:
+            return
+        except ValueError as e:
+            result['fatal_error'] = str(e)
+            return
+        yield data
+
+
+def import_orders(records, clear_existing=False, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    批量导入订单
+    
+    按批解析记录，每批用一次索引查询按 (cn, character, needed_date) 跳过已有订单（包括本次之前批次已导入的），
+    再用 executemany 插入，每批一个事务，同时维护统计汇总。
+    records 可以是 iter_import_records 返回的迭代器，内存占用只与批大小有关；
+    迭代中途遇到文件格式错误时导入已读出的记录后停止，写入数据库失败时回滚当前批次后停止，
+    两种情况下之前的批次都已提交，错误记入 fatal_error。
+    
+    Args:
+        records (iterable): 订单字典序列
+        clear_existing (bool): 导入前清空现有订单（此时不做去重）
+        batch_size (int): 每批插入的订单数
+        progress (callable): 每批提交后调用 progress(已处理的记录数)，用于后台任务汇报进度
+    
+    Returns:
+        dict: imported_count/skipped_count/error_count，errors 列表 [{'index', 'cn', 'message'}]，
+              以及 fatal_error（文件格式错误或写入失败导致中途停止时的说明，否则为None）
+    """
+    if clear_existing:
+        Order.query.delete()
+        OrderStat.query.delete()
+        db.session.commit()
+    
+    result = {'imported_count': 0, 'skipped_count': 0, 'error_count': 0, 'errors': [], 'fatal_error': None}
+    insert_stmt = Order.__table__.insert()
+    batch = []
+    batch_keys = set()  # 本批的去重键，批内重复的记录直接跳过
+    
+    def flush_batch():
+        rows = batch
+        if not clear_existing:
+            keys = json.dumps([(cn, character, needed_date.isoformat()) for cn, character, needed_date in batch_keys])
+            existing = set(db.session.execute(IMPORT_EXISTING_KEYS_SQL, {'keys': keys}).all())
+            if existing:
+                rows = [row for row in batch
+                        if (row['cn'], row['character'], row['needed_date'].isoformat()) not in existing]
+                result['skipped_count'] += len(batch) - len(rows)
+        deltas = defaultdict(lambda: (0, 0))
+        for row in rows:
+            key = _stats_key(row['status'], row['contact'])
+            deltas[key] = (deltas[key][0] + 1, deltas[key][1] + row['final_amount'])
+        try:
+            conn = db.session.connection()
+            if rows:
+                conn.execute(insert_stmt, rows)
+                _adjust_order_stats(conn, deltas)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            app.logger.exception('导入订单写入失败')
+            result['fatal_error'] = f'写入数据库失败，第{processed}条及之前未提交的记录未导入：{str(getattr(e, "orig", e))}'
+            return False
+        result['imported_count'] += len(rows)
+        batch.clear()
+        batch_keys.clear()
+        if progress is not None:
+            progress(processed)
+        return True
+    
+    processed = 0
+    for index, data in enumerate(_records_until_error(records, result), 1):
+        processed = index
+        try:
+            row = parse_import_record(data)
+        except ValueError as e:
+            result['error_count'] += 1
+            if len(result['errors']) < IMPORT_MAX_REPORTED_ERRORS:
+                cn = data.get('cn') if isinstance(data, dict) else None
+                result['errors'].append({'index': index, 'cn': cn, 'message': str(e)})
+            continue
+        
+        if not clear_existing:
+            key = (row['cn'], row['character'], row['needed_date'])
+            if key in batch_keys:
+                result['skipped_count'] += 1
+                continue
+            batch_keys.add(key)
+        
+        batch.append(row)
+        if len(batch) >= batch_size and not flush_batch():
+            break
+    else:
+        # 正常读完（或文件格式错误停止）时导入剩余的记录；写入失败中断时不再写入
+        if batch:
+            flush_batch()
+    if progress is not None:
+        progress(processed)
+    return result
+
+
+def import_result_message(result):
+    """导入结果说明"""
+    message = f"成功导入 {result['imported_count']} 条订单"
+    if result['skipped_count'] > 0:
+        message += f"，跳过 {result['skipped_count']} 条重复订单"
+    if result['error_count'] > 0:
+        message += f"，{result['error_count']} 条格式错误"
+    if result.get('fatal_error'):
+        message += f"；{result['fatal_error']}，之后的记录未导入"
+    return message
+
+
+def import_orders_from_file(stream, clear_existing=False, progress=None):
+    """
+    从文件流式导入订单（JSON数组或NDJSON）
+    
+    清空现有数据时先完整解析一遍文件并逐条校验（不保留记录），文件格式错误或有任何无效记录时
+    不删除旧订单；不清空时直接导入，无效记录计入 errors，中途出错返回已导入的部分和 fatal_error
+    
+    Args:
+        stream: 以二进制方式打开、可 seek 的文件对象
+        clear_existing (bool): 导入前清空现有订单
+        progress (callable): 同 import_orders
+    
+    Raises:
+        ValueError: 文件为空，或清空现有数据时文件格式错误/有无效记录（此时没有修改数据库）
+    """
+    if clear_existing:
+        start = stream.tell()
+        for index, data in enumerate(iter_import_records(stream), 1):
+            try:
+                parse_import_record(data)
+            except ValueError as e:
+                raise ValueError(f'第{index}条记录无效（{str(e)}），清空导入要求所有记录有效，未修改现有数据')
+        stream.seek(start)
+    return import_orders(iter_import_records(stream), clear_existing=clear_existing, progress=progress)
+
+
+@app.route('/api/import_data', methods=['POST'])
+def api_import_data():
+    """
+    导入订单数据API
+    
+    文件上传：
+    - file: 订单数据文件，JSON数组或NDJSON（每行一个订单）
+    - clear_existing: 是否清空现有数据 (可选，默认false)
+    
+    直接从上传流中逐条解析，分批导入；文件中途格式错误时返回400，
+    响应中包含错误之前已导入的数量和 fatal_error
+    
+    Returns:
+        JSON响应，errors 中列出导入失败的记录序号和原因
+    """
+    try:
+        if 'file' not in request.files:
+            return jsonify({'success': False, 'message': '未选择文件'}), 400
+        
+        file = request.files['file']
+        if file.filename == '':
+            return jsonify({'success': False, 'message': '未选择文件'}), 400
+        
+        # 检查文件扩展名
+        if not file.filename.lower().endswith(IMPORT_FILE_EXTENSIONS):
+            return jsonify({'success': False, 'message': '只支持JSON或NDJSON格式文件'}), 400
+        
+        clear_existing = request.form.get('clear_existing', 'false').lower() == 'true'
+        
+        try:
+            result = import_orders_from_file(file.stream, clear_existing=clear_existing)
+        except ValueError as e:
+            return jsonify({'success': False, 'message': f'文件格式错误：{str(e)}'}), 400
+        if result['fatal_error']:
+            return jsonify(dict(success=False, message=import_result_message(result), **result)), 400
+        return jsonify(dict(success=True, message=import_result_message(result), **result))
+            
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': f'导入失败：{str(e)}'}), 500
+
+@app.route('/download/<filename>')
+def download_file(filename):
+    """
+    下载导出的文件（只提供导出缓存目录中的文件）
+    """
+    path = export_artifacts.path_for(filename)
+    if path is None:
+        flash('文件不存在或已过期，请重新导出', 'error')
+        return redirect(url_for('settings'))
+    return send_file(path, mimetype=EXPORT_MIMETYPES[filename.rsplit('.', 1)[1]], as_attachment=True,
+                     download_name=export_artifacts.download_name(path))
+
+# ==================== 后台任务 ====================
+
+app.config.setdefault('JOB_DIR', os.path.join(app.instance_path, 'jobs'))  # 导入任务上传文件目录
+app.config.setdefault('JOB_MAX_WORKERS', int(os.environ.get('COSWIG_JOB_WORKERS', 1)))  # 同时执行的任务数
+app.config.setdefault('JOB_MAX_PENDING', 8)  # 排队+执行中的任务上限，超过时拒绝提交
+app.config.setdefault('JOB_YIELD_SECONDS', 0.01)  # 每批处理后让出的时间，避免批量任务挤占页面请求
+app.config.setdefault('JOB_RETENTION_DAYS', 7)  # 已结束任务及其文件的保留天数
+
+JOB_PROGRESS_INTERVAL = 0.5  # 进度写入数据库的最小间隔（秒）
+JOB_ACTIVE_STATUSES = ('queued', 'running')
+
+
+def job_to_dict(job):
+    """任务状态（轮询接口返回）"""
+    result = json.loads(job.result) if job.result else None
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': round(job.progress, 1),
+        'message': job.message,
+        'result': result,
+        'created_at': job.created_at.isoformat(timespec='seconds') if job.created_at else None,
+        'started_at': job.started_at.isoformat(timespec='seconds') if job.started_at else None,
+        'finished_at': job.finished_at.isoformat(timespec='seconds') if job.finished_at else None,
+    }
+
+
+def update_job(job_id, **values):
+    """在独立事务中更新任务记录，不影响任务本身所用会话中的事务"""
+    with db.engine.begin() as conn:
+        conn.execute(Job.__table__.update().where(Job.id == job_id).values(**values))
+
+
+class JobProgress:
+    """
+    任务进度汇报
+    
+    任务每处理完一批调用一次：按间隔把进度写入数据库，并短暂让出CPU和数据库写锁
+    """
+
+    def __init__(self, job_id):
+        self.job_id = job_id
+        self._last_write = 0.0
+
+    def __call__(self, percent, message=None):
+        now = time.monotonic()
+        if now - self._last_write >= JOB_PROGRESS_INTERVAL:
+            values = {'progress': max(0.0, min(float(percent), 99.9))}
+            if message is not None:
+                values['message'] = message
+            update_job(self.job_id, **values)
+            self._last_write = now
+        time.sleep(app.config['JOB_YIELD_SECONDS'])
+
+
+class JobRunner:
+    """
+    后台任务执行器
+    
+    任务记录持久化在 jobs 表，按类型注册的处理函数在固定大小的线程池中执行（JOB_MAX_WORKERS，默认1），
+    排队和执行中的任务达到 JOB_MAX_PENDING 时拒绝提交，批量导入导出不会占满服务器
+    """
+
+    def __init__(self):
+        self._handlers = {}
+        self._executor = None
+        self._lock = threading.Lock()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+    def _after_fork(self):
+        """fork 出的子进程中父进程的线程池不可用，首次提交任务时重新创建"""
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def handler(self, kind):
+        """
+        注册任务处理函数：func(progress, **params) -> 结果字典
+        
+        结果中 partial 为真表示任务中途停止但已修改了数据，状态记为 partial，结果照常保存
+        """
+        def decorator(func):
+            self._handlers[kind] = func
+            return func
+        return decorator
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=app.config['JOB_MAX_WORKERS'],
+                                                    thread_name_prefix='coswig-job')
+            return self._executor
+
+    def submit(self, kind, params):
+        """
+        提交任务
+        
+        Returns:
+            Job: 新建的任务记录；队列已满时返回None
+        """
+        with self._lock:
+            active = Job.query.filter(Job.status.in_(JOB_ACTIVE_STATUSES)).count()
+            if active >= app.config['JOB_MAX_PENDING']:
+                return None
+            job = Job(id=uuid.uuid4().hex, kind=kind, status='queued', progress=0,
+                      params=json.dumps(params, ensure_ascii=False))
+            db.session.add(job)
+            db.session.commit()
+        self._get_executor().submit(self._run, job.id)
+        return job
+
+    def _run(self, job_id):
+        with app.app_context():
+            job = db.session.get(Job, job_id)
+            if job is None or job.status != 'queued':
+                return
+            handler = self._handlers[job.kind]
+            params = json.loads(job.params or '{}')
+            db.session.commit()
+            update_job(job_id, status='running', started_at=datetime.utcnow(), message='正在执行')
+            try:
+                result = handler(JobProgress(job_id), **params)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception('后台任务 %s 执行失败', job_id)
+                update_job(job_id, status='failed', message=f'任务失败：{str(e)}'[:500],
+                           finished_at=datetime.utcnow())
+            else:
+                update_job(job_id, status='partial' if result.get('partial') else 'succeeded',
+                           progress=100, message=result.get('message'),
+                           result=json.dumps(result, ensure_ascii=False), finished_at=datetime.utcnow())
+            finally:
+                db.session.remove()
+
+
+job_runner = JobRunner()
+
+
+def job_file_path(name):
+    """任务目录下的文件路径"""
+    os.makedirs(app.config['JOB_DIR'], exist_ok=True)
+    return os.path.join(app.config['JOB_DIR'], name)
+
+
+def fail_interrupted_jobs():
+    """启动时把上次未执行完的任务标记为失败（线程池中的任务随进程退出而中断）"""
+    return (Job.query.filter(Job.status.in_(JOB_ACTIVE_STATUSES))
+            .update({'status': 'failed', 'message': '服务重启，任务已中断', 'finished_at': datetime.utcnow()},
+                    synchronize_session=False))
+
+
+def prune_jobs(max_age_days=None):
+    """删除超过保留天数的已结束任务及其遗留的上传文件（导出文件由导出缓存按TTL清理）"""
+    max_age_days = app.config['JOB_RETENTION_DAYS'] if max_age_days is None else max_age_days
+    cutoff = datetime.utcnow() - timedelta(days=max_age_days)
+    expired = (Job.query.filter(Job.status.notin_(JOB_ACTIVE_STATUSES), Job.finished_at < cutoff).all())
+    for job in expired:
+        params = json.loads(job.params) if job.params else {}
+        if params.get('file'):
+            try:
+                os.remove(job_file_path(params['file']))
+            except OSError:
+                pass
+        db.session.delete(job)
+    db.session.commit()
+    return len(expired)
+
+
+@job_runner.handler('export')
+def run_export_job(progress, export_format):
+    """导出任务：生成（或复用）导出缓存中的文件"""
+    artifact = export_artifacts.get_or_create(export_format, progress=progress)
+    message = f"已导出 {artifact['count']} 条订单"
+    if artifact['reused']:
+        message += '（数据未变化，复用上次导出的文件）'
+    return {'message': message, 'count': artifact['count'], 'format': export_format,
+            'reused': artifact['reused'], 'artifact': artifact['name']}
+
+
+@job_runner.handler('import')
+def run_import_job(progress, file, clear_existing=False):
+    """导入任务：流式解析上传的文件并分批导入（进度按已读取的文件位置计算），结束后删除上传文件"""
+    path = job_file_path(file)
+    try:
+        size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            result = import_orders_from_file(
+                f, clear_existing=clear_existing,
+                progress=lambda done: progress(f.tell() * 100 / size if size else 100, f'已处理 {done} 条')
+            )
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+    return dict(message=import_result_message(result), partial=bool(result['fatal_error']), **result)
+
+
+def job_accepted_response(job):
+    """任务已提交：202 + 轮询地址"""
+    if job is None:
+        return jsonify({'success': False, 'message': '后台任务已满，请稍后再试'}), 429
+    response = jsonify({
+        'success': True,
+        'message': '任务已提交',
+        'job': job_to_dict(job),
+        'status_url': url_for('api_job_status', job_id=job.id),
+        'result_url': url_for('api_job_result', job_id=job.id),
+    })
+    response.status_code = 202
+    response.headers['Location'] = url_for('api_job_status', job_id=job.id)
+    return response
+
+
+@app.route('/api/jobs/export', methods=['POST'])
+def api_submit_export_job():
+    """
+    提交后台导出任务
     
-    POST参数：
-    - format: 导出格式 (json 或 csv)
+    JSON参数：
+    - format: json（默认）或 csv
     
     Returns:
-        JSON响应包含下载链接
+        202，轮询 status_url 查看进度，完成后从 result_url 下载文件
     """
-    try:
-        data = request.get_json()
-        export_format = data.get('format', 'json').lower()
-        
-        from data_manager import export_to_json, export_to_csv
-        
-        # 生成唯一的临时文件名
-        unique_id = str(uuid.uuid4())[:8]
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        
-        if export_format == 'json':
-            filename = f"orders_export_{timestamp}_{unique_id}.json"
-            export_to_json(filename)
-        elif export_format == 'csv':
-            filename = f"orders_export_{timestamp}_{unique_id}.csv"
-            export_to_csv(filename)
-        else:
-            return jsonify({'success': False, 'message': '不支持的导出格式'}), 400
-        
-        # 检查文件是否存在
-        if os.path.exists(filename):
-            return jsonify({
-                'success': True, 
-                'message': f'数据导出成功',
-                'filename': filename,
-                'download_url': f'/download/{filename}'
-            })
-        else:
-            return jsonify({'success': False, 'message': '导出失败，文件创建失败'}), 500
-            
-    except Exception as e:
-        return jsonify({'success': False, 'message': f'导出失败：{str(e)}'}), 500
+    data = request.get_json(silent=True) or {}
+    export_format = str(data.get('format', 'json')).lower()
+    if export_format not in ('json', 'csv'):
+        return jsonify({'success': False, 'message': '不支持的导出格式'}), 400
+    prune_jobs()
+    return job_accepted_response(job_runner.submit('export', {'export_format': export_format}))
 
-@app.route('/api/import_data', methods=['POST'])
-def api_import_data():
+
+@app.route('/api/jobs/import', methods=['POST'])
+def api_submit_import_job():
     """
-    导入订单数据API
+    提交后台导入任务
     
     文件上传：
-    - file: JSON格式的订单数据文件
+    - file: 订单数据文件，JSON数组或NDJSON（每行一个订单）
     - clear_existing: 是否清空现有数据 (可选，默认false)
     
     Returns:
-        JSON响应
+        202，轮询 status_url 查看进度，完成后 result 中包含导入统计
     """
-    try:
-        if 'file' not in request.files:
-            return jsonify({'success': False, 'message': '未选择文件'}), 400
+    file = request.files.get('file')
+    if file is None or file.filename == '':
+        return jsonify({'success': False, 'message': '未选择文件'}), 400
+    if not file.filename.lower().endswith(IMPORT_FILE_EXTENSIONS):
+        return jsonify({'success': False, 'message': '只支持JSON或NDJSON格式文件'}), 400
+    clear_existing = request.form.get('clear_existing', 'false').lower() == 'true'
+    
+    prune_jobs()
+    name = f"upload_{uuid.uuid4().hex}{os.path.splitext(file.filename)[1].lower()}"
+    file.save(job_file_path(name))
+    job = job_runner.submit('import', {'file': name, 'clear_existing': clear_existing})
+    if job is None:
+        os.remove(job_file_path(name))
+    return job_accepted_response(job)
+
+
+@app.route('/api/jobs/<job_id>')
+def api_job_status(job_id):
+    """任务状态和进度（status: queued/running/succeeded/partial/failed，progress: 0~100）"""
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    return jsonify({'success': True, 'job': job_to_dict(job)})
+
+
+@app.route('/api/jobs/<job_id>/result')
+def api_job_result(job_id):
+    """
+    任务结果
+    
+    导出任务返回导出文件（附件下载），导入任务返回导入统计（部分导入时 success 为false）；任务未完成时返回409
+    """
+    job = db.session.get(Job, job_id)
+    if job is None:
+        return jsonify({'success': False, 'message': '任务不存在'}), 404
+    if job.status == 'failed':
+        return jsonify({'success': False, 'message': job.message}), 409
+    if job.status not in ('succeeded', 'partial'):
+        return jsonify({'success': False, 'message': '任务尚未完成', 'job': job_to_dict(job)}), 409
+    
+    result = json.loads(job.result)
+    if job.kind == 'export':
+        path = export_artifacts.path_for(result['artifact'])
+        if path is None:
+            return jsonify({'success': False, 'message': '导出文件已过期，请重新导出'}), 410
+        return send_file(path, mimetype=EXPORT_MIMETYPES[result['format']], as_attachment=True,
+                         download_name=export_artifacts.download_name(path))
+    return jsonify(dict(success=job.status == 'succeeded', **result))
+
+# ==================== 静态资源（预压缩 + 内容指纹） ====================
+
+try:
+    import brotli  # 可选依赖：安装后额外提供 br 编码
+except ImportError:
+    brotli = None
+
+FONTAWESOME_DIR = 'fontawesome-free-7.0.0-web'  # FontAwesome资源根目录
+app.config.setdefault('STATIC_ASSET_CACHE_DIR', os.path.join(app.instance_path, 'asset_cache'))  # 预压缩文件目录
+app.config.setdefault('STATIC_ASSET_CHECK_INTERVAL', 5.0)  # 同一文件两次 stat 的最小间隔（秒）
+app.config.setdefault('STATIC_ASSET_MAX_AGE', 3600)  # 未带指纹的请求的浏览器缓存时间（秒）
+STATIC_IMMUTABLE_MAX_AGE = 365 * 86400  # 带指纹的请求的浏览器缓存时间（秒）
+
+# 值得压缩的文件类型（woff2/png 等本身已压缩）
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.json', '.svg', '.atlas', '.skel', '.ttf', '.otf', '.eot', '.txt', '.map'}
+COMPRESS_MIN_SIZE = 1024  # 小于该大小的文件不压缩
+ENCODING_SUFFIXES = {'br': 'br', 'gzip': 'gz'}
+
+# 启动时预压缩的目录：(资源根目录, 子目录)
+STATIC_PRECOMPRESS_DIRS = [
+    (FONTAWESOME_DIR, 'css'),
+    (FONTAWESOME_DIR, 'webfonts'),
+    ('static', ''),
+]
+
+
+def supported_encodings():
+    """按优先级返回可提供的压缩编码"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def choose_encoding():
+    """根据请求的 Accept-Encoding 选择压缩编码，不接受压缩时返回None"""
+    for encoding in supported_encodings():
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def compress_bytes(data, encoding):
+    """以最高压缩率压缩内容（只在内容变化时执行一次）"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def set_asset_cache_headers(response, immutable):
+    """带指纹的地址内容永不变化，缓存一年且不再校验；否则短期缓存后用ETag校验"""
+    response.cache_control.no_cache = None
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.max_age = app.config['STATIC_ASSET_MAX_AGE']
+
+
+class StaticAssetPipeline:
+    """
+    静态资源管道
+    
+    - 按文件内容计算哈希，模板中用 asset_url() 生成带 ?v=<哈希> 的地址；
+      请求的哈希与当前内容一致时返回 immutable 长期缓存头
+    - 可压缩的文件按哈希在缓存目录生成 .gz（安装brotli时还有 .br），
+      按 Accept-Encoding 直接返回压缩好的文件，同一内容只压缩一次
+    """
+    
+    MIN_SAVING = 0.9  # 压缩后不小于原大小的90%时直接返回原文件
+    
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._files = {}  # 绝对路径 -> 文件信息（mtime、大小、内容哈希、各编码的压缩文件）
+        if hasattr(os, 'register_at_fork'):
+            # 主进程的后台预压缩线程可能在 fork 时持有锁，子进程中重建
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def resolve(directory, filename):
+        """拼接资源路径，越出目录时返回None"""
+        return safe_join(os.path.join(app.root_path, directory), filename)
+    
+    @staticmethod
+    def _hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()[:16]
+    
+    def info(self, path):
+        """
+        返回文件信息，文件不存在时返回None
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'success': False, 'message': '未选择文件'}), 400
+        同一文件每 STATIC_ASSET_CHECK_INTERVAL 秒最多 stat 一次，内容变化（mtime/大小）时重新计算哈希
+        """
+        now = time.monotonic()
+        info = self._files.get(path)
+        if info is not None and now - info['checked_at'] < app.config['STATIC_ASSET_CHECK_INTERVAL']:
+            return info
+        try:
+            st = os.stat(path)
+            if not S_ISREG(st.st_mode):
+                return None
+            if info is None or info['mtime_ns'] != st.st_mtime_ns or info['size'] != st.st_size:
+                info = {
+                    'mtime_ns': st.st_mtime_ns,
+                    'mtime': st.st_mtime,
+                    'size': st.st_size,
+                    'digest': self._hash_file(path),
+                    'variants': {},  # 编码 -> 压缩文件路径（None表示不值得压缩）
+                }
+        except OSError:
+            self._files.pop(path, None)
+            return None
+        info = dict(info, checked_at=now)
+        self._files[path] = info
+        return info
+    
+    def fingerprint(self, directory, filename):
+        """返回文件内容哈希，文件不存在时返回None"""
+        path = self.resolve(directory, filename)
+        info = self.info(path) if path else None
+        return info['digest'] if info else None
+    
+    @staticmethod
+    def compressible(path, info):
+        return (os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+                and info['size'] >= COMPRESS_MIN_SIZE)
+    
+    def variant(self, path, info, encoding):
+        """返回指定编码的压缩文件路径，必要时生成；压缩收益太小时返回None"""
+        variants = info['variants']
+        if encoding in variants:
+            return variants[encoding]
+        target = os.path.join(self.cache_dir, f"{info['digest']}.{ENCODING_SUFFIXES[encoding]}")
+        with self._lock:
+            if encoding in variants:
+                return variants[encoding]
+            if not os.path.exists(target):
+                try:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                    compressed = compress_bytes(data, encoding)
+                    if len(compressed) >= len(data) * self.MIN_SAVING:
+                        variants[encoding] = None
+                        return None
+                    os.makedirs(self.cache_dir, exist_ok=True)
+                    temp_path = f"{target}.{uuid.uuid4().hex}.tmp"
+                    with open(temp_path, 'wb') as f:
+                        f.write(compressed)
+                    os.replace(temp_path, target)
+                except OSError:
+                    # 缓存目录不可写时退回原文件，不记录结果以便之后重试
+                    return None
+            variants[encoding] = target
+            return target
+    
+    def send(self, directory, filename):
+        """
+        返回静态文件
         
-        # 检查文件扩展名
-        if not file.filename.lower().endswith('.json'):
-            return jsonify({'success': False, 'message': '只支持JSON格式文件'}), 400
+        - 客户端接受压缩时返回预压缩文件（Content-Encoding + Vary: Accept-Encoding）
+        - ETag 为内容哈希（压缩版本附加编码名），支持 304 和 Range
+        - 请求参数 v 与内容哈希一致时设置 immutable 长期缓存
+        """
+        path = self.resolve(directory, filename)
+        info = self.info(path) if path else None
+        if info is None:
+            abort(404)
         
-        clear_existing = request.form.get('clear_existing', 'false').lower() == 'true'
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        compressible = self.compressible(path, info)
+        encoding = choose_encoding() if compressible else None
+        serve_path = self.variant(path, info, encoding) if encoding else None
+        if serve_path is None:
+            serve_path, encoding = path, None
+        etag = f"{info['digest']}-{encoding}" if encoding else info['digest']
         
-        # 保存上传的文件到临时位置
-        import tempfile
-        import uuid
-        temp_filename = f"temp_import_{uuid.uuid4().hex}.json"
-        file.save(temp_filename)
+        response = send_file(serve_path, mimetype=mimetype, etag=etag, last_modified=info['mtime'])
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        if compressible:
+            response.vary.add('Accept-Encoding')
+        set_asset_cache_headers(response, request.args.get('v') == info['digest'])
+        return response
+    
+    def precompress(self, dirs=None):
+        """
+        预先生成目录下所有可压缩文件的压缩版本
         
-        try:
-            # 读取并验证JSON文件
-            with open(temp_filename, 'r', encoding='utf-8') as f:
-                orders_data = json.load(f)
-            
-            # 验证数据格式
-            if not isinstance(orders_data, list):
-                return jsonify({'success': False, 'message': 'JSON文件格式错误：应为订单数组'}), 400
-            
-            # 清空现有数据（如果需要）
-            if clear_existing:
-                Order.query.delete()
-                db.session.commit()
-            
-            imported_count = 0
-            skipped_count = 0
-            
-            # 逐条导入订单数据
-            for order_data in orders_data:
-                try:
-                    # 验证必需字段
-                    required_fields = ['cn', 'character', 'contact', 'needed_date', 'order_date', 'final_amount']
-                    for field in required_fields:
-                        if field not in order_data:
-                            continue
-                    
-                    # 检查是否已存在相同的订单（基于cn+character+needed_date）
-                    existing_order = Order.query.filter_by(
-                        cn=order_data['cn'],
-                        character=order_data['character'],
-                        needed_date=datetime.strptime(order_data['needed_date'], '%Y-%m-%d').date()
-                    ).first()
-                    
-                    if existing_order and not clear_existing:
-                        skipped_count += 1
+        Returns:
+            int: 处理的文件数
+        """
+        count = 0
+        for directory, subdir in dirs or STATIC_PRECOMPRESS_DIRS:
+            top = os.path.join(app.root_path, directory, subdir)
+            for dirpath, _, filenames in os.walk(top):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    info = self.info(path)
+                    if info is None or not self.compressible(path, info):
                         continue
-                    
-                    # 创建新订单对象
-                    order = Order(
-                        cn=order_data['cn'],
-                        character=order_data['character'],
-                        contact=order_data['contact'],
-                        needed_date=datetime.strptime(order_data['needed_date'], '%Y-%m-%d').date(),
-                        order_date=datetime.strptime(order_data['order_date'], '%Y-%m-%d').date(),
-                        deposit_paid=order_data.get('deposit_paid', False),
-                        final_amount=float(order_data['final_amount']),
-                        shipping_included=order_data.get('shipping_included', False),
-                        blank_purchased=order_data.get('blank_purchased', False),
-                        cake_box=order_data.get('cake_box', '不需要'),
-                        status=order_data.get('status', '待制作')
-                    )
-                    
-                    # 如果备份文件包含创建时间，保持原始时间
-                    if 'created_at' in order_data:
-                        try:
-                            order.created_at = datetime.strptime(order_data['created_at'], '%Y-%m-%d %H:%M:%S')
-                        except:
-                            pass
-                    
-                    db.session.add(order)
-                    imported_count += 1
-                    
-                except Exception as e:
-                    continue
-            
-            # 提交所有更改
-            db.session.commit()
-            
-            message = f'成功导入 {imported_count} 条订单'
-            if skipped_count > 0:
-                message += f'，跳过 {skipped_count} 条重复订单'
-            
-            return jsonify({
-                'success': True,
-                'message': message,
-                'imported_count': imported_count,
-                'skipped_count': skipped_count
-            })
-            
-        finally:
-            # 清理临时文件
-            if os.path.exists(temp_filename):
-                os.remove(temp_filename)
-            
-    except Exception as e:
-        return jsonify({'success': False, 'message': f'导入失败：{str(e)}'}), 500
+                    for encoding in supported_encodings():
+                        self.variant(path, info, encoding)
+                    count += 1
+        return count
 
-@app.route('/download/<filename>')
-def download_file(filename):
+
+static_assets = StaticAssetPipeline(app.config['STATIC_ASSET_CACHE_DIR'])
+
+# Spine Player 资源由 SpineAssetCache 从内存提供，指纹取缓存内容的ETag
+SPINE_ASSET_ENDPOINTS = {
+    'spine_player_js_38': 'spine-player.js',
+    'spine_player_css_38': 'spine-player.css',
+}
+
+
+def asset_url(endpoint, filename=None):
     """
-    下载导出的文件
+    生成带内容指纹的静态资源地址（?v=<内容哈希>）
+    
+    资源不存在时返回不带指纹的普通地址
     """
-    if os.path.exists(filename):
-        return send_file(filename, as_attachment=True)
-    else:
-        flash('文件不存在', 'error')
-        return redirect(url_for('settings'))
+    if endpoint in SPINE_ASSET_ENDPOINTS:
+        entry = spine_assets.peek(SPINE_ASSET_ENDPOINTS[endpoint])
+        version = entry['etag'] if entry else None
+        return url_for(endpoint, v=version) if version else url_for(endpoint)
+    
+    directory = {
+        'static': app.static_folder,
+        'fontawesome_static': FONTAWESOME_DIR,
+        'arkmodels_static': SPINE_MODELS_DIR,
+    }[endpoint]
+    version = static_assets.fingerprint(directory, filename)
+    if version:
+        return url_for(endpoint, filename=filename, v=version)
+    return url_for(endpoint, filename=filename)
+
+
+@app.context_processor
+def inject_asset_url():
+    """向所有模板注入 asset_url()"""
+    return dict(asset_url=asset_url)
+
+
+@app.endpoint('static')
+def static_files(filename):
+    """
+    提供 static 目录下的文件（替换Flask默认的静态文件视图，增加预压缩和指纹缓存）
+    """
+    return static_assets.send(app.static_folder, filename)
+
 
 @app.route('/fontawesome-free-7.0.0-web/<path:filename>')
 def fontawesome_static(filename):
     """
     提供FontAwesome静态文件
     """
-    return send_from_directory('fontawesome-free-7.0.0-web', filename)
+    return static_assets.send(FONTAWESOME_DIR, filename)
+
+# ==================== Spine模型目录 ====================
+
+SPINE_MODELS_DIR = os.path.join('ArkModels', 'ArkModels', 'models')  # Spine模型根目录
+DEFAULT_SPINE_MODEL_ID = '113_cqbw'  # 默认模型
+app.config.setdefault('SPINE_CATALOG_CHECK_INTERVAL', 5.0)  # 目录变化检查间隔（秒）
+
+
+class SpineModelCatalog:
+    """
+    Spine模型目录索引
+    
+    启动时扫描一次模型目录，之后按 mtime 增量刷新：
+    每隔 SPINE_CATALOG_CHECK_INTERVAL 秒 stat 一次根目录和各模型文件夹，
+    只有 mtime 变化的文件夹才会重新 listdir。所有模型相关接口共用同一份索引。
+    
+    模板渲染只通过 template_context() 读取内存索引，不触发目录检查；
+    索引由模型相关API（页面加载时会请求 /api/spine_model/current）负责刷新。
+    """
+    
+    CONTEXT_CACHE_SIZE = 128  # 模板注入结果缓存的模型数量上限
+    
+    def __init__(self, models_dir):
+        self.models_dir = models_dir
+        self._lock = threading.Lock()
+        self._models = {}  # 模型id -> 模型信息（仅包含 .skel 和 .atlas 齐全的模型）
+        self._folders = {}  # 文件夹名 -> mtime（包含不完整的模型文件夹）
+        self._root_mtime = None
+        self._checked_at = None
+        self._context_cache = OrderedDict()  # 模型id -> 模板注入变量（LRU）
+    
+    @staticmethod
+    def _build_model(folder_name, folder_path):
+        """扫描单个模型文件夹，文件不完整时返回None"""
+        skel_file = None
+        atlas_file = None
+        png_file = None
+        for file in os.listdir(folder_path):
+            if file.endswith('.skel'):
+                skel_file = file
+            elif file.endswith('.atlas'):
+                atlas_file = file
+            elif file.endswith('.png'):
+                png_file = file
+        
+        if not (skel_file and atlas_file):  # 只有同时存在.skel和.atlas的才是有效模型
+            return None
+        folder_url = f"/arkmodels/{quote(folder_name, safe='')}"
+        return {
+            'id': folder_name,
+            'name': folder_name,
+            'skel_file': skel_file,
+            'atlas_file': atlas_file,
+            'png_file': png_file,
+            'skel_path': f"{folder_url}/{quote(skel_file, safe='')}",
+            'atlas_path': f"{folder_url}/{quote(atlas_file, safe='')}",
+            'preview_path': f"{folder_url}/{quote(png_file, safe='')}" if png_file else None
+        }
+    
+    def _rescan(self):
+        """检查根目录和各文件夹的 mtime，重新扫描发生变化的文件夹（调用方持有锁）"""
+        try:
+            root_mtime = os.stat(self.models_dir).st_mtime_ns
+        except OSError:
+            self._models, self._folders, self._root_mtime = {}, {}, None
+            self._context_cache = OrderedDict()
+            return
+        
+        if root_mtime != self._root_mtime:
+            names = [entry.name for entry in os.scandir(self.models_dir) if entry.is_dir()]
+        else:
+            names = list(self._folders)
+        
+        models = {}
+        folders = {}
+        for name in names:
+            folder_path = os.path.join(self.models_dir, name)
+            try:
+                mtime = os.stat(folder_path).st_mtime_ns
+            except OSError:
+                continue
+            folders[name] = mtime
+            if self._folders.get(name) == mtime:
+                if name in self._models:
+                    models[name] = self._models[name]
+                continue
+            model = self._build_model(name, folder_path)
+            if model:
+                models[name] = model
+        
+        if models != self._models:
+            self._context_cache = OrderedDict()
+        self._models, self._folders, self._root_mtime = models, folders, root_mtime
+    
+    def refresh(self, force=False):
+        """到达检查间隔（或 force=True）时按 mtime 刷新索引"""
+        now = time.monotonic()
+        interval = app.config['SPINE_CATALOG_CHECK_INTERVAL']
+        if not force and self._checked_at is not None and now - self._checked_at < interval:
+            return
+        with self._lock:
+            self._rescan()
+            self._checked_at = now
+    
+    def list_models(self):
+        """返回按id排序的有效模型列表"""
+        self.refresh()
+        return [self._models[key] for key in sorted(self._models)]
+    
+    def get(self, model_id):
+        """返回指定模型信息，不存在或文件不完整时返回None"""
+        self.refresh()
+        return self._models.get(model_id)
+    
+    def has_folder(self, model_id):
+        """模型文件夹是否存在（不要求文件完整）"""
+        self.refresh()
+        return model_id in self._folders
+    
+    def resolve(self, model_id):
+        """返回指定模型，无效时回落到默认模型；都不可用时返回None"""
+        return self.get(model_id) or self.get(DEFAULT_SPINE_MODEL_ID)
+    
+    def template_context(self, model_id):
+        """
+        返回模板注入用的模型变量，按模型id缓存
+        
+        只读内存索引，不做任何文件系统调用；索引变化时缓存整体失效
+        """
+        cache = self._context_cache
+        context = cache.get(model_id)
+        if context is not None:
+            try:
+                cache.move_to_end(model_id)
+            except KeyError:  # 其他线程刚好淘汰了该项
+                pass
+            return context
+        
+        model = self._models.get(model_id) or self._models.get(DEFAULT_SPINE_MODEL_ID)
+        if model is None:
+            context = {
+                'SPINE_MODEL_ID': DEFAULT_SPINE_MODEL_ID,
+                'SPINE_MODEL_SKEL': '/arkmodels/113_cqbw/build_char_113_cqbw.skel',
+                'SPINE_MODEL_ATLAS': '/arkmodels/113_cqbw/build_char_113_cqbw.atlas'
+            }
+        else:
+            context = {
+                'SPINE_MODEL_ID': model['id'],
+                'SPINE_MODEL_SKEL': model['skel_path'],
+                'SPINE_MODEL_ATLAS': model['atlas_path']
+            }
+        cache[model_id] = context
+        if len(cache) > self.CONTEXT_CACHE_SIZE:
+            cache.popitem(last=False)
+        return context
+
+
+spine_catalog = SpineModelCatalog(SPINE_MODELS_DIR)
+spine_catalog.refresh(force=True)
 
 # === 提供ArkModels模型静态文件（Spine） ===
 @app.route('/arkmodels/<path:filename>')
@@ -872,8 +3771,7 @@ def arkmodels_static(filename):
     """
     提供ArkModels下的Spine模型资源(.skel/.json/.atlas/.png)
     """
-    base_dir = os.path.join('ArkModels', 'ArkModels', 'models')
-    return send_from_directory(base_dir, filename)
+    return static_assets.send(SPINE_MODELS_DIR, filename)
 
 @app.route('/api/spine_models')
 def api_spine_models():
@@ -884,40 +3782,7 @@ def api_spine_models():
         JSON响应包含模型列表和详细信息
     """
     try:
-        models = []
-        models_dir = os.path.join('ArkModels', 'ArkModels', 'models')
-        
-        if os.path.exists(models_dir):
-            for folder_name in os.listdir(models_dir):
-                folder_path = os.path.join(models_dir, folder_name)
-                if os.path.isdir(folder_path):
-                    # 检查是否有必要的文件 (.skel和.atlas)
-                    skel_file = None
-                    atlas_file = None
-                    png_file = None
-                    
-                    for file in os.listdir(folder_path):
-                        if file.endswith('.skel'):
-                            skel_file = file
-                        elif file.endswith('.atlas'):
-                            atlas_file = file
-                        elif file.endswith('.png'):
-                            png_file = file
-                    
-                    if skel_file and atlas_file:  # 只有同时存在.skel和.atlas的才是有效模型
-                        models.append({
-                            'id': folder_name,
-                            'name': folder_name,
-                            'skel_file': skel_file,
-                            'atlas_file': atlas_file,
-                            'png_file': png_file,
-                            'skel_path': f"/arkmodels/{quote(folder_name, safe='')}/{quote(skel_file, safe='')}",
-                            'atlas_path': f"/arkmodels/{quote(folder_name, safe='')}/{quote(atlas_file, safe='')}",
-                            'preview_path': f"/arkmodels/{quote(folder_name, safe='')}/{quote(png_file, safe='')}" if png_file else None
-                        })
-        
-        # 按名称排序
-        models.sort(key=lambda x: x['id'])
+        models = spine_catalog.list_models()
         
         return jsonify({
             'success': True,
@@ -934,37 +3799,16 @@ def api_spine_models():
 @app.route('/api/spine_model/current')
 def api_spine_model_current():
     try:
-        default_model_id = '113_cqbw'
-        model_id = session.get('spine_model_id', default_model_id)
-        base_dir = os.path.join('ArkModels', 'ArkModels', 'models', model_id)
-        skel_file = None
-        atlas_file = None
-        png_file = None
-        if os.path.isdir(base_dir):
-            for f in os.listdir(base_dir):
-                if f.endswith('.skel'):
-                    skel_file = f
-                elif f.endswith('.atlas'):
-                    atlas_file = f
-                elif f.endswith('.png'):
-                    png_file = f
-        if not (skel_file and atlas_file):
-            # 回落到默认模型
-            model_id = default_model_id
-            base_dir = os.path.join('ArkModels', 'ArkModels', 'models', model_id)
-            for f in os.listdir(base_dir):
-                if f.endswith('.skel'):
-                    skel_file = f
-                elif f.endswith('.atlas'):
-                    atlas_file = f
-                elif f.endswith('.png'):
-                    png_file = f
+        model_id = session.get('spine_model_id', DEFAULT_SPINE_MODEL_ID)
+        model = spine_catalog.resolve(model_id)
+        if model is None:
+            return jsonify({'success': False, 'message': '默认模型不存在'}), 500
         return jsonify({
             'success': True,
-            'id': model_id,
-            'skel_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(skel_file, safe='')}",
-            'atlas_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(atlas_file, safe='')}",
-            'preview_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(png_file, safe='')}" if png_file else None
+            'id': model['id'],
+            'skel_path': model['skel_path'],
+            'atlas_path': model['atlas_path'],
+            'preview_path': model['preview_path']
         })
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
@@ -976,66 +3820,31 @@ def api_spine_model_select():
         model_id = data.get('id')
         if not model_id:
             return jsonify({'success': False, 'message': '缺少模型id'}), 400
-        base_dir = os.path.join('ArkModels', 'ArkModels', 'models', model_id)
-        if not os.path.isdir(base_dir):
-            return jsonify({'success': False, 'message': '模型目录不存在'}), 404
-        skel_file = None
-        atlas_file = None
-        png_file = None
-        for f in os.listdir(base_dir):
-            if f.endswith('.skel'):
-                skel_file = f
-            elif f.endswith('.atlas'):
-                atlas_file = f
-            elif f.endswith('.png'):
-                png_file = f
-        if not (skel_file and atlas_file):
+        model = spine_catalog.get(model_id)
+        if model is None:
+            # 模型可能刚刚放入目录，强制刷新一次再判断
+            spine_catalog.refresh(force=True)
+            model = spine_catalog.get(model_id)
+        if model is None:
+            if not spine_catalog.has_folder(model_id):
+                return jsonify({'success': False, 'message': '模型目录不存在'}), 404
             return jsonify({'success': False, 'message': '模型文件不完整（缺少.skel或.atlas）'}), 400
         session['spine_model_id'] = model_id
         return jsonify({
             'success': True,
             'message': '模型已更新',
             'id': model_id,
-            'skel_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(skel_file, safe='')}",
-            'atlas_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(atlas_file, safe='')}",
-            'preview_path': f"/arkmodels/{quote(model_id, safe='')}/{quote(png_file, safe='')}" if png_file else None
+            'skel_path': model['skel_path'],
+            'atlas_path': model['atlas_path'],
+            'preview_path': model['preview_path']
         })
     except Exception as e:
         return jsonify({'success': False, 'message': f'更新失败：{str(e)}'}), 500
 
 @app.context_processor
 def inject_spine_model():
-    try:
-        default_model_id = '113_cqbw'
-        model_id = session.get('spine_model_id', default_model_id)
-        base_dir = os.path.join('ArkModels', 'ArkModels', 'models', model_id)
-        skel_file = None
-        atlas_file = None
-        if os.path.isdir(base_dir):
-            for f in os.listdir(base_dir):
-                if f.endswith('.skel'):
-                    skel_file = f
-                elif f.endswith('.atlas'):
-                    atlas_file = f
-        if not (skel_file and atlas_file):
-            model_id = default_model_id
-            base_dir = os.path.join('ArkModels', 'ArkModels', 'models', model_id)
-            for f in os.listdir(base_dir):
-                if f.endswith('.skel'):
-                    skel_file = f
-                elif f.endswith('.atlas'):
-                    atlas_file = f
-        return {
-            'SPINE_MODEL_ID': model_id,
-            'SPINE_MODEL_SKEL': f"/arkmodels/{quote(model_id, safe='')}/{quote(skel_file, safe='')}" if skel_file else '',
-            'SPINE_MODEL_ATLAS': f"/arkmodels/{quote(model_id, safe='')}/{quote(atlas_file, safe='')}" if atlas_file else ''
-        }
-    except Exception:
-        return {
-            'SPINE_MODEL_ID': '113_cqbw',
-            'SPINE_MODEL_SKEL': '/arkmodels/113_cqbw/build_char_113_cqbw.skel',
-            'SPINE_MODEL_ATLAS': '/arkmodels/113_cqbw/build_char_113_cqbw.atlas'
-        }
+    """向所有模板注入当前会话的Spine模型路径（只读内存索引，无文件系统调用）"""
+    return spine_catalog.template_context(session.get('spine_model_id', DEFAULT_SPINE_MODEL_ID))
 
 @app.context_processor
 def inject_today():
@@ -1046,6 +3855,11 @@ def inject_today():
     """
     return dict(today=date.today())
 
+@app.template_filter('to_date')
+def to_date_filter(value):
+    """YYYY-MM-DD 文本转换为 date（订单列表快照中的日期为文本）"""
+    return date.fromisoformat(value) if isinstance(value, str) else value
+
 @app.context_processor
 def inject_device_info():
     """
@@ -1076,166 +3890,322 @@ def inject_device_info():
     )
 
 
-@app.route('/spine-player/3.8/spine-webgl.js')
-def spine_webgl_js_38():
-    # Serve a no-op shim to prevent duplicate runtime conflicts with spine-player.js (3.8 bundles runtime)
-    return app.response_class("/* spine-webgl disabled: runtime provided by spine-player.js */", mimetype='application/javascript')
+# ==================== Spine Player 资源代理 ====================
 
-@app.route('/spine-player/3.8/spine-player.js')
-def spine_player_js_38():
-    return _proxy_spine_player_asset('js')
+SPINE_PLAYER_CACHE_DIR = os.path.join('static', 'spine-player', '3.8')  # 资源磁盘缓存目录
+SPINE_PROXY_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) TraeProxy/1.0'
+app.config.setdefault('SPINE_ASSET_FETCH_TIMEOUT', 8)  # 单个源站请求超时（秒）
+app.config.setdefault('SPINE_ASSET_MISS_WAIT', 10)  # 缓存未命中时请求最多等待共享下载的时间（秒）
+app.config.setdefault('SPINE_ASSET_REVALIDATE_SECONDS', 86400)  # 向源站条件校验的间隔，0 为不校验
+app.config.setdefault('SPINE_ASSET_MAX_AGE', 7 * 86400)  # 浏览器缓存时间（秒）
 
-@app.route('/spine-player/3.8/spine-player.css')
-def spine_player_css_38():
-    return _proxy_spine_player_asset('css')
 
+def _looks_like_js(data: bytes) -> bool:
+    # avoid caching demo HTML pages; basic heuristic
+    head = data[:512].lstrip()
+    return not (head.startswith(b'<!DOCTYPE') or head.startswith(b'<html') or b'<script' in head[:200])
 
-def _proxy_spine_webgl_js():
-    import urllib.request as _rq
-    ua = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) TraeProxy/1.0'
-    name_candidates = ['spine-webgl.js', 'spine-webgl.min.js']
-    min_size = 30000
 
-    # Try cached files first
-    for nm in name_candidates:
-        cache_path = os.path.join('static', 'spine-player', '3.8', nm)
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    data = f.read()
-                    if data and len(data) >= min_size:
-                        return app.response_class(data, mimetype='application/javascript')
-            except Exception:
-                pass
+# 可代理的资源：本地缓存候选文件名、源站地址、MIME类型、最小有效大小、内容检查
+# spine-webgl.js 不在其中：3.8 的 spine-player.js 已包含运行时，该地址只返回空脚本
+SPINE_PLAYER_ASSETS = {
+    'spine-player.js': {
+        'local': ['spine-player.js', 'spine-player.min.js'],
+        'urls': [
+            # Working 3.8 build paths
+            'https://cdn.jsdelivr.net/gh/EsotericSoftware/spine-runtimes@3.8/spine-ts/build/spine-player.js',
+            'https://raw.githubusercontent.com/EsotericSoftware/spine-runtimes/3.8/spine-ts/build/spine-player.js',
+        ],
+        'mimetype': 'application/javascript',
+        'min_size': 30000,
+        'check': _looks_like_js,
+    },
+    'spine-player.css': {
+        'local': ['spine-player.css', 'spine-player.min.css'],
+        'urls': [
+            # CSS is under player/css in 3.8
+            'https://cdn.jsdelivr.net/gh/EsotericSoftware/spine-runtimes@3.8/spine-ts/player/css/spine-player.css',
+            'https://raw.githubusercontent.com/EsotericSoftware/spine-runtimes/3.8/spine-ts/player/css/spine-player.css',
+        ],
+        'mimetype': 'text/css',
+        'min_size': 200,  # lower CSS threshold to accept small official CSS
+        'check': None,
+    },
+}
 
-    # Build remote URL candidates
-    url_candidates = []
-    for filename in name_candidates:
-        url_candidates.extend([
-            # Working 3.8 build paths (GitHub via jsDelivr and raw.githubusercontent)
-            f'https://cdn.jsdelivr.net/gh/EsotericSoftware/spine-runtimes@3.8/spine-ts/build/{filename}',
-            f'https://raw.githubusercontent.com/EsotericSoftware/spine-runtimes/3.8/spine-ts/build/{filename}',
-        ])
-
-    # Try to fetch from remote sources
-    for u in url_candidates:
-        try:
-            req = _rq.Request(u, headers={'User-Agent': ua, 'Accept': '*/*'})
-            with _rq.urlopen(req, timeout=20) as resp:
-                data = resp.read()
-                if data and len(data) >= min_size:
-                    filename = u.rsplit('/', 1)[-1]
-                    cache_path = os.path.join('static', 'spine-player', '3.8', filename)
-                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-                    try:
-                        with open(cache_path, 'wb') as f:
-                            f.write(data)
-                    except Exception:
-                        pass
-                    return app.response_class(data, mimetype='application/javascript')
-        except Exception:
-            continue
 
-    # Final fallback: return any cached bytes even if below threshold
-    for nm in name_candidates:
-        cache_path = os.path.join('static', 'spine-player', '3.8', nm)
-        if os.path.exists(cache_path):
+class SpineAssetCache:
+    """
+    Spine Player 资源内存缓存
+    
+    - 首次使用时从磁盘缓存读入内存，之后请求直接返回内存中的内容
+    - 磁盘上也没有时从源站下载：同一资源的并发未命中共享一次下载，
+      请求最多等待 SPINE_ASSET_MISS_WAIT 秒，超时返回503，下载在后台继续
+    - 缓存超过 SPINE_ASSET_REVALIDATE_SECONDS 后在后台用 ETag/Last-Modified 向源站条件校验，
+      校验期间继续返回旧内容
+    """
+    
+    RETRY_AFTER_FAILURE = 60  # 源站全部失败后，多少秒内不再重新下载
+    
+    def __init__(self, assets, cache_dir):
+        self.assets = assets
+        self.cache_dir = cache_dir
+        self._lock = threading.Lock()
+        self._entries = {}  # 资源名 -> 缓存项
+        self._pending = {}  # 资源名 -> 进行中的下载/校验 Future
+        self._failed_at = {}  # 资源名 -> 最近一次下载全部失败的时间，用于避免每个请求都重试
+        self._executor = None  # 首次提交任务时创建，fork 后在子进程中重新创建
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        """
+        fork 出的子进程（如 gunicorn --preload 的工作进程）中没有父进程的线程：
+        父进程的线程池和进行中的 Future 永远不会完成，锁也可能处于持有状态，全部丢弃重建
+        """
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._executor = None
+    
+    def _valid(self, spec, data, strict=True):
+        if not data:
+            return False
+        if strict and len(data) < spec['min_size']:
+            return False
+        return spec['check'] is None or spec['check'](data)
+    
+    @staticmethod
+    def _make_entry(data, origin_etag=None, origin_modified=None, modified_ts=None):
+        return {
+            'data': data,
+            'etag': hashlib.sha256(data).hexdigest()[:32],
+            'last_modified': datetime.utcfromtimestamp(modified_ts or time.time()),
+            'origin_etag': origin_etag,
+            'origin_modified': origin_modified,
+            'checked_at': time.monotonic(),
+            'encoded': {},  # 编码 -> 压缩后的内容，首次请求时生成
+        }
+    
+    def _load_from_disk(self, name, strict=True):
+        """从磁盘缓存读取第一个有效的候选文件"""
+        spec = self.assets[name]
+        for filename in spec['local']:
+            path = os.path.join(self.cache_dir, filename)
             try:
-                with open(cache_path, 'rb') as f:
+                with open(path, 'rb') as f:
                     data = f.read()
-                    return app.response_class(data, mimetype='application/javascript')
+                if self._valid(spec, data, strict):
+                    mtime = os.path.getmtime(path)
+                    return self._make_entry(data, origin_modified=formatdate(mtime, usegmt=True),
+                                            modified_ts=mtime)
+            except OSError:
+                continue
+        return None
+    
+    def _save_to_disk(self, name, data):
+        path = os.path.join(self.cache_dir, self.assets[name]['local'][0])
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except OSError:
+            pass
+    
+    def _fetch(self, name, current=None):
+        """
+        向源站获取资源；current 不为空时发送条件请求，源站返回304则沿用当前内容
+        
+        Returns:
+            dict or None: 新的缓存项，全部源站失败时返回None
+        """
+        spec = self.assets[name]
+        timeout = app.config['SPINE_ASSET_FETCH_TIMEOUT']
+        for url in spec['urls']:
+            headers = {'User-Agent': SPINE_PROXY_USER_AGENT, 'Accept': '*/*'}
+            if current:
+                if current['origin_etag']:
+                    headers['If-None-Match'] = current['origin_etag']
+                if current['origin_modified']:
+                    headers['If-Modified-Since'] = current['origin_modified']
+            try:
+                req = urlrequest.Request(url, headers=headers)
+                with urlrequest.urlopen(req, timeout=timeout) as resp:
+                    data = resp.read()
+                    if not self._valid(spec, data):
+                        continue
+                    entry = self._make_entry(data, resp.headers.get('ETag'), resp.headers.get('Last-Modified'))
+                    if current and entry['etag'] == current['etag']:
+                        entry['last_modified'] = current['last_modified']
+                    else:
+                        self._save_to_disk(name, data)
+                    return entry
+            except HTTPError as e:
+                if e.code == 304 and current:
+                    return dict(current, checked_at=time.monotonic())
+                continue
             except Exception:
-                pass
+                continue
+        return None
+    
+    def _run(self, name, current):
+        """后台任务：下载或校验资源并更新缓存"""
+        try:
+            entry = self._fetch(name, current)
+            with self._lock:
+                if entry is not None:
+                    self._entries[name] = entry
+                    self._failed_at.pop(name, None)
+                elif current is None:
+                    self._failed_at[name] = time.monotonic()
+                else:
+                    # 源站不可用时继续使用旧内容，推迟下一次校验
+                    self._entries[name] = dict(current, checked_at=time.monotonic())
+            return entry
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+    
+    def _submit(self, name, current=None):
+        """提交下载/校验任务，同一资源同时只有一个任务"""
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='spine-asset')
+                future = self._executor.submit(self._run, name, current)
+                self._pending[name] = future
+            return future
+    
+    def get(self, name):
+        """
+        返回资源的缓存项
+        
+        Returns:
+            dict or None: 缓存项；源站和磁盘都不可用时返回None
+        """
+        entry = self.peek(name)
+        if entry is not None:
+            interval = app.config['SPINE_ASSET_REVALIDATE_SECONDS']
+            if interval and time.monotonic() - entry['checked_at'] > interval:
+                self._submit(name, entry)
+            return entry
+        
+        failed_at = self._failed_at.get(name)
+        if failed_at is not None and time.monotonic() - failed_at < self.RETRY_AFTER_FAILURE:
+            entry = None
+        else:
+            future = self._submit(name)
+            try:
+                entry = future.result(timeout=app.config['SPINE_ASSET_MISS_WAIT'])
+            except FutureTimeoutError:
+                return None
+        if entry is None:
+            # Final fallback: return any cached bytes even if below threshold
+            entry = self._load_from_disk(name, strict=False)
+        return entry
+    
+    def peek(self, name):
+        """
+        返回已在内存或磁盘上的缓存项，不访问源站也不等待下载
+        
+        Returns:
+            dict or None: 缓存项；尚未下载时返回None
+        """
+        entry = self._entries.get(name)
+        if entry is None:
+            with self._lock:
+                entry = self._entries.get(name)
+                if entry is None:
+                    entry = self._load_from_disk(name)
+                    if entry is not None:
+                        self._entries[name] = entry
+        return entry
+    
+    def prefetch(self):
+        """后台预热所有资源（磁盘上没有的会从源站下载）"""
+        for name in self.assets:
+            if self._entries.get(name) is None and self._load_from_disk(name) is None:
+                self._submit(name)
 
-    return app.response_class('/* spine-webgl fetch failed */', mimetype='application/javascript', status=502)
 
+spine_assets = SpineAssetCache(SPINE_PLAYER_ASSETS, SPINE_PLAYER_CACHE_DIR)
 
-def _proxy_spine_player_asset(kind: str):
-    import urllib.request as _rq
-    ua = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) TraeProxy/1.0'
-    # Candidates: try non-min first, then minified
-    name_candidates = (
-        ['spine-player.js', 'spine-player.min.js'] if kind == 'js' else
-        ['spine-player.css', 'spine-player.min.css']
-    )
-    # lower CSS threshold to accept small official CSS
-    min_size = 200 if kind == 'css' else 30000
-
-    def looks_like_js(data: bytes) -> bool:
-        # avoid caching demo HTML pages; basic heuristic
-        head = data[:512].lstrip()
-        return not (head.startswith(b'<!DOCTYPE') or head.startswith(b'<html') or b'<script' in head[:200])
-
-    # Try any cached candidate
-    for nm in name_candidates:
-        cache_path = os.path.join('static', 'spine-player', '3.8', nm)
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    data = f.read()
-                    if data and len(data) >= min_size and (kind == 'css' or looks_like_js(data)):
-                        return app.response_class(data, mimetype=('application/javascript' if kind == 'js' else 'text/css'))
-            except Exception:
-                pass
 
-    # Build URL candidates across multiple sources for each filename
-    url_candidates = []
-    for filename in name_candidates:
-        if kind == 'js':
-            url_candidates.extend([
-                # Working 3.8 build paths
-                'https://cdn.jsdelivr.net/gh/EsotericSoftware/spine-runtimes@3.8/spine-ts/build/spine-player.js',
-                'https://raw.githubusercontent.com/EsotericSoftware/spine-runtimes/3.8/spine-ts/build/spine-player.js',
-            ])
-        else:
-            url_candidates.extend([
-                # CSS is under player/css in 3.8
-                'https://cdn.jsdelivr.net/gh/EsotericSoftware/spine-runtimes@3.8/spine-ts/player/css/spine-player.css',
-                'https://raw.githubusercontent.com/EsotericSoftware/spine-runtimes/3.8/spine-ts/player/css/spine-player.css',
-            ])
-
-    last_error = None
-    for u in url_candidates:
-        try:
-            req = _rq.Request(u, headers={'User-Agent': ua, 'Accept': '*/*'})
-            with _rq.urlopen(req, timeout=20) as resp:
-                data = resp.read()
-                if data and len(data) >= min_size and (kind == 'css' or looks_like_js(data)):
-                    filename = 'spine-player.js' if kind == 'js' else 'spine-player.css'
-                    cache_path = os.path.join('static', 'spine-player', '3.8', filename)
-                    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-                    try:
-                        with open(cache_path, 'wb') as f:
-                            f.write(data)
-                    except Exception:
-                        pass
-                    return app.response_class(data, mimetype=('application/javascript' if kind == 'js' else 'text/css'))
-        except Exception as e:
-            last_error = e
-            continue
+def _serve_spine_asset(name):
+    """
+    返回缓存资源，带 ETag/Last-Modified 和长期缓存头，支持 304
+    
+    客户端接受压缩时返回压缩后的内容（每个缓存项只压缩一次）；
+    请求参数 v 与内容ETag一致时设置 immutable 缓存头
+    """
+    spec = SPINE_PLAYER_ASSETS[name]
+    entry = spine_assets.get(name)
+    if entry is None:
+        response = app.response_class(f'/* {name} fetch failed */', mimetype=spec['mimetype'], status=503)
+        response.headers['Retry-After'] = '5'
+        return response
+    
+    data, etag = entry['data'], entry['etag']
+    encoding = choose_encoding()
+    if encoding:
+        encoded = entry['encoded'].get(encoding)
+        if encoded is None:
+            encoded = entry['encoded'][encoding] = compress_bytes(data, encoding)
+        data, etag = encoded, f'{etag}-{encoding}'
+    
+    response = app.response_class(data, mimetype=spec['mimetype'])
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_etag(etag)
+    response.last_modified = entry['last_modified']
+    if request.args.get('v') == entry['etag']:
+        set_asset_cache_headers(response, immutable=True)
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = app.config['SPINE_ASSET_MAX_AGE']
+    return response.make_conditional(request)
 
-    # Final fallback: return any cached bytes even if below threshold (but keep js/html sanity)
-    for nm in name_candidates:
-        cache_path = os.path.join('static', 'spine-player', '3.8', nm)
-        if os.path.exists(cache_path):
-            try:
-                with open(cache_path, 'rb') as f:
-                    data = f.read()
-                    if data and (kind == 'css' or looks_like_js(data)):
-                        return app.response_class(data, mimetype=('application/javascript' if kind == 'js' else 'text/css'))
-            except Exception:
-                pass
 
-    return app.response_class('/* spine-player asset fetch failed */', mimetype=('application/javascript' if kind == 'js' else 'text/css'), status=502)
+@app.route('/spine-player/3.8/spine-webgl.js')
+def spine_webgl_js_38():
+    # Serve a no-op shim to prevent duplicate runtime conflicts with spine-player.js (3.8 bundles runtime)
+    return app.response_class("/* spine-webgl disabled: runtime provided by spine-player.js */", mimetype='application/javascript')
+
+@app.route('/spine-player/3.8/spine-player.js')
+def spine_player_js_38():
+    return _proxy_spine_player_asset('js')
+
+@app.route('/spine-player/3.8/spine-player.css')
+def spine_player_css_38():
+    return _proxy_spine_player_asset('css')
+
+
+def _proxy_spine_player_asset(kind: str):
+    return _serve_spine_asset('spine-player.js' if kind == 'js' else 'spine-player.css')
 
 # ==================== 应用启动 ====================
 
-if __name__ == '__main__':
-    # 创建应用上下文并初始化数据库
+def prepare_app():
+    """
+    启动前的准备工作（开发服务器和 server.py 共用）
+    
+    创建数据表并执行结构迁移，后台预热Spine Player资源和预压缩静态资源
+    """
     with app.app_context():
-        db.create_all()  # 创建所有数据表
+        init_database()  # 创建数据表并执行结构迁移
+        fail_interrupted_jobs()  # 上次进程退出时未完成的后台任务
+        db.session.commit()
+    spine_assets.prefetch()  # 后台预热Spine Player资源
+    threading.Thread(target=static_assets.precompress, daemon=True).start()  # 后台预压缩静态资源
+
+
+if __name__ == '__main__':
+    prepare_app()
 
-    # 启动开发服务器
+    # 启动开发服务器（生产环境请使用 server.py）
     app.run(
         debug=True,        # 开启调试模式
         host='0.0.0.0',    # 监听所有网络接口
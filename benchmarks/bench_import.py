@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式导入内存测试
+
+按目标大小生成合成订单文件（JSON数组和NDJSON），每个文件在独立子进程中导入到空数据库，
+记录耗时、导入条数和进程内存峰值（ru_maxrss）相对导入前的增量。
+子进程关闭SQLite内存映射（COSWIG_SQLITE_MMAP_SIZE=0），否则被映射的数据库文件页也计入内存峰值；
+SQLite页缓存仍会增长到 cache_size（默认约20MB）为止。
+流式导入（iter_import_records + import_orders）的内存增量应与文件大小无关；
+加 --legacy 同时测试整个文件 json.load 后再导入的写法作为对比（500MB输入需要数GB内存）。
+
+使用方法：
+    python benchmarks/bench_import.py [--sizes 50,500] [--formats json,ndjson] [--legacy]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from generate_orders import DEFAULT_SEED, generate_orders, to_import_record, use_database
+
+MB = 1024 * 1024
+
+
+def write_orders_file(path, file_format, size_bytes, seed=DEFAULT_SEED):
+    """
+    写入合成订单直到文件达到 size_bytes
+
+    Returns:
+        int: 写入的订单数
+    """
+    count = 0
+    with open(path, 'wb') as f:
+        if file_format == 'json':
+            f.write(b'[\n')
+        for order in generate_orders(10 ** 9, seed):
+            line = json.dumps(to_import_record(order), ensure_ascii=False).encode('utf-8')
+            if file_format == 'json' and count:
+                f.write(b',\n')
+            f.write(line)
+            if file_format == 'ndjson':
+                f.write(b'\n')
+            count += 1
+            if f.tell() >= size_bytes:
+                break
+        if file_format == 'json':
+            f.write(b'\n]\n')
+    return count
+
+
+def max_rss_kb():
+    """进程内存峰值（KB）"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def run_child(path, mode):
+    """子进程：导入到空数据库，输出一行JSON结果"""
+    work_dir = tempfile.mkdtemp(prefix='coswig_bench_')
+    db_path = os.path.join(work_dir, 'bench.db')
+    use_database(db_path)  # 必须在导入 app 之前
+    from app import app, db, init_database, import_orders, iter_import_records
+
+    try:
+        with app.app_context():
+            init_database()
+            baseline = max_rss_kb()
+            started = time.perf_counter()
+            if mode == 'legacy':
+                with open(path, 'r', encoding='utf-8') as f:
+                    result = import_orders(json.load(f))
+            else:
+                with open(path, 'rb') as f:
+                    result = import_orders(iter_import_records(f))
+            seconds = time.perf_counter() - started
+            peak = max_rss_kb()
+            db.session.remove()
+            db.engine.dispose()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(json.dumps({
+        'seconds': round(seconds, 2),
+        'imported': result['imported_count'],
+        'skipped': result['skipped_count'],
+        'errors': result['error_count'],
+        'baseline_kb': baseline,
+        'peak_kb': peak,
+    }))
+
+
+def measure(path, mode):
+    env = dict(os.environ, COSWIG_SQLITE_MMAP_SIZE='0')
+    output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child', path, '--mode', mode],
+                                     env=env)
+    return json.loads(output.decode('utf-8').strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='流式导入内存测试')
+    parser.add_argument('--sizes', default='50,500', help='逗号分隔的文件大小（MB）')
+    parser.add_argument('--formats', default='json,ndjson', help='逗号分隔的文件格式：json（数组）、ndjson')
+    parser.add_argument('--legacy', action='store_true', help='同时测试 json.load 整个文件的写法（只适用于json格式）')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='随机种子')
+    parser.add_argument('--work-dir', help='生成文件的目录，缺省为临时目录（测试后删除）')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--mode', default='stream', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.mode)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix='coswig_bench_')
+    os.makedirs(work_dir, exist_ok=True)
+
+    rows = []
+    try:
+        for size in sizes:
+            for file_format in formats:
+                path = os.path.join(work_dir, f'orders_{size}mb.{file_format}')
+                started = time.perf_counter()
+                count = write_orders_file(path, file_format, size * MB, args.seed)
+                print(f"生成 {path}: {count} 条, {os.path.getsize(path) / MB:.0f} MB（{time.perf_counter() - started:.1f} 秒）")
+                modes = ['stream'] + (['legacy'] if args.legacy and file_format == 'json' else [])
+                for mode in modes:
+                    result = measure(path, mode)
+                    result.update(size_mb=size, format=file_format, mode=mode, records=count)
+                    rows.append(result)
+                    print(f"  {mode:<7} {result['seconds']:>8.1f} 秒  内存增量 {(result['peak_kb'] - result['baseline_kb']) / 1024:>8.1f} MB")
+                if not args.work_dir:
+                    os.remove(path)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n{'大小MB':>7} {'格式':<7} {'方式':<7} {'订单数':>9} {'导入':>9} {'耗时秒':>8} {'条/秒':>8} {'内存增量MB':>10} {'峰值MB':>8}")
+    for row in rows:
+        rate = row['records'] / row['seconds'] if row['seconds'] else 0
+        print(f"{row['size_mb']:>7} {row['format']:<7} {row['mode']:<7} {row['records']:>9} {row['imported']:>9} "
+              f"{row['seconds']:>8.1f} {rate:>8.0f} {(row['peak_kb'] - row['baseline_kb']) / 1024:>10.1f} "
+              f"{row['peak_kb'] / 1024:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面/API路由性能测试
+
+对每个数据规模用 generate_orders 生成合成订单库，再通过 Flask test client 依次请求各路由：
+- cold: 清空订单快照缓存后的第一次请求
+- p50/p95/mean/min: 之后 --repeat 次请求的耗时
+- peak_kb: 单次请求期间 Python 内存分配峰值（tracemalloc）
+最后对导入接口上传 --import-count 条新订单测一次。
+
+结果保存为JSON，可用 --compare 与之前的结果对比 p50。
+
+使用方法：
+    python benchmarks/bench_routes.py [--sizes 10000,100000] [--repeat 20] [--output result.json]
+    python benchmarks/bench_routes.py --sizes 10000 --compare benchmarks/results/routes_old.json
+"""
+
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+
+from generate_orders import (DEFAULT_SEED, ROOT_DIR, create_database, generate_orders,
+                             to_import_record, use_database)
+
+RESULTS_DIR = os.path.join(ROOT_DIR, 'benchmarks', 'results')
+
+
+def route_list(anchor):
+    """要测试的路由：(名称, 地址)"""
+    from app import calendar_grid_range
+
+    grid_from, grid_to = calendar_grid_range(anchor.year, anchor.month)
+    return [
+        ('index', '/'),
+        ('dashboard', '/dashboard'),
+        ('dashboard_qq', '/dashboard?platform=QQ&sort=order_date&order=desc'),
+        ('analytics', '/analytics'),
+        ('revenue', '/revenue'),
+        ('calendar', '/calendar'),
+        ('api_calendar', f"/api/calendar?from={grid_from}&to={grid_to}&month={anchor.strftime('%Y-%m')}"),
+        ('api_orders', '/api/orders?limit=50'),
+        ('api_orders_status', '/api/orders?limit=500&status=待制作,制作中'),
+        ('export_json', '/api/export_stream?format=json'),
+        ('export_csv', '/api/export_stream?format=csv'),
+    ]
+
+
+def timed_request(client, method, url, **kwargs):
+    """发送请求并读完响应体，返回 (耗时毫秒, 状态码, 响应字节数)"""
+    started = time.perf_counter()
+    response = client.open(url, method=method, **kwargs)
+    size = len(response.get_data())
+    elapsed = (time.perf_counter() - started) * 1000
+    response.close()
+    return elapsed, response.status_code, size
+
+
+def measure_peak(client, method, url, **kwargs):
+    """单次请求期间的 Python 内存分配峰值（KB）"""
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        response = client.open(url, method=method, **kwargs)
+        response.get_data()
+        response.close()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def bench_route(client, name, url, repeat):
+    import app as app_module
+
+    app_module.order_snapshots.clear()
+    app_module.api_order_pages.clear()
+    cold_ms, status, size = timed_request(client, 'GET', url)
+    samples = [timed_request(client, 'GET', url)[0] for _ in range(repeat)]
+    samples.sort()
+    return {
+        'route': name,
+        'url': url,
+        'status': status,
+        'bytes': size,
+        'cold_ms': round(cold_ms, 2),
+        'p50_ms': round(statistics.median(samples), 2),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        'mean_ms': round(statistics.fmean(samples), 2),
+        'min_ms': round(samples[0], 2),
+        'peak_kb': measure_peak(client, 'GET', url),
+    }
+
+
+def bench_import(client, count, seed, anchor):
+    """上传 count 条新订单（与已有数据不同的种子），只测一次"""
+    records = [to_import_record(order) for order in generate_orders(count, seed + 1, anchor)]
+    payload = json.dumps(records, ensure_ascii=False).encode('utf-8')
+
+    def form():
+        return {'file': (io.BytesIO(payload), 'orders.json'), 'clear_existing': 'false'}
+
+    elapsed, status, size = timed_request(client, 'POST', '/api/import_data', data=form(),
+                                          content_type='multipart/form-data')
+    return {
+        'route': 'import',
+        'url': '/api/import_data',
+        'status': status,
+        'bytes': size,
+        'records': count,
+        'upload_bytes': len(payload),
+        'cold_ms': round(elapsed, 2),
+        'p50_ms': round(elapsed, 2),
+        'p95_ms': round(elapsed, 2),
+        'mean_ms': round(elapsed, 2),
+        'min_ms': round(elapsed, 2),
+        'peak_kb': None,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_results(results):
+    print(f"{'规模':>8} {'路由':<18} {'状态':>4} {'大小KB':>9} {'冷启动ms':>9} {'p50ms':>9} {'p95ms':>9} {'峰值KB':>9}")
+    for row in results:
+        peak = f"{row['peak_kb']:>9.1f}" if row['peak_kb'] is not None else f"{'-':>9}"
+        print(f"{row['size']:>8} {row['route']:<18} {row['status']:>4} {row['bytes'] / 1024:>9.1f} "
+              f"{row['cold_ms']:>9.2f} {row['p50_ms']:>9.2f} {row['p95_ms']:>9.2f} {peak}")
+
+
+def print_comparison(results, baseline_path):
+    """按 (规模, 路由) 对比 p50，比值 >1 表示变慢"""
+    with open(baseline_path, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    base = {(row['size'], row['route']): row for row in baseline['results']}
+    print(f"\n对比 {baseline_path}（{baseline['meta'].get('git_revision')}）")
+    print(f"{'规模':>8} {'路由':<18} {'原p50ms':>9} {'现p50ms':>9} {'比值':>7}")
+    for row in results:
+        old = base.get((row['size'], row['route']))
+        if old is None or not old['p50_ms']:
+            continue
+        ratio = row['p50_ms'] / old['p50_ms']
+        print(f"{row['size']:>8} {row['route']:<18} {old['p50_ms']:>9.2f} {row['p50_ms']:>9.2f} {ratio:>7.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='页面/API路由性能测试')
+    parser.add_argument('--sizes', default='10000', help='逗号分隔的订单数量，如 10000,100000,1000000')
+    parser.add_argument('--repeat', type=int, default=20, help='每个路由的计时请求次数')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='随机种子')
+    parser.add_argument('--anchor', type=date.fromisoformat, default=None, help='基准日期 YYYY-MM-DD，缺省为今天')
+    parser.add_argument('--import-count', type=int, default=10000, help='导入测试上传的订单数，0为跳过')
+    parser.add_argument('--routes', default='', help='只测试这些路由（逗号分隔的名称）')
+    parser.add_argument('--output', help='结果JSON路径，缺省写入 benchmarks/results/')
+    parser.add_argument('--compare', help='与之前的结果JSON对比')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    anchor = args.anchor or date.today()
+    only = {name.strip() for name in args.routes.split(',') if name.strip()}
+
+    work_dir = tempfile.mkdtemp(prefix='coswig_bench_')
+    db_path = os.path.join(work_dir, 'bench.db')
+    use_database(db_path)  # 必须在导入 app 之前
+    import app as app_module
+
+    client = app_module.app.test_client()
+    results = []
+    setup = {}
+    try:
+        for size in sizes:
+            seconds = create_database(db_path, size, args.seed, anchor)
+            setup[str(size)] = {'generate_seconds': round(seconds, 2), 'db_bytes': os.path.getsize(db_path)}
+            print(f"\n== {size} 条订单（生成 {seconds:.1f} 秒）==")
+            for name, url in route_list(anchor):
+                if only and name not in only:
+                    continue
+                row = bench_route(client, name, url, args.repeat)
+                row['size'] = size
+                results.append(row)
+                print(f"  {name:<18} p50 {row['p50_ms']:>9.2f} ms")
+            if args.import_count and (not only or 'import' in only):
+                row = bench_import(client, args.import_count, args.seed, anchor)
+                row['size'] = size
+                results.append(row)
+                print(f"  {'import':<18} {row['p50_ms']:>9.2f} ms")
+    finally:
+        with app_module.app.app_context():
+            app_module.db.session.remove()
+            app_module.db.engine.dispose()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'git_revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'anchor': anchor.isoformat(),
+            'repeat': args.repeat,
+            'import_count': args.import_count,
+            'setup': setup,
+        },
+        'results': results,
+    }
+    output_path = args.output
+    if not output_path:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output_path = os.path.join(RESULTS_DIR, f"routes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(output, f, ensure_ascii=False, indent=2)
+
+    print()
+    print_results(results)
+    print(f"\n结果已保存: {output_path}")
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+订单行序列化性能测试
+
+对比每 10000 行订单的CPU时间和内存分配峰值：
+- ORM对象：查询完整 Order 对象，逐字段 strftime 后 json.dumps（最初的写法）
+- 列查询：只查询需要的列，但仍由SQLAlchemy解析日期、Python端 strftime
+- 序列化器：OrderRowSerializer（SQL中直接算出输出值，元组 zip 成字典，json_bytes 编码）
+
+分别测试订单列表（12个字段）和CSV导出两种输出。
+
+使用方法：
+    python benchmarks/bench_serializer.py [--rows 10000] [--repeat 5]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from generate_orders import create_database, use_database
+
+LIST_FIELDS = ('id', 'cn', 'character', 'contact', 'needed_date', 'order_date', 'deposit_paid',
+               'final_amount', 'shipping_included', 'blank_purchased', 'cake_box', 'status')
+
+
+def legacy_order_dict(order):
+    return {
+        'id': order.id,
+        'cn': order.cn,
+        'character': order.character,
+        'contact': order.contact,
+        'needed_date': order.needed_date.strftime('%Y-%m-%d'),
+        'order_date': order.order_date.strftime('%Y-%m-%d'),
+        'deposit_paid': bool(order.deposit_paid),
+        'final_amount': order.final_amount,
+        'shipping_included': bool(order.shipping_included),
+        'blank_purchased': bool(order.blank_purchased),
+        'cake_box': order.cake_box,
+        'status': order.status
+    }
+
+
+def legacy_csv_row(row):
+    return [
+        row.id, row.cn, row.character, row.contact,
+        row.needed_date.strftime('%Y-%m-%d'), row.order_date.strftime('%Y-%m-%d'),
+        '是' if row.deposit_paid else '否', row.final_amount,
+        '是' if row.shipping_included else '否', '是' if row.blank_purchased else '否',
+        row.created_at.strftime('%Y-%m-%d %H:%M:%S') if row.created_at else '', row.status
+    ]
+
+
+def make_cases():
+    from app import db, Order, get_order_serializer, json_bytes, EXPORT_CSV_SERIALIZER, EXPORT_FIELDS
+
+    def list_orm():
+        orders = Order.query.order_by(Order.needed_date).all()
+        return json.dumps([legacy_order_dict(order) for order in orders]).encode('utf-8')
+
+    def list_columns():
+        rows = db.session.query(*[getattr(Order, name) for name in LIST_FIELDS]).order_by(Order.needed_date).all()
+        return json.dumps([legacy_order_dict(row) for row in rows]).encode('utf-8')
+
+    def list_serializer():
+        serializer = get_order_serializer(LIST_FIELDS)
+        rows = db.session.execute(serializer.select().order_by(Order.needed_date)).all()
+        return json_bytes(serializer.to_dicts(rows))
+
+    def csv_columns():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        rows = db.session.query(*[getattr(Order, name) for name in EXPORT_FIELDS]).order_by(Order.id)
+        for row in rows.yield_per(500):
+            writer.writerow(legacy_csv_row(row))
+        return buffer.getvalue().encode('utf-8')
+
+    def csv_serializer():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        statement = EXPORT_CSV_SERIALIZER.select().order_by(Order.id)
+        for rows in db.session.execute(statement, execution_options={'yield_per': 500}).partitions():
+            writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    return [
+        ('订单列表', [('ORM对象', list_orm), ('列查询', list_columns), ('序列化器', list_serializer)]),
+        ('CSV导出', [('列查询', csv_columns), ('序列化器', csv_serializer)]),
+    ]
+
+
+def measure(func, repeat):
+    """返回 (单次CPU秒数中位数, 执行期间Python内存分配峰值KB)"""
+    from app import db
+
+    times = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.process_time()
+        func()
+        times.append(time.process_time() - started)
+    times.sort()
+
+    db.session.expunge_all()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return times[len(times) // 2], peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='订单行序列化性能测试')
+    parser.add_argument('--rows', type=int, default=10000, help='订单数量')
+    parser.add_argument('--repeat', type=int, default=5, help='每种写法的计时次数')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='coswig_bench_')
+    db_path = os.path.join(work_dir, 'bench.db')
+    use_database(db_path)  # 必须在导入 app 之前
+    import app as app_module
+
+    try:
+        create_database(db_path, args.rows)
+        per = 10000 / args.rows
+        with app_module.app.app_context():
+            print(f"订单数: {args.rows}（以下数值换算为每10000行）")
+            for title, cases in make_cases():
+                print(f"\n{title}")
+                print(f"{'写法':<8} {'CPU ms':>10} {'峰值KB':>10}")
+                baseline = None
+                for label, func in cases:
+                    cpu, peak = measure(func, args.repeat)
+                    cpu_ms = cpu * 1000 * per
+                    baseline = baseline or cpu_ms
+                    print(f"{label:<8} {cpu_ms:>10.1f} {peak * per:>10.0f}   {baseline / cpu_ms:.1f}x")
+            app_module.db.session.remove()
+            app_module.db.engine.dispose()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
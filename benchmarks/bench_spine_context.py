@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Spine模型模板注入性能测试
+
+对比每次渲染时的模型解析开销：
+- 旧实现：每次渲染 os.listdir 模型文件夹解析 .skel/.atlas
+- 新实现：inject_spine_model 读取 SpineModelCatalog 的内存缓存
+
+同时统计每次渲染触发的文件系统调用次数（os.listdir/os.scandir/os.stat/os.path.isdir）。
+
+使用方法：
+    python benchmarks/bench_spine_context.py [--models 300] [--renders 20000]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+
+class SyscallCounter:
+    """临时替换 os 模块的目录/文件函数，统计调用次数"""
+
+    NAMES = ('listdir', 'scandir', 'stat')
+
+    def __init__(self):
+        self.count = 0
+        self._originals = {}
+
+    def _wrap(self, func):
+        def wrapper(*args, **kwargs):
+            self.count += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    def __enter__(self):
+        for name in self.NAMES:
+            self._originals[name] = getattr(os, name)
+            setattr(os, name, self._wrap(self._originals[name]))
+        self._originals['isdir'] = os.path.isdir
+        os.path.isdir = self._wrap(self._originals['isdir'])
+        return self
+
+    def __exit__(self, *exc):
+        for name in self.NAMES:
+            setattr(os, name, self._originals[name])
+        os.path.isdir = self._originals['isdir']
+
+
+def make_models(root, count):
+    """生成 count 个包含 .skel/.atlas/.png 的模型文件夹"""
+    names = [app_module.DEFAULT_SPINE_MODEL_ID] + [f'{i:03d}_model' for i in range(count - 1)]
+    for name in names:
+        folder = os.path.join(root, name)
+        os.makedirs(folder)
+        for ext in ('skel', 'atlas', 'png'):
+            open(os.path.join(folder, f'build_char_{name}.{ext}'), 'wb').close()
+    return names
+
+
+def legacy_inject(models_dir, model_id):
+    """旧版 inject_spine_model 的解析逻辑（每次渲染读取目录）"""
+    base_dir = os.path.join(models_dir, model_id)
+    skel_file = None
+    atlas_file = None
+    if os.path.isdir(base_dir):
+        for f in os.listdir(base_dir):
+            if f.endswith('.skel'):
+                skel_file = f
+            elif f.endswith('.atlas'):
+                atlas_file = f
+    return {
+        'SPINE_MODEL_ID': model_id,
+        'SPINE_MODEL_SKEL': f"/arkmodels/{quote(model_id, safe='')}/{quote(skel_file, safe='')}" if skel_file else '',
+        'SPINE_MODEL_ATLAS': f"/arkmodels/{quote(model_id, safe='')}/{quote(atlas_file, safe='')}" if atlas_file else ''
+    }
+
+
+def measure(label, func, renders):
+    """执行 renders 次 func，返回单次耗时(微秒)和单次系统调用数"""
+    with SyscallCounter() as counter:
+        start = time.perf_counter()
+        for _ in range(renders):
+            func()
+        elapsed = time.perf_counter() - start
+    per_call_us = elapsed / renders * 1e6
+    per_call_syscalls = counter.count / renders
+    print(f"{label:<12} {per_call_us:>10.2f} us/次 {per_call_syscalls:>8.2f} 次系统调用/次")
+    return per_call_us, per_call_syscalls
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Spine模型模板注入性能测试')
+    parser.add_argument('--models', type=int, default=300, help='模型文件夹数量')
+    parser.add_argument('--renders', type=int, default=20000, help='模拟渲染次数')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='spine_models_')
+    try:
+        names = make_models(root, args.models)
+        model_id = names[len(names) // 2]
+
+        catalog = app_module.SpineModelCatalog(root)
+        catalog.refresh(force=True)
+        app_module.spine_catalog = catalog
+
+        flask_app = app_module.app
+        with flask_app.test_request_context('/'):
+            app_module.session['spine_model_id'] = model_id
+            assert app_module.inject_spine_model() == legacy_inject(root, model_id)
+
+            print(f"模型数量: {len(names)}，渲染次数: {args.renders}")
+            before, _ = measure('旧实现', lambda: legacy_inject(root, model_id), args.renders)
+            after, _ = measure('新实现', app_module.inject_spine_model, args.renders)
+            print(f"单次渲染开销降低 {before / after:.1f} 倍")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
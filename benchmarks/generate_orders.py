@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成订单数据生成器
+
+按固定随机种子生成分布接近真实的订单：平台按 QQ/微信/闲鱼 加权，
+下单日期集中在最近一段时间，状态随需要日期与基准日的距离变化
+（早已过期的多为已发货/已完成，临近的多为制作中，较远的多为待制作）。
+相同的 seed 和 anchor（基准日期）生成的数据完全相同。
+
+使用方法：
+    python benchmarks/generate_orders.py --count 100000 --db bench.db [--seed 42] [--anchor 2025-09-01]
+    python benchmarks/generate_orders.py --count 10000 --json orders.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+DEFAULT_SEED = 42
+DEFAULT_SPAN_DAYS = 730  # 下单日期分布在基准日之前的天数
+LOAD_BATCH_SIZE = 5000  # 写入数据库时每个事务的行数
+
+SURNAMES = '林陈王李张刘杨黄赵吴周徐孙马朱胡郭何高罗郑梁谢宋唐许韩冯邓曹彭曾萧田董潘袁蔡蒋余于杜叶程魏苏吕丁沈'
+GIVEN_NAMES = ('小雨', '花花', '七七', '阿离', '星河', '糖糖', '一一', '木子', '初夏', '栗子', '芋圆', '团子',
+               '白桃', '青柠', '鹿鹿', '橘子', '墨墨', '阿怪', '猫猫', '小鱼')
+CHARACTERS = ('贞德', '临光', '德克萨斯', '能天使', '陈', '阿米娅', '斯卡蒂', '银灰', '初音未来', '雷电将军',
+              '甘雨', '胡桃', '钟离', '刻晴', '芙宁娜', '纳西妲', '蕾姆', '两仪式', '五条悟', '灶门炭治郎',
+              '蝴蝶忍', '艾尔海森', '流萤', '黄泉', '镜流', '卡芙卡', '银狼', '藿藿', '符玄', '砂狼白子')
+PLATFORMS = (('QQ', 50), ('微信', 35), ('闲鱼', 15))
+CAKE_BOXES = (('不需要', 80), ('需要', 20))
+
+# 需要日期距基准日的天数区间 -> 状态权重
+STATUS_WEIGHTS = (
+    (-10 ** 6, -15, (('已发货', 55), ('已完成', 35), ('已取消', 5), ('制作中', 5))),
+    (-14, -1, (('已完成', 40), ('已发货', 30), ('制作中', 20), ('待制作', 10))),
+    (0, 14, (('制作中', 50), ('待制作', 35), ('已完成', 15))),
+    (15, 10 ** 6, (('待制作', 75), ('制作中', 25))),
+)
+
+
+def _weighted(rng, choices):
+    values, weights = zip(*choices)
+    return rng.choices(values, weights=weights)[0]
+
+
+def _status_for(rng, days_left):
+    for low, high, choices in STATUS_WEIGHTS:
+        if low <= days_left <= high:
+            return _weighted(rng, choices)
+    return '待制作'
+
+
+def generate_orders(count, seed=DEFAULT_SEED, anchor=None, span_days=DEFAULT_SPAN_DAYS):
+    """
+    逐条生成订单（订单表的列值，日期为 date 对象）
+
+    Args:
+        count (int): 订单数量
+        seed (int): 随机种子
+        anchor (date): 基准日期，缺省为今天
+        span_days (int): 下单日期最早为基准日之前多少天
+    """
+    rng = random.Random(seed)
+    anchor = anchor or date.today()
+    names = [surname + given for surname in SURNAMES for given in GIVEN_NAMES]
+    for _ in range(count):
+        # 越近的日期订单越多
+        order_date = anchor - timedelta(days=int(rng.triangular(0, span_days, 0)))
+        needed_date = order_date + timedelta(days=rng.randint(7, 90))
+        status = _status_for(rng, (needed_date - anchor).days)
+        started = status in ('制作中', '已完成', '已发货')
+        yield {
+            'cn': rng.choice(names),
+            'character': rng.choice(CHARACTERS),
+            'contact': _weighted(rng, PLATFORMS),
+            'needed_date': needed_date,
+            'order_date': order_date,
+            'deposit_paid': started or rng.random() < 0.6,
+            'final_amount': float(rng.randrange(200, 1200, 10)),
+            'shipping_included': rng.random() < 0.4,
+            'blank_purchased': started or rng.random() < 0.3,
+            'cake_box': _weighted(rng, CAKE_BOXES),
+            'created_at': datetime.combine(order_date, datetime.min.time()) + timedelta(seconds=rng.randrange(86400)),
+            'status': status,
+        }
+
+
+def to_import_record(order):
+    """转换为导入/导出文件使用的JSON格式"""
+    record = dict(order)
+    record['needed_date'] = order['needed_date'].strftime('%Y-%m-%d')
+    record['order_date'] = order['order_date'].strftime('%Y-%m-%d')
+    record['created_at'] = order['created_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return record
+
+
+def sqlite_uri(path):
+    """数据库文件路径转换为 SQLAlchemy 连接地址"""
+    return f"sqlite:///{os.path.abspath(path)}"
+
+
+def use_database(path):
+    """
+    指定应用使用的数据库文件
+
+    必须在第一次 import app 之前调用（应用在导入时读取 COSWIG_DATABASE_URI）
+    """
+    os.environ['COSWIG_DATABASE_URI'] = sqlite_uri(path)
+
+
+def load_orders(orders, batch_size=LOAD_BATCH_SIZE):
+    """
+    批量写入订单并重建统计汇总（需要在应用上下文中调用）
+
+    Returns:
+        int: 写入的订单数
+    """
+    from app import db, Order, rebuild_order_stats
+
+    insert_stmt = Order.__table__.insert()
+    batch = []
+    count = 0
+    for order in orders:
+        batch.append(order)
+        if len(batch) >= batch_size:
+            db.session.connection().execute(insert_stmt, batch)
+            db.session.commit()
+            count += len(batch)
+            batch.clear()
+    if batch:
+        db.session.connection().execute(insert_stmt, batch)
+        db.session.commit()
+        count += len(batch)
+    rebuild_order_stats()
+    return count
+
+
+def create_database(path, count, seed=DEFAULT_SEED, anchor=None):
+    """
+    重新创建数据库文件并写入 count 条合成订单
+
+    应用须已通过 use_database(path) 指向该文件
+
+    Returns:
+        float: 耗时（秒）
+    """
+    from app import app, db, init_database
+
+    started = time.perf_counter()
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        init_database()
+        load_orders(generate_orders(count, seed, anchor))
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description='合成订单数据生成器')
+    parser.add_argument('--count', type=int, default=10000, help='订单数量')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='随机种子')
+    parser.add_argument('--anchor', type=date.fromisoformat, default=None, help='基准日期 YYYY-MM-DD，缺省为今天')
+    parser.add_argument('--db', help='写入的数据库文件（会被覆盖）')
+    parser.add_argument('--json', help='写入的JSON文件（导入格式）')
+    args = parser.parse_args()
+
+    if not args.db and not args.json:
+        parser.error('请指定 --db 或 --json')
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            f.write('[\n')
+            for index, order in enumerate(generate_orders(args.count, args.seed, args.anchor)):
+                if index:
+                    f.write(',\n')
+                f.write(json.dumps(to_import_record(order), ensure_ascii=False))
+            f.write('\n]\n')
+        print(f"已生成 {args.count} 条订单: {args.json}")
+
+    if args.db:
+        use_database(args.db)
+        seconds = create_database(args.db, args.count, args.seed, args.anchor)
+        print(f"已生成 {args.count} 条订单: {args.db}（{seconds:.1f} 秒）")
+
+
+if __name__ == '__main__':
+    main()
@@ -6,26 +6,35 @@
 功能模块：
 1. 数据导出 - 支持JSON和CSV格式
 2. 数据导入 - 从JSON文件恢复数据
-3. 数据库备份 - 完整备份SQLite数据库
+3. 数据库备份 - 在线备份SQLite数据库（运行中可安全备份）
 4. 数据库恢复 - 从备份文件恢复数据库
 5. 数据库信息查看 - 显示统计信息
+6. 数据库结构升级 - 执行迁移并检查查询计划
+7. 统计汇总重建 - 从订单表重新计算统计页面使用的汇总
+8. 去重备份仓库 - 压缩、按数据块去重的备份，按小时/天/周保留策略自动清理
 
 使用方法：
     python data_manager.py
 """
 
-import json
-import csv
 import sqlite3
 import shutil
 from datetime import datetime, date
 import os
-from app import app, db, Order
+from sqlalchemy import select
+from app import (app, db, Order, OrderStat, init_database, get_schema_version, rebuild_order_stats,
+                 iter_orders_json, iter_orders_csv, import_orders_from_file, prune_order_changes,
+                 revenue_summary_query, order_page_statement, API_ORDERS_DEFAULT_LIMIT,
+                 ORDER_CHANGES_RETENTION_DAYS, calendar_grid_range)
+from db_backup import (online_backup, backup_filename, checkpoint_wal, store_backup, list_store_backups,
+                       verify_store_backup, restore_store_backup, apply_retention, DEFAULT_RETENTION)
 
 def export_to_json(filename=None):
     """
     导出所有订单数据到JSON文件
     
+    分批读取并逐批写入文件，内存占用与订单数量无关
+    
     Args:
         filename (str, optional): 输出文件名，默认为带时间戳的文件名
     
@@ -37,39 +46,22 @@ def export_to_json(filename=None):
         filename = f"orders_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     
     with app.app_context():
-        # 查询所有订单
-        orders = Order.query.all()
-        orders_data = []
-        
-        # 将订单对象转换为字典格式
-        for order in orders:
-            orders_data.append({
-                'id': order.id,
-                'cn': order.cn,
-                'character': order.character,
-                'contact': order.contact,
-                'needed_date': order.needed_date.strftime('%Y-%m-%d'),
-                'order_date': order.order_date.strftime('%Y-%m-%d'),
-                'deposit_paid': order.deposit_paid,
-                'final_amount': order.final_amount,
-                'shipping_included': order.shipping_included,
-                'blank_purchased': order.blank_purchased,
-                'created_at': order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                'status': order.status
-            })
-    
-    # 写入JSON文件
-    with open(filename, 'w', encoding='utf-8') as f:
-        json.dump(orders_data, f, ensure_ascii=False, indent=2)
+        # 写入JSON文件（每个订单一行）
+        with open(filename, 'w', encoding='utf-8') as f:
+            for chunk in iter_orders_json():
+                f.write(chunk)
+        total = Order.query.count()
     
     print(f"数据已导出到: {filename}")
-    print(f"共导出 {len(orders_data)} 条订单记录")
+    print(f"共导出 {total} 条订单记录")
     return filename
 
 def export_to_csv(filename=None):
     """
     导出所有订单数据到CSV文件（Excel兼容格式）
     
+    分批读取并逐批写入文件，内存占用与订单数量无关
+    
     Args:
         filename (str, optional): 输出文件名，默认为带时间戳的文件名
     
@@ -81,46 +73,26 @@ def export_to_csv(filename=None):
         filename = f"orders_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     
     with app.app_context():
-        # 查询所有订单
-        orders = Order.query.all()
-        
-        # 使用utf-8-sig编码确保Excel正确显示中文
-        with open(filename, 'w', newline='', encoding='utf-8-sig') as csvfile:
-            # 定义CSV列标题（中文）
-            fieldnames = ['ID', 'CN', '动漫角色', '联系方式', '客户排单', 'DDL', 
-                         '定金已付', '尾款金额', '尾款含邮', '毛坯已购', '创建时间', '订单状态']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            # 写入表头
-            writer.writeheader()
-            
-            # 写入订单数据
-            for order in orders:
-                writer.writerow({
-                    'ID': order.id,
-                    'CN': order.cn,
-                    '动漫角色': order.character,
-                    '联系方式': order.contact,
-                    '客户排单': order.needed_date.strftime('%Y-%m-%d'),
-                    'DDL': order.order_date.strftime('%Y-%m-%d'),
-                    '定金已付': '是' if order.deposit_paid else '否',
-                    '尾款金额': order.final_amount,
-                    '尾款含邮': '是' if order.shipping_included else '否',
-                    '毛坯已购': '是' if order.blank_purchased else '否',
-                    '创建时间': order.created_at.strftime('%Y-%m-%d %H:%M:%S'),
-                    '订单状态': order.status
-                })
+        # BOM由 iter_orders_csv 写入，确保Excel正确显示中文
+        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
+            for chunk in iter_orders_csv():
+                csvfile.write(chunk)
+        total = Order.query.count()
     
     print(f"数据已导出到: {filename}")
-    print(f"共导出 {len(orders)} 条订单记录")
+    print(f"共导出 {total} 条订单记录")
     return filename
 
 def import_from_json(filename):
     """
     从JSON文件导入订单数据到数据库
     
+    使用与导入API相同的流式解析和批量导入引擎（import_orders_from_file），
+    支持JSON数组和NDJSON，内存占用与文件大小无关；按 (cn, character, needed_date) 跳过已存在的订单。
+    清空现有数据时先检查整个文件的格式，损坏的文件不会清空订单表
+    
     Args:
-        filename (str): JSON文件路径
+        filename (str): JSON或NDJSON文件路径
     
     Returns:
         bool: 导入是否成功
@@ -131,56 +103,23 @@ def import_from_json(filename):
         return False
     
     try:
-        # 读取JSON文件
-        with open(filename, 'r', encoding='utf-8') as f:
-            orders_data = json.load(f)
-        
-        with app.app_context():
+        with app.app_context(), open(filename, 'rb') as f:
             # 询问是否清空现有数据
             confirm = input("是否清空现有数据？(y/N): ")
-            if confirm.lower() == 'y':
-                Order.query.delete()
-                db.session.commit()
-                print("已清空现有数据")
+            clear_existing = confirm.lower() == 'y'
             
-            imported_count = 0
-            # 逐条导入订单数据
-            for order_data in orders_data:
-                try:
-                    # 检查是否已存在相同ID的订单（避免重复导入）
-                    existing_order = Order.query.get(order_data['id'])
-                    if existing_order and confirm.lower() != 'y':
-                        print(f"跳过重复订单 ID: {order_data['id']}")
-                        continue
-                    
-                    # 创建新订单对象
-                    order = Order(
-                        cn=order_data['cn'],
-                        character=order_data['character'],
-                        contact=order_data['contact'],
-                        needed_date=datetime.strptime(order_data['needed_date'], '%Y-%m-%d').date(),
-                        order_date=datetime.strptime(order_data['order_date'], '%Y-%m-%d').date(),
-                        deposit_paid=order_data['deposit_paid'],
-                        final_amount=order_data['final_amount'],
-                        shipping_included=order_data['shipping_included'],
-                        blank_purchased=order_data['blank_purchased'],
-                        status=order_data['status']
-                    )
-                    
-                    # 如果备份文件包含创建时间，保持原始时间
-                    if 'created_at' in order_data:
-                        order.created_at = datetime.strptime(order_data['created_at'], '%Y-%m-%d %H:%M:%S')
-                    
-                    db.session.add(order)
-                    imported_count += 1
-                    
-                except Exception as e:
-                    print(f"导入订单失败: {order_data.get('cn', 'Unknown')} - {str(e)}")
-                    continue
+            result = import_orders_from_file(f, clear_existing=clear_existing)
+            if clear_existing:
+                print("已清空现有数据")
             
-            # 提交所有更改
-            db.session.commit()
-            print(f"成功导入 {imported_count} 条订单记录")
+            for error in result['errors']:
+                print(f"导入订单失败: 第{error['index']}条 {error['cn'] or 'Unknown'} - {error['message']}")
+            if result['skipped_count']:
+                print(f"跳过重复订单 {result['skipped_count']} 条")
+            print(f"成功导入 {result['imported_count']} 条订单记录")
+            if result['fatal_error']:
+                print(f"文件格式错误，导入中途停止: {result['fatal_error']}（之后的记录未导入）")
+                return False
             return True
             
     except Exception as e:
@@ -189,7 +128,9 @@ def import_from_json(filename):
 
 def backup_database(backup_dir="backups"):
     """
-    备份SQLite数据库文件
+    在线备份SQLite数据库文件
+    
+    使用SQLite在线备份接口分步复制，应用运行中也可安全备份
     
     Args:
         backup_dir (str): 备份目录，默认为'backups'
@@ -197,10 +138,6 @@ def backup_database(backup_dir="backups"):
     Returns:
         str or False: 成功时返回备份文件路径，失败时返回False
     """
-    # 确保备份目录存在
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
-    
     # 数据库文件路径
     db_path = "instance/coswig_orders.db"
     if not os.path.exists(db_path):
@@ -208,15 +145,19 @@ def backup_database(backup_dir="backups"):
         return False
     
     # 生成带时间戳的备份文件名
-    backup_filename = f"coswig_orders_backup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-    backup_path = os.path.join(backup_dir, backup_filename)
+    backup_path = os.path.join(backup_dir, backup_filename())
+    
+    def show_progress(copied, total):
+        print(f"\r备份进度: {copied}/{total} 页", end='', flush=True)
     
     try:
-        # 复制数据库文件到备份目录
-        shutil.copy2(db_path, backup_path)
+        result = online_backup(db_path, backup_path, progress=show_progress)
+        print()
         print(f"数据库已备份到: {backup_path}")
+        print(f"大小: {result['size']/1024:.2f} KB，耗时 {result['seconds']} 秒")
         return backup_path
     except Exception as e:
+        print()
         print(f"备份失败: {str(e)}")
         return False
 
@@ -224,6 +165,8 @@ def restore_database(backup_file):
     """
     从备份文件恢复数据库
     
+    数据库使用WAL模式，恢复前请先停止应用；替换文件前会先把WAL内容写回主文件
+    
     Args:
         backup_file (str): 备份文件路径
     
@@ -239,6 +182,7 @@ def restore_database(backup_file):
     
     # 在恢复前备份当前数据库（安全措施）
     if os.path.exists(db_path):
+        checkpoint_wal(db_path)
         current_backup = f"coswig_orders_before_restore_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
         shutil.copy2(db_path, current_backup)
         print(f"当前数据库已备份为: {current_backup}")
@@ -252,6 +196,91 @@ def restore_database(backup_file):
         print(f"恢复失败: {str(e)}")
         return False
 
+def store_backup_database(store_dir="backups/store"):
+    """
+    在线备份数据库到去重仓库，并按保留策略清理旧备份
+    
+    Args:
+        store_dir (str): 仓库目录，默认为'backups/store'
+    
+    Returns:
+        str or False: 成功时返回备份ID，失败时返回False
+    """
+    db_path = "instance/coswig_orders.db"
+    if not os.path.exists(db_path):
+        print("数据库文件不存在")
+        return False
+    
+    try:
+        result = store_backup(db_path, store_dir)
+        print(f"备份ID: {result['id']}")
+        print(f"数据库大小: {result['size']/1024:.2f} KB，共 {result['chunk_count']} 个数据块")
+        print(f"新写入 {result['new_chunks']} 个数据块，{result['new_bytes']/1024:.2f} KB（压缩后）")
+        prune_backups(store_dir)
+        return result['id']
+    except Exception as e:
+        print(f"备份失败: {str(e)}")
+        return False
+
+def show_store_backups(store_dir="backups/store", deep=False):
+    """
+    列出仓库中的备份并逐个校验
+    
+    Args:
+        store_dir (str): 仓库目录
+        deep (bool): 是否解压并校验内容哈希（默认只检查数据块文件）
+    
+    Returns:
+        bool: 全部备份校验通过时返回True
+    """
+    backups = list_store_backups(store_dir)
+    if not backups:
+        print("仓库中没有备份")
+        return True
+    
+    all_ok = True
+    for backup in backups:
+        problems = verify_store_backup(store_dir, backup['id'], deep=deep)
+        all_ok = all_ok and not problems
+        print(f"{backup['id']}  {backup['created_at']}  {backup['size']/1024:.2f} KB  "
+              f"{'OK' if not problems else '损坏'}")
+        for problem in problems[:5]:
+            print(f"    {problem}")
+    return all_ok
+
+def prune_backups(store_dir="backups/store", retention=None):
+    """
+    按保留策略（默认每小时24个、每天7个、每周4个）清理仓库中的旧备份
+    
+    Returns:
+        dict: apply_retention 的结果
+    """
+    result = apply_retention(store_dir, **(retention or DEFAULT_RETENTION))
+    print(f"保留 {len(result['kept'])} 个备份，删除 {len(result['removed'])} 个")
+    if result['freed_chunks']:
+        print(f"清理数据块 {result['freed_chunks']} 个，释放 {result['freed_bytes']/1024:.2f} KB")
+    return result
+
+def restore_from_store(backup_id, store_dir="backups/store"):
+    """
+    从去重仓库恢复数据库
+    
+    先还原为临时文件并校验，再按 restore_database 的流程替换当前数据库
+    
+    Returns:
+        bool: 恢复是否成功
+    """
+    temp_path = f"restore_{backup_id}.db"
+    try:
+        restore_store_backup(store_dir, backup_id, temp_path)
+        return restore_database(temp_path)
+    except Exception as e:
+        print(f"恢复失败: {str(e)}")
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
 def show_database_info():
     """
     显示数据库详细信息和统计数据
@@ -288,6 +317,108 @@ def show_database_info():
     else:
         print("数据库文件不存在")
 
+def upgrade_database():
+    """
+    执行数据库结构迁移
+    
+    Returns:
+        int: 升级后的结构版本
+    """
+    with app.app_context():
+        before = get_schema_version()
+        executed = init_database()
+        after = get_schema_version()
+    
+    if executed:
+        print(f"已执行迁移: {', '.join(str(v) for v in executed)}")
+    else:
+        print("数据库结构已是最新")
+    print(f"结构版本: {before} -> {after}")
+    return after
+
+def rebuild_stats():
+    """
+    根据订单表全量重建统计汇总（order_stats）
+    
+    统计汇总由订单增删改事件增量维护，直接改动数据库文件后可用此命令校正
+    """
+    with app.app_context():
+        rebuild_order_stats()
+        rows = OrderStat.query.order_by(OrderStat.status, OrderStat.contact).all()
+    
+    print(f"统计汇总已重建，共 {len(rows)} 组")
+    for row in rows:
+        print(f"  {row.status or '(无状态)'} / {row.contact}: {row.order_count} 单, {row.revenue_total:.2f} 元")
+    return True
+
+def _explain(conn, query):
+    """返回ORM查询或 select 语句在SQLite中的查询计划（每行一个步骤）"""
+    statement = getattr(query, 'statement', query)
+    compiled = statement.compile(dialect=db.engine.dialect,
+                                       compile_kwargs={'render_postcompile': True})
+    params = []
+    for key in compiled.positiontup:
+        value = compiled.params[key]
+        params.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + compiled.string, tuple(params)).fetchall()
+    return [row[-1] for row in rows]
+
+def check_query_plans():
+    """
+    检查主要页面的查询是否命中订单表索引
+    
+    对看板、日历、收入页面和订单API使用的查询执行 EXPLAIN QUERY PLAN，
+    计划中没有任何索引访问（纯全表扫描）或需要临时排序（USE TEMP B-TREE FOR ORDER BY）即视为未命中；
+    指定了索引的查询还要求计划中使用该索引
+    
+    Returns:
+        bool: 全部查询都命中索引时返回True
+    """
+    today = date.today()
+    with app.app_context():
+        queries = [
+            ('看板 - 按客户排单排序', Order.query.order_by(Order.needed_date.asc())),
+            ('看板 - 按DDL排序', Order.query.order_by(Order.order_date.desc())),
+            ('看板 - 平台筛选', Order.query.filter(Order.contact == 'QQ').order_by(Order.needed_date.asc())),
+            ('API - 状态筛选分页', order_page_statement(select(Order), ['待制作'], API_ORDERS_DEFAULT_LIMIT + 1)),
+            ('日历 - 视图范围订单', Order.query.filter(Order.needed_date.between(*calendar_grid_range(today.year, today.month))).order_by(Order.needed_date.asc(), Order.id.asc())),
+            ('API - 已完成订单', order_page_statement(select(Order), ['已完成', '已发货'], API_ORDERS_DEFAULT_LIMIT + 1)),
+        ]
+        # 收入页面为 GROUP BY 全表聚合，月份分组本身需要临时B树，只要求扫描覆盖索引而不读订单表
+        index_queries = [
+            ('收入 - 按平台和月份汇总', revenue_summary_query(), 'ix_order_revenue'),
+        ]
+        
+        all_ok = True
+        with db.engine.connect() as conn:
+            for label, query, index_name in [(label, query, None) for label, query in queries] + index_queries:
+                plan = _explain(conn, query)
+                if index_name:
+                    ok = any(f'USING COVERING INDEX {index_name}' in step for step in plan)
+                else:
+                    uses_index = any('USING INDEX' in step or 'USING COVERING INDEX' in step
+                                     or 'USING INTEGER PRIMARY KEY' in step for step in plan)
+                    temp_sort = any('USE TEMP B-TREE FOR ORDER BY' in step for step in plan)
+                    ok = uses_index and not temp_sort
+                all_ok = all_ok and ok
+                print(f"[{'OK' if ok else '未命中'}] {label}")
+                for step in plan:
+                    print(f"    {step}")
+    
+    return all_ok
+
+def prune_changes(max_age_days=ORDER_CHANGES_RETENTION_DAYS):
+    """
+    清理订单变更日志（order_changes）
+    
+    同一订单只保留最新一条，并删除超过保留天数的记录；
+    游标早于清理位置的同步客户端会收到 reset 并重新加载全部订单
+    """
+    with app.app_context():
+        removed = prune_order_changes(max_age_days)
+    print(f"已清理 {removed} 条变更记录（保留最近 {max_age_days} 天）")
+    return removed
+
 def main():
     """
     数据管理工具主菜单
@@ -303,9 +434,17 @@ def main():
         print("4. 从JSON导入数据")
         print("5. 备份数据库")
         print("6. 恢复数据库")
+        print("7. 升级数据库结构")
+        print("8. 检查查询计划")
+        print("9. 重建统计汇总")
+        print("10. 备份到去重仓库")
+        print("11. 查看并校验仓库备份")
+        print("12. 按保留策略清理仓库")
+        print("13. 从仓库恢复数据库")
+        print("14. 清理订单变更日志")
         print("0. 退出")
         
-        choice = input("\n请选择操作 (0-6): ").strip()
+        choice = input("\n请选择操作 (0-14): ").strip()
         
         # 处理用户选择
         if choice == '0':
@@ -330,6 +469,26 @@ def main():
             backup_file = input("输入备份文件路径: ").strip()
             if backup_file:
                 restore_database(backup_file)
+        elif choice == '7':
+            upgrade_database()
+        elif choice == '8':
+            check_query_plans()
+        elif choice == '9':
+            rebuild_stats()
+        elif choice == '10':
+            store_backup_database()
+        elif choice == '11':
+            deep = input("是否解压校验内容？(y/N): ").strip().lower() == 'y'
+            show_store_backups(deep=deep)
+        elif choice == '12':
+            prune_backups()
+        elif choice == '13':
+            backup_id = input("输入备份ID: ").strip()
+            if backup_id:
+                restore_from_store(backup_id)
+        elif choice == '14':
+            days = input(f"保留天数 (留空使用默认 {ORDER_CHANGES_RETENTION_DAYS}): ").strip()
+            prune_changes(int(days) if days.isdigit() else ORDER_CHANGES_RETENTION_DAYS)
         else:
             print("无效选择，请重试")
 
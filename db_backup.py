@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+07妙妙屋订单管理系统 - 数据库在线备份
+
+使用 SQLite 在线备份接口（sqlite3.Connection.backup）分步复制数据库页：
+每步只复制少量页并短暂让出锁，应用在备份期间仍可正常读写。
+备份先写入临时文件，完成并校验后再改名，不会留下不完整的备份文件。
+
+另提供去重备份仓库：快照按块切分、gzip压缩并按内容哈希存放，
+多次备份共享未变化的数据块，配合按小时/天/周的保留策略自动清理旧备份。
+
+本模块不依赖 Flask，可被 app.py 和 data_manager.py 共同使用。
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+BACKUP_PAGES_PER_STEP = 256  # 每步复制的页数（默认页大小4KB时约1MB）
+BACKUP_STEP_PAUSE = 0.005  # 每步之间让出锁的时间（秒），供写入方提交
+
+
+def backup_filename(prefix='coswig_orders_backup'):
+    """生成带时间戳的备份文件名"""
+    return f"{prefix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
+
+
+def online_backup(src_path, dest_path, pages_per_step=BACKUP_PAGES_PER_STEP,
+                  pause=BACKUP_STEP_PAUSE, verify=True, progress=None):
+    """
+    在线备份SQLite数据库
+
+    Args:
+        src_path (str): 源数据库文件
+        dest_path (str): 备份文件路径
+        pages_per_step (int): 每步复制的页数
+        pause (float): 每步之间的暂停时间（秒）
+        verify (bool): 完成后对备份执行 PRAGMA quick_check
+        progress (callable, optional): progress(copied_pages, total_pages) 进度回调
+
+    Returns:
+        dict: path/size/pages/steps/seconds
+
+    Raises:
+        FileNotFoundError: 源数据库不存在
+        sqlite3.DatabaseError: 备份或校验失败
+    """
+    if not os.path.exists(src_path):
+        raise FileNotFoundError(f"数据库文件不存在: {src_path}")
+
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    os.makedirs(dest_dir, exist_ok=True)
+    temp_path = f"{dest_path}.partial"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    stats = {'steps': 0, 'pages': 0}
+
+    def on_step(status, remaining, total):
+        stats['steps'] += 1
+        stats['pages'] = total
+        if progress:
+            progress(total - remaining, total)
+        if remaining and pause:
+            # 两步之间不持有源库的锁，写入方可以在这段时间提交
+            time.sleep(pause)
+
+    started = time.perf_counter()
+    src = sqlite3.connect(src_path)
+    dest = sqlite3.connect(temp_path)
+    try:
+        src.backup(dest, pages=pages_per_step, progress=on_step)
+        if verify:
+            result = dest.execute('PRAGMA quick_check').fetchone()[0]
+            if result != 'ok':
+                raise sqlite3.DatabaseError(f"备份校验失败: {result}")
+    except Exception:
+        dest.close()
+        src.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    dest.close()
+    src.close()
+
+    os.replace(temp_path, dest_path)
+    return {
+        'path': dest_path,
+        'size': os.path.getsize(dest_path),
+        'pages': stats['pages'],
+        'steps': stats['steps'],
+        'seconds': round(time.perf_counter() - started, 3),
+    }
+
+
+def checkpoint_wal(db_path):
+    """
+    把 WAL 文件中的内容写回主数据库文件并清空 WAL（非WAL模式时无操作）
+
+    直接复制或替换数据库文件前调用，保证主文件是完整的，且不会遗留与新文件不一致的 -wal 文件
+    """
+    if not os.path.exists(db_path):
+        return
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    finally:
+        conn.close()
+
+
+# ==================== 去重备份仓库 ====================
+#
+# 仓库目录结构：
+#   chunks/<哈希前两位>/<sha256>   gzip压缩的数据块，按未压缩内容的sha256命名
+#   manifests/<备份ID>.json        备份清单：数据块列表、各块压缩大小、整库sha256
+#
+# 数据库快照按固定大小（页大小的整数倍）切块，未变化的页对应的数据块在多次备份间共享，
+# 频繁备份只写入变化的数据块。
+
+STORE_CHUNK_SIZE = 64 * 1024  # 数据块大小，为SQLite常用页大小(4KB)的整数倍
+STORE_COMPRESS_LEVEL = 6  # gzip压缩级别
+STORE_GC_GRACE_SECONDS = 3600  # 清理未引用数据块时跳过最近一小时内写入/复用的块
+
+# 保留策略默认值：每小时保留最近24个、每天7个、每周4个
+DEFAULT_RETENTION = {'hourly': 24, 'daily': 7, 'weekly': 4}
+
+
+def _chunk_path(store_dir, digest):
+    return os.path.join(store_dir, 'chunks', digest[:2], digest)
+
+
+def _manifest_path(store_dir, backup_id):
+    return os.path.join(store_dir, 'manifests', f"{backup_id}.json")
+
+
+def _write_atomic(path, data):
+    """先写临时文件再改名，避免留下半个文件"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+
+def store_backup(src_path, store_dir, chunk_size=STORE_CHUNK_SIZE):
+    """
+    将数据库在线备份到去重仓库
+
+    先用在线备份接口生成一致的快照，再切块、压缩，只写入仓库中不存在的数据块
+
+    Args:
+        src_path (str): 源数据库文件
+        store_dir (str): 仓库目录
+        chunk_size (int): 数据块大小
+
+    Returns:
+        dict: 备份清单（不含数据块列表），附加 new_chunks/new_bytes 本次新写入的块数和压缩字节数
+    """
+    started = time.perf_counter()
+    created_at = datetime.now()
+    backup_id = f"{created_at.strftime('%Y%m%dT%H%M%S')}_{os.urandom(3).hex()}"
+    snapshot_path = os.path.join(store_dir, 'tmp', f"{backup_id}.db")
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+
+    try:
+        online_backup(src_path, snapshot_path, verify=True)
+
+        whole = hashlib.sha256()
+        chunks = []
+        new_chunks = 0
+        new_bytes = 0
+        with open(snapshot_path, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                whole.update(data)
+                digest = hashlib.sha256(data).hexdigest()
+                path = _chunk_path(store_dir, digest)
+                if os.path.exists(path):
+                    os.utime(path)  # 刷新mtime，避免被并发的清理误删
+                else:
+                    _write_atomic(path, gzip.compress(data, compresslevel=STORE_COMPRESS_LEVEL, mtime=0))
+                    new_chunks += 1
+                    new_bytes += os.path.getsize(path)
+                chunks.append([digest, os.path.getsize(path)])
+        size = os.path.getsize(snapshot_path)
+    finally:
+        if os.path.exists(snapshot_path):
+            os.remove(snapshot_path)
+
+    manifest = {
+        'id': backup_id,
+        'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+        'source': os.path.basename(src_path),
+        'size': size,
+        'sha256': whole.hexdigest(),
+        'chunk_size': chunk_size,
+        'compression': 'gzip',
+        'stored_bytes': sum(stored for _, stored in chunks),
+        'chunks': chunks,
+    }
+    _write_atomic(_manifest_path(store_dir, backup_id),
+                  json.dumps(manifest, ensure_ascii=False).encode('utf-8'))
+
+    summary = {k: v for k, v in manifest.items() if k != 'chunks'}
+    summary.update(chunk_count=len(chunks), new_chunks=new_chunks, new_bytes=new_bytes,
+                   seconds=round(time.perf_counter() - started, 3))
+    return summary
+
+
+def load_manifest(store_dir, backup_id):
+    """读取备份清单"""
+    with open(_manifest_path(store_dir, backup_id), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def list_store_backups(store_dir):
+    """
+    列出仓库中的备份（按时间从新到旧）
+
+    Returns:
+        list: 备份清单摘要（不含数据块列表）
+    """
+    manifest_dir = os.path.join(store_dir, 'manifests')
+    if not os.path.isdir(manifest_dir):
+        return []
+    backups = []
+    for name in os.listdir(manifest_dir):
+        if not name.endswith('.json'):
+            continue
+        manifest = load_manifest(store_dir, name[:-len('.json')])
+        summary = {k: v for k, v in manifest.items() if k != 'chunks'}
+        summary['chunk_count'] = len(manifest['chunks'])
+        backups.append(summary)
+    backups.sort(key=lambda b: b['id'], reverse=True)
+    return backups
+
+
+def verify_store_backup(store_dir, backup_id, deep=False):
+    """
+    校验仓库中的备份
+
+    快速校验只比对清单中记录的数据块文件是否存在、压缩大小是否一致；
+    deep=True 时解压每个数据块并校验块哈希和整库sha256
+
+    Returns:
+        list: 发现的问题，为空表示校验通过
+    """
+    manifest = load_manifest(store_dir, backup_id)
+    problems = []
+    whole = hashlib.sha256()
+    for index, (digest, stored) in enumerate(manifest['chunks']):
+        path = _chunk_path(store_dir, digest)
+        if not os.path.exists(path):
+            problems.append(f"数据块缺失: #{index} {digest}")
+            continue
+        if os.path.getsize(path) != stored:
+            problems.append(f"数据块大小不符: #{index} {digest}")
+            continue
+        if deep:
+            with open(path, 'rb') as f:
+                data = gzip.decompress(f.read())
+            if hashlib.sha256(data).hexdigest() != digest:
+                problems.append(f"数据块内容损坏: #{index} {digest}")
+            whole.update(data)
+    if deep and not problems and whole.hexdigest() != manifest['sha256']:
+        problems.append('整库sha256不符')
+    return problems
+
+
+def restore_store_backup(store_dir, backup_id, dest_path):
+    """
+    从仓库还原备份到 dest_path（写入临时文件并校验sha256后再改名）
+
+    Raises:
+        ValueError: 还原结果与清单记录的sha256不一致
+    """
+    manifest = load_manifest(store_dir, backup_id)
+    temp_path = f"{dest_path}.partial"
+    whole = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as out:
+            for digest, _ in manifest['chunks']:
+                with open(_chunk_path(store_dir, digest), 'rb') as f:
+                    data = gzip.decompress(f.read())
+                whole.update(data)
+                out.write(data)
+        if whole.hexdigest() != manifest['sha256']:
+            raise ValueError('还原结果校验失败：sha256不一致')
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, dest_path)
+    return dest_path
+
+
+def select_retained(backups, hourly=0, daily=0, weekly=0, keep_last=1):
+    """
+    按保留策略选出要保留的备份ID
+
+    每个时间桶（小时/天/ISO周）保留最新的一个，分别保留最近 hourly/daily/weekly 个桶；
+    另外始终保留最新的 keep_last 个备份
+
+    Args:
+        backups (list): 备份摘要，需包含 id 和 created_at
+
+    Returns:
+        set: 要保留的备份ID
+    """
+    ordered = sorted(backups, key=lambda b: b['created_at'], reverse=True)
+    keep = {b['id'] for b in ordered[:keep_last]}
+    policies = [
+        (hourly, lambda t: t.strftime('%Y-%m-%d %H')),
+        (daily, lambda t: t.strftime('%Y-%m-%d')),
+        (weekly, lambda t: t.isocalendar()[:2]),
+    ]
+    for limit, bucket_of in policies:
+        seen = set()
+        for backup in ordered:
+            if len(seen) >= limit:
+                break
+            bucket = bucket_of(datetime.strptime(backup['created_at'], '%Y-%m-%d %H:%M:%S'))
+            if bucket not in seen:
+                seen.add(bucket)
+                keep.add(backup['id'])
+    return keep
+
+
+def apply_retention(store_dir, hourly=DEFAULT_RETENTION['hourly'], daily=DEFAULT_RETENTION['daily'],
+                    weekly=DEFAULT_RETENTION['weekly'], dry_run=False):
+    """
+    按保留策略删除过期备份清单，并清理不再被任何清单引用的数据块
+
+    Returns:
+        dict: kept/removed 备份ID列表，freed_chunks/freed_bytes 清理的数据块
+    """
+    backups = list_store_backups(store_dir)
+    keep = select_retained(backups, hourly=hourly, daily=daily, weekly=weekly)
+    removed = [b['id'] for b in backups if b['id'] not in keep]
+    result = {'kept': sorted(keep, reverse=True), 'removed': removed, 'freed_chunks': 0, 'freed_bytes': 0}
+    if dry_run:
+        return result
+
+    for backup_id in removed:
+        os.remove(_manifest_path(store_dir, backup_id))
+
+    referenced = set()
+    for backup_id in keep:
+        referenced.update(digest for digest, _ in load_manifest(store_dir, backup_id)['chunks'])
+
+    chunk_root = os.path.join(store_dir, 'chunks')
+    cutoff = time.time() - STORE_GC_GRACE_SECONDS
+    if os.path.isdir(chunk_root):
+        for prefix in os.listdir(chunk_root):
+            prefix_dir = os.path.join(chunk_root, prefix)
+            for digest in os.listdir(prefix_dir):
+                path = os.path.join(prefix_dir, digest)
+                if digest in referenced or os.path.getmtime(path) > cutoff:
+                    continue
+                result['freed_bytes'] += os.path.getsize(path)
+                result['freed_chunks'] += 1
+                os.remove(path)
+    return result
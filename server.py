@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+07妙妙屋订单管理系统
+生产环境启动入口
+
+默认使用 waitress（多线程WSGI服务器）运行应用；未安装 waitress 时
+退回 Werkzeug 多线程服务器（关闭调试器和自动重载）。
+
+环境变量：
+- COSWIG_HOST: 监听地址，默认 0.0.0.0
+- COSWIG_PORT: 端口，默认 5000
+- COSWIG_THREADS: 工作线程数，默认 8
+- COSWIG_SERVER: auto / waitress / werkzeug，默认 auto
+数据库和 SQLite PRAGMA 的环境变量见 app.py（COSWIG_DATABASE_URI、COSWIG_SQLITE_*）。
+
+使用方法：
+    python server.py
+
+多进程部署（Linux，--preload 保证迁移只在主进程执行一次；
+主进程启动的后台线程不会进入工作进程，各工作进程在 fork 后重建线程池和锁）：
+    gunicorn -w 4 --threads 4 --preload -b 0.0.0.0:5000 'server:create_app()'
+"""
+
+import os
+import sys
+
+from app import app, prepare_app
+
+SERVER_CHOICES = ('auto', 'waitress', 'werkzeug')
+
+
+def get_server_config():
+    """
+    从环境变量读取服务器配置
+    
+    Returns:
+        dict: host/port/threads/server
+    
+    Raises:
+        ValueError: 取值不合法
+    """
+    server = os.environ.get('COSWIG_SERVER', 'auto').lower()
+    if server not in SERVER_CHOICES:
+        raise ValueError(f"COSWIG_SERVER 只能为 {', '.join(SERVER_CHOICES)}")
+    threads = int(os.environ.get('COSWIG_THREADS', 8))
+    if threads < 1:
+        raise ValueError('COSWIG_THREADS 必须大于0')
+    return {
+        'host': os.environ.get('COSWIG_HOST', '0.0.0.0'),
+        'port': int(os.environ.get('COSWIG_PORT', 5000)),
+        'threads': threads,
+        'server': server,
+    }
+
+
+def create_app():
+    """执行启动准备并返回WSGI应用（供 gunicorn 等服务器调用）"""
+    prepare_app()
+    return app
+
+
+def serve(host, port, threads, server='auto'):
+    """按配置启动WSGI服务器（阻塞直到退出）"""
+    if server in ('auto', 'waitress'):
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            if server == 'waitress':
+                raise
+            print("未安装 waitress，使用 Werkzeug 多线程服务器（pip install waitress）")
+        else:
+            print(f"waitress 已启动: http://{host}:{port} （{threads} 个工作线程）")
+            waitress_serve(app, host=host, port=port, threads=threads)
+            return
+    
+    from werkzeug.serving import run_simple
+    print(f"Werkzeug 已启动: http://{host}:{port} （多线程）")
+    run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+def main():
+    try:
+        config = get_server_config()
+    except ValueError as e:
+        print(f"配置错误: {e}")
+        return 1
+    create_app()
+    serve(**config)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())